@@ -1,20 +1,180 @@
 import glob
+import hashlib
+import json
 import os
-import shutil
+import sqlite3
 import time
+import zipfile
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytz
+import zstandard
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 from app import schemas
 from app.core.config import settings
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Iterable
 from app.log import logger
 from app.schemas import NotificationType
+from app.utils.string import StringUtils
+
+
+class ChunkStore:
+    """
+    内容寻址的去重备份仓库
+    文件按固定大小分块，SQLite按页原地修改，固定分块即可复用未变化的块；
+    块以内容哈希命名并用zstd压缩保存，相同的块只保存一份，每次备份保存一个清单
+    """
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: Path, level: int = 3):
+        self._chunk_path = root / "chunks"
+        self._snapshot_path = root / "snapshots"
+        self._level = level
+
+    def backup(self, name: str, sources: Iterable[Tuple[str, Path]]) -> dict:
+        """
+        备份文件并保存清单，返回统计信息
+        """
+        start_time = time.monotonic()
+        compressor = zstandard.ZstdCompressor(level=self._level)
+        files = {}
+        total_size = new_size = stored_size = chunk_cnt = new_chunk_cnt = 0
+        for arcname, file_path in sources:
+            file_hash = hashlib.sha256()
+            chunks = []
+            size = 0
+            with open(file_path, "rb") as f:
+                while chunk := f.read(self.CHUNK_SIZE):
+                    chunk_id = hashlib.sha256(chunk).hexdigest()
+                    file_hash.update(chunk)
+                    size += len(chunk)
+                    chunks.append(chunk_id)
+                    chunk_cnt += 1
+                    chunk_file = self.__chunk_file(chunk_id)
+                    if chunk_file.exists():
+                        continue
+                    data = compressor.compress(chunk)
+                    self.__write_atomic(chunk_file, data)
+                    new_size += len(chunk)
+                    stored_size += len(data)
+                    new_chunk_cnt += 1
+            files[arcname] = {
+                "size": size,
+                "sha256": file_hash.hexdigest(),
+                "chunks": chunks,
+            }
+            total_size += size
+
+        elapsed = max(time.monotonic() - start_time, 0.001)
+        stats = {
+            "files": len(files),
+            "size": total_size,
+            "chunks": chunk_cnt,
+            "new_chunks": new_chunk_cnt,
+            "new_size": new_size,
+            "stored_size": stored_size,
+            # 去重率：本次无需写入的数据占比
+            "dedupe_ratio": round(1 - new_size / total_size, 4) if total_size else 0,
+            "seconds": round(elapsed, 3),
+            "throughput": round(total_size / elapsed),
+        }
+        self.__write_atomic(self._snapshot_path / f"{name}.json", json.dumps({
+            "name": name,
+            "time": int(time.time()),
+            "files": files,
+            "stats": stats,
+        }, ensure_ascii=False).encode("utf-8"))
+        return stats
+
+    def snapshots(self) -> List[str]:
+        """
+        全部备份名称，从旧到新排列
+        """
+        if not self._snapshot_path.exists():
+            return []
+        return sorted(file.stem for file in self._snapshot_path.glob("*.json"))
+
+    def manifest(self, name: str) -> dict:
+        return json.loads((self._snapshot_path / f"{name}.json").read_text(encoding="utf-8"))
+
+    def verify(self, name: str, deep: bool = False) -> List[str]:
+        """
+        校验备份，返回缺失或损坏的块
+        :param deep: 是否解压并校验块内容哈希，否则只检查块是否存在
+        """
+        decompressor = zstandard.ZstdDecompressor()
+        bad_chunks = []
+        chunk_ids = {chunk_id for file in self.manifest(name).get("files", {}).values()
+                     for chunk_id in file.get("chunks", [])}
+        for chunk_id in chunk_ids:
+            chunk_file = self.__chunk_file(chunk_id)
+            if not chunk_file.exists():
+                bad_chunks.append(chunk_id)
+                continue
+            if deep:
+                try:
+                    data = decompressor.decompress(chunk_file.read_bytes())
+                except zstandard.ZstdError:
+                    bad_chunks.append(chunk_id)
+                    continue
+                if hashlib.sha256(data).hexdigest() != chunk_id:
+                    bad_chunks.append(chunk_id)
+        return bad_chunks
+
+    def restore(self, name: str, target_path: Path) -> List[str]:
+        """
+        恢复备份到指定目录，逐个文件校验哈希，返回恢复的文件
+        """
+        decompressor = zstandard.ZstdDecompressor()
+        restored = []
+        for arcname, file in self.manifest(name).get("files", {}).items():
+            file_path = target_path / arcname
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+            file_hash = hashlib.sha256()
+            with open(tmp_path, "wb") as f:
+                for chunk_id in file.get("chunks", []):
+                    data = decompressor.decompress(self.__chunk_file(chunk_id).read_bytes())
+                    file_hash.update(data)
+                    f.write(data)
+            if file_hash.hexdigest() != file.get("sha256"):
+                tmp_path.unlink(missing_ok=True)
+                raise IOError(f"{arcname} 校验失败")
+            tmp_path.replace(file_path)
+            restored.append(arcname)
+        return restored
+
+    def delete(self, names: List[str]) -> int:
+        """
+        删除备份并清理不再被引用的块，返回释放的空间
+        """
+        for name in names:
+            (self._snapshot_path / f"{name}.json").unlink(missing_ok=True)
+        referenced = set()
+        for name in self.snapshots():
+            for file in self.manifest(name).get("files", {}).values():
+                referenced.update(file.get("chunks", []))
+        freed = 0
+        if self._chunk_path.exists():
+            for chunk_file in self._chunk_path.glob("*/*"):
+                if chunk_file.name not in referenced:
+                    freed += chunk_file.stat().st_size
+                    chunk_file.unlink(missing_ok=True)
+        return freed
+
+    def __chunk_file(self, chunk_id: str) -> Path:
+        return self._chunk_path / chunk_id[:2] / chunk_id
+
+    @staticmethod
+    def __write_atomic(file_path: Path, data: bytes):
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = file_path.with_name(f".{file_path.name}.tmp")
+        tmp_path.write_bytes(data)
+        tmp_path.replace(file_path)
 
 
 class AutoBackup(_PluginBase):
@@ -25,7 +185,7 @@ class AutoBackup(_PluginBase):
     # 插件图标
     plugin_icon = "Time_machine_B.png"
     # 插件版本
-    plugin_version = "2.0.3"
+    plugin_version = "2.2"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -45,6 +205,10 @@ class AutoBackup(_PluginBase):
     _onlyonce = False
     _notify = False
     _back_path = None
+    _incremental = False
+    _chunk_store = False
+    # 增量模式下全量备份间隔天数
+    _full_days = 7
 
     # 定时器
     _scheduler: Optional[BackgroundScheduler] = None
@@ -60,6 +224,8 @@ class AutoBackup(_PluginBase):
             self._notify = config.get("notify")
             self._onlyonce = config.get("onlyonce")
             self._back_path = config.get("back_path")
+            self._incremental = config.get("incremental")
+            self._chunk_store = config.get("chunk_store")
 
             # 加载模块
         if self._onlyonce:
@@ -77,6 +243,8 @@ class AutoBackup(_PluginBase):
                 "cnt": self._cnt,
                 "notify": self._notify,
                 "back_path": self._back_path,
+                "incremental": self._incremental,
+                "chunk_store": self._chunk_store,
             })
 
             # 启动任务
@@ -101,87 +269,275 @@ class AutoBackup(_PluginBase):
         # 备份保存路径
         bk_path = Path(self._back_path) if self._back_path else self.get_data_path()
 
-        # 备份
-        zip_file = self.backup_file(bk_path=bk_path)
-
-        if zip_file:
-            success = True
-            msg = f"备份完成 备份文件 {zip_file}"
-            logger.info(msg)
+        if self._chunk_store:
+            # 去重备份
+            success, msg, bk_cnt, del_cnt = self.__chunk_backup(bk_path)
         else:
-            success = False
-            msg = "创建备份失败"
-            logger.error(msg)
+            # 备份
+            zip_file = self.backup_file(bk_path=bk_path)
 
-        # 清理备份
-        bk_cnt = 0
-        del_cnt = 0
-        if self._cnt:
-            # 获取指定路径下所有以"bk"开头的文件，按照创建时间从旧到新排序
-            files = sorted(glob.glob(f"{bk_path}/bk**"), key=os.path.getctime)
-            bk_cnt = len(files)
-            # 计算需要删除的文件数
-            del_cnt = bk_cnt - int(self._cnt)
-            if del_cnt > 0:
-                logger.info(
-                    f"获取到 {bk_path} 路径下备份文件数量 {bk_cnt} 保留数量 {int(self._cnt)} 需要删除备份文件数量 {del_cnt}")
-
-                # 遍历并删除最旧的几个备份
-                for i in range(del_cnt):
-                    os.remove(files[i])
-                    logger.debug(f"删除备份文件 {files[i]} 成功")
+            if zip_file:
+                success = True
+                msg = f"备份完成 备份文件 {zip_file}"
+                logger.info(msg)
             else:
-                logger.info(
-                    f"获取到 {bk_path} 路径下备份文件数量 {bk_cnt} 保留数量 {int(self._cnt)} 无需删除")
+                success = False
+                msg = "创建备份失败"
+                logger.error(msg)
+
+            # 清理备份
+            bk_cnt, del_cnt = self.__clean_backups(bk_path)
 
         # 发送通知
         if self._notify:
+            text = f"创建备份{'成功' if success else '失败'}\n"
+            if self._chunk_store and success:
+                text += f"{msg}\n"
             self.post_message(
                 mtype=NotificationType.SiteMessage,
                 title="【自动备份任务完成】",
-                text=f"创建备份{'成功' if zip_file else '失败'}\n"
+                text=f"{text}"
                      f"清理备份数量 {del_cnt}\n"
                      f"剩余备份数量 {bk_cnt - del_cnt}")
 
         return success, msg
 
-    @staticmethod
-    def backup_file(bk_path: Path = None):
+    def __chunk_backup(self, bk_path: Path) -> Tuple[bool, str, int, int]:
+        """
+        备份到去重仓库，返回 (是否成功, 消息, 备份数量, 删除数量)
+        """
+        store = ChunkStore(bk_path / "chunk_store")
+        backup_name = f"bk_{time.strftime('%Y%m%d%H%M%S')}"
+        db_snapshot = bk_path / f".{backup_name}.db"
+        try:
+            bk_path.mkdir(parents=True, exist_ok=True)
+            stats = store.backup(backup_name, self.__backup_sources(db_snapshot))
+            bad_chunks = store.verify(backup_name)
+            if bad_chunks:
+                raise IOError(f"缺失数据块 {len(bad_chunks)} 个")
+        except (IOError, sqlite3.Error, zstandard.ZstdError) as e:
+            logger.error(f"创建去重备份出错：{str(e)}")
+            return False, "创建备份失败", len(store.snapshots()), 0
+        finally:
+            db_snapshot.unlink(missing_ok=True)
+
+        msg = (f"去重备份完成 {backup_name}：文件 {stats.get('files')} 个，"
+               f"大小 {StringUtils.str_filesize(stats.get('size'))}，"
+               f"新增 {StringUtils.str_filesize(stats.get('new_size'))}"
+               f"（压缩后 {StringUtils.str_filesize(stats.get('stored_size'))}），"
+               f"去重率 {stats.get('dedupe_ratio'):.1%}，"
+               f"耗时 {stats.get('seconds')} 秒，速度 {StringUtils.str_filesize(stats.get('throughput'))}/s")
+        logger.info(msg)
+
+        # 清理备份
+        snapshots = store.snapshots()
+        bk_cnt = len(snapshots)
+        del_cnt = bk_cnt - int(self._cnt) if self._cnt else 0
+        if del_cnt > 0:
+            freed = store.delete(snapshots[:del_cnt])
+            logger.info(f"去重仓库备份数量 {bk_cnt} 保留数量 {int(self._cnt)} 删除 {del_cnt} 个，"
+                        f"释放空间 {StringUtils.str_filesize(freed)}")
+        else:
+            del_cnt = 0
+        return True, msg, bk_cnt, del_cnt
+
+    def api_verify(self, apikey: str, name: str = None, deep: bool = False):
+        """
+        API校验去重备份，不指定名称时校验最新备份
         """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        bk_path = Path(self._back_path) if self._back_path else self.get_data_path()
+        store = ChunkStore(bk_path / "chunk_store")
+        snapshots = store.snapshots()
+        name = name or (snapshots[-1] if snapshots else None)
+        if not name or name not in snapshots:
+            return schemas.Response(success=False, message="备份不存在")
+        bad_chunks = store.verify(name, deep=deep)
+        if bad_chunks:
+            return schemas.Response(success=False, message=f"{name} 缺失或损坏数据块 {len(bad_chunks)} 个")
+        return schemas.Response(success=True, message=f"{name} 校验通过")
+
+    def api_restore(self, apikey: str, name: str = None):
+        """
+        API恢复去重备份到备份目录下的restore目录，不指定名称时恢复最新备份
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        bk_path = Path(self._back_path) if self._back_path else self.get_data_path()
+        store = ChunkStore(bk_path / "chunk_store")
+        snapshots = store.snapshots()
+        name = name or (snapshots[-1] if snapshots else None)
+        if not name or name not in snapshots:
+            return schemas.Response(success=False, message="备份不存在")
+        target_path = bk_path / "restore" / name
+        try:
+            restored = store.restore(name, target_path)
+        except (IOError, zstandard.ZstdError) as e:
+            logger.error(f"恢复备份 {name} 出错：{str(e)}")
+            return schemas.Response(success=False, message=f"恢复备份 {name} 失败：{str(e)}")
+        logger.info(f"恢复备份 {name} 完成，共 {len(restored)} 个文件，保存到 {target_path}")
+        return schemas.Response(success=True, message=f"已恢复 {len(restored)} 个文件到 {target_path}")
+
+    def backup_file(self, bk_path: Path = None):
+        """
+        备份文件直接写入压缩包，数据库通过SQLite在线备份接口获取一致快照
+        增量模式下只写入内容哈希与最近一次全量备份不同的文件
         @param bk_path     自定义备份路径
         """
+        bk_path = bk_path or self.get_data_path()
+        backups = self.__get_backups(bk_path)
+        base_hashes = self.get_data("base_hashes") or {}
+        last_full = next((backup for backup in reversed(backups) if backup.get("type") == "full"), None)
+        incremental = bool(self._incremental and base_hashes and last_full
+                           and time.time() - last_full.get("time", 0) < self._full_days * 86400)
+
+        backup_name = f"bk_{time.strftime('%Y%m%d%H%M%S')}{'_inc' if incremental else ''}"
+        zip_file = bk_path / f"{backup_name}.zip"
+        tmp_file = bk_path / f".{backup_name}.zip.tmp"
+        db_snapshot = bk_path / f".{backup_name}.db"
         try:
-            # 创建备份文件夹
-            config_path = Path(settings.CONFIG_PATH)
-            backup_file = f"bk_{time.strftime('%Y%m%d%H%M%S')}"
-            backup_path = bk_path / backup_file
-            backup_path.mkdir(parents=True)
-
-            # 把现有的相关文件进行copy备份
-            category_file = config_path / "category.yaml"
-            if category_file.exists():
-                shutil.copy(category_file, backup_path)
-            # 查找所有以 "user.db" 开头的文件
-            userdb_files = list(config_path.glob("user.db*"))
-            # 如果找到了任何匹配的文件，则进行复制
-            for userdb_file in userdb_files:
-                if userdb_file.exists():
-                    shutil.copy(userdb_file, backup_path)
-            app_file = config_path / "app.env"
-            if app_file.exists():
-                shutil.copy(app_file, backup_path)
-            cookies_path = config_path / "cookies"
-            if cookies_path.exists():
-                shutil.copytree(cookies_path, f'{backup_path}/cookies')
-
-            zip_file = str(backup_path) + '.zip'
-            if os.path.exists(zip_file):
-                zip_file = str(backup_path) + '.zip'
-            shutil.make_archive(str(backup_path), 'zip', str(backup_path))
-            shutil.rmtree(str(backup_path))
-            return zip_file
-        except IOError:
+            bk_path.mkdir(parents=True, exist_ok=True)
+            hashes = {}
+            written = 0
+            with zipfile.ZipFile(tmp_file, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for arcname, file_path in self.__backup_sources(db_snapshot):
+                    if incremental:
+                        hashes[arcname] = self.__file_hash(file_path)
+                        if base_hashes.get(arcname) == hashes[arcname]:
+                            continue
+                        self.__write_zip(zf, arcname, file_path)
+                    else:
+                        hashes[arcname] = self.__write_zip(zf, arcname, file_path)
+                    written += 1
+                # 清单记录完整文件列表，增量备份只依赖基准全量备份，恢复时先解压全量备份再覆盖
+                zf.writestr("manifest.json", json.dumps({
+                    "type": "incremental" if incremental else "full",
+                    "base": last_full.get("name") if incremental else None,
+                    "files": hashes,
+                }, ensure_ascii=False, indent=2))
+            tmp_file.replace(zip_file)
+        except (IOError, sqlite3.Error) as e:
+            logger.error(f"创建备份出错：{str(e)}")
+            tmp_file.unlink(missing_ok=True)
             return None
+        finally:
+            db_snapshot.unlink(missing_ok=True)
+
+        logger.info(f"{'增量' if incremental else '全量'}备份写入文件 {written}/{len(hashes)} 个")
+        backups.append({
+            "name": zip_file.name,
+            "type": "incremental" if incremental else "full",
+            "base": last_full.get("name") if incremental else None,
+            "time": int(time.time()),
+        })
+        self.__save_backups(bk_path, backups)
+        if not incremental:
+            self.save_data("base_hashes", hashes)
+        return str(zip_file)
+
+    @staticmethod
+    def __backup_sources(db_snapshot: Path):
+        """
+        需要备份的文件：(压缩包内路径, 文件路径)
+        """
+        config_path = Path(settings.CONFIG_PATH)
+        category_file = config_path / "category.yaml"
+        if category_file.exists():
+            yield "category.yaml", category_file
+        userdb_file = config_path / "user.db"
+        if userdb_file.exists():
+            # 在线备份接口会合并WAL中的数据，无需再备份-wal、-shm文件
+            source = sqlite3.connect(f"file:{userdb_file}?mode=ro", uri=True)
+            target = sqlite3.connect(db_snapshot)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            yield "user.db", db_snapshot
+        for userdb_file in config_path.glob("user.db?*"):
+            if userdb_file.name not in ["user.db-wal", "user.db-shm", "user.db-journal"]:
+                yield userdb_file.name, userdb_file
+        app_file = config_path / "app.env"
+        if app_file.exists():
+            yield "app.env", app_file
+        cookies_path = config_path / "cookies"
+        if cookies_path.exists():
+            for cookie_file in sorted(cookies_path.rglob("*")):
+                if cookie_file.is_file():
+                    yield f"cookies/{cookie_file.relative_to(cookies_path).as_posix()}", cookie_file
+
+    @staticmethod
+    def __write_zip(zf: zipfile.ZipFile, arcname: str, file_path: Path) -> str:
+        """
+        分块写入压缩包，同时计算内容哈希
+        """
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as src, zf.open(arcname, "w", force_zip64=True) as dst:
+            while chunk := src.read(1024 * 1024):
+                sha256.update(chunk)
+                dst.write(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def __file_hash(file_path: Path) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(1024 * 1024):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def __get_backups(self, bk_path: Path) -> List[dict]:
+        """
+        备份记录，从旧到新排列，首次使用时扫描一次已有备份文件
+        """
+        index = self.get_data("backups") or {}
+        if index.get("path") == str(bk_path):
+            return index.get("backups") or []
+        # 文件名包含备份时间，按名称排序即可
+        return [{"name": Path(file).name, "type": "full", "base": None, "time": int(os.path.getmtime(file))}
+                for file in sorted(glob.glob(f"{bk_path}/bk**"))]
+
+    def __save_backups(self, bk_path: Path, backups: List[dict]):
+        self.save_data("backups", {
+            "path": str(bk_path),
+            "backups": backups,
+        })
+
+    def __clean_backups(self, bk_path: Path) -> Tuple[int, int]:
+        """
+        按备份记录清理超出保留数量的旧备份，仍被增量备份依赖的全量备份暂不删除
+        """
+        backups = self.__get_backups(bk_path)
+        bk_cnt = len(backups)
+        if not self._cnt:
+            return bk_cnt, 0
+        if bk_cnt <= int(self._cnt):
+            logger.info(f"获取到 {bk_path} 路径下备份文件数量 {bk_cnt} 保留数量 {int(self._cnt)} 无需删除")
+            return bk_cnt, 0
+
+        logger.info(f"获取到 {bk_path} 路径下备份文件数量 {bk_cnt} 保留数量 {int(self._cnt)} "
+                    f"需要删除备份文件数量 {bk_cnt - int(self._cnt)}")
+        del_cnt = 0
+        for backup in list(backups):
+            if len(backups) <= int(self._cnt):
+                break
+            if backup.get("type") == "full" and any(other.get("base") == backup.get("name") for other in backups):
+                continue
+            backup_file = bk_path / backup.get("name")
+            try:
+                if backup_file.is_dir():
+                    continue
+                backup_file.unlink(missing_ok=True)
+            except OSError as e:
+                logger.error(f"删除备份文件 {backup_file} 失败：{str(e)}")
+                continue
+            backups.remove(backup)
+            del_cnt += 1
+            logger.debug(f"删除备份文件 {backup_file} 成功")
+        self.__save_backups(bk_path, backups)
+        return bk_cnt, del_cnt
 
     def get_state(self) -> bool:
         return self._enabled
@@ -197,6 +553,18 @@ class AutoBackup(_PluginBase):
             "methods": ["GET"],
             "summary": "MoviePilot备份",
             "description": "MoviePilot备份",
+        }, {
+            "path": "/verify",
+            "endpoint": self.api_verify,
+            "methods": ["GET"],
+            "summary": "校验去重备份",
+            "description": "校验去重备份数据块是否完整",
+        }, {
+            "path": "/restore",
+            "endpoint": self.api_restore,
+            "methods": ["GET"],
+            "summary": "恢复去重备份",
+            "description": "恢复去重备份到备份目录下的restore目录",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -244,7 +612,7 @@ class AutoBackup(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -260,7 +628,7 @@ class AutoBackup(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -276,7 +644,7 @@ class AutoBackup(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 4
+                                    'md': 3
                                 },
                                 'content': [
                                     {
@@ -287,6 +655,38 @@ class AutoBackup(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'incremental',
+                                            'label': '增量备份',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'chunk_store',
+                                            'label': '去重备份',
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -358,6 +758,8 @@ class AutoBackup(_PluginBase):
                                             'type': 'info',
                                             'variant': 'tonal',
                                             'text': '备份文件路径默认为本地映射的config/plugins/AutoBackup。'
+                                                    '开启增量备份后每7天全量备份一次，其余只备份与全量备份相比有变化的文件，恢复时先解压全量备份再解压增量备份覆盖。'
+                                                    '开启去重备份后备份保存到chunk_store目录，相同数据只保存一份，可通过/verify接口校验、/restore接口恢复到restore目录。'
                                         }
                                     }
                                 ]
@@ -370,7 +772,9 @@ class AutoBackup(_PluginBase):
             "enabled": False,
             "request_method": "POST",
             "webhook_url": "",
-            "back_path": str(self.get_data_path())
+            "back_path": str(self.get_data_path()),
+            "incremental": False,
+            "chunk_store": False,
         }
 
     def get_page(self) -> List[dict]:
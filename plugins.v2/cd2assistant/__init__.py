@@ -1,5 +1,15 @@
+import json
+import math
+import os
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait, FIRST_COMPLETED, \
+    TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
+from functools import partial
+from pathlib import Path
 
 import pytz
 
@@ -9,7 +19,7 @@ from app import schemas
 from app.core.config import settings
 from app.core.event import eventmanager, Event
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Callable
 from app.log import logger
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -17,6 +27,252 @@ from apscheduler.triggers.cron import CronTrigger
 from app.schemas import NotificationType
 from app.schemas.types import EventType
 
+# 同时探测数
+PROBE_WORKERS = 4
+# 没有探测结果时最多等待的秒数
+PROBE_WAIT = 5
+# 检查云盘cookie的超时时间（秒）
+CHECK_TIMEOUT = 60
+# 各探测项有效期（秒）
+PROBE_TTL = {
+    "running_info": 10,
+    "task_count": 10,
+    "download_list": 10,
+    "upload_list": 10,
+    "roots": 300,
+    "space": 600,
+}
+# 仪表板图表显示最近的小时数
+CHART_HOURS = 6
+# 上传任务每页数量
+TASK_PAGE_SIZE = 100
+# 每次检查最多遍历的上传任务页数
+TASK_PAGES_PER_CHECK = 20
+# 异常上传任务最多自动重试次数
+TASK_MAX_RETRIES = 3
+
+
+class ProbeSnapshot:
+    """
+    CloudDrive2状态快照
+    各探测项按各自的有效期在后台线程池并发刷新，读取时直接返回内存中的结果，单个探测慢或失败不影响其它探测项
+    """
+
+    def __init__(self, workers: int = 4):
+        # 探测项名称 -> {"func", "ttl", "value", "time", "error", "future"}
+        self._probes: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cd2assistant-probe")
+
+    def register(self, name: str, func: Callable[[], Any], ttl: float):
+        """
+        注册探测项，已存在时只更新探测方法和有效期
+        """
+        with self._lock:
+            probe = self._probes.setdefault(name, {"value": None, "time": None, "error": None, "future": None})
+            probe["func"] = func
+            probe["ttl"] = ttl
+
+    def retain(self, keep: Callable[[str], bool]):
+        """
+        移除不再需要的探测项
+        """
+        with self._lock:
+            for name in [name for name in self._probes if not keep(name)]:
+                self._probes.pop(name, None)
+
+    def refresh(self, wait: float = 0):
+        """
+        提交已过期的探测项到后台刷新，正在刷新的不重复提交
+        :param wait: 最多等待刷新完成的秒数，0为不等待
+        """
+        deadline = time.monotonic() + wait
+        pending = set()
+        while True:
+            # 刷新过程中可能注册了新的探测项，继续提交
+            pending.update(self.__submit_expired())
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                return
+            _, pending = futures_wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        """
+        读取探测结果，刷新失败时返回上一次成功的结果
+        """
+        probe = self._probes.get(name)
+        if not probe or probe.get("value") is None:
+            return default
+        return probe.get("value")
+
+    def items(self, prefix: str) -> Dict[str, Any]:
+        """
+        读取名称以prefix开头的所有探测结果
+        """
+        with self._lock:
+            return {name[len(prefix):]: probe.get("value") for name, probe in self._probes.items()
+                    if name.startswith(prefix) and probe.get("value") is not None}
+
+    def empty(self) -> bool:
+        with self._lock:
+            return not any(probe.get("time") for probe in self._probes.values())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def __submit_expired(self) -> list:
+        now = time.monotonic()
+        futures = []
+        with self._lock:
+            for name, probe in self._probes.items():
+                future = probe.get("future")
+                if future and not future.done():
+                    continue
+                if probe.get("time") and now - probe.get("time") < probe.get("ttl"):
+                    continue
+                probe["future"] = self._executor.submit(self.__run, name, probe.get("func"))
+                futures.append(probe["future"])
+        return futures
+
+    def __run(self, name: str, func: Callable[[], Any]):
+        start_time = time.monotonic()
+        value, error = None, None
+        try:
+            value = func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"CloudDrive2探测 {name} 失败：{error}")
+        with self._lock:
+            probe = self._probes.get(name)
+            if not probe:
+                return
+            probe["time"] = time.monotonic()
+            probe["error"] = error
+            if error is None:
+                probe["value"] = value
+        logger.debug(f"CloudDrive2探测 {name} 完成，耗时 {time.monotonic() - start_time:.2f} 秒")
+
+
+class MetricsRing:
+    """
+    CloudDrive2运行指标环形缓冲
+    原始采样和按10分钟、1小时聚合的数据各保留固定点数，超出后丢弃最旧的数据，定期写入磁盘
+    """
+    # 指标项
+    FIELDS = ["cpu", "mem_mb", "download_bps", "upload_bps", "dir_cache", "upload_count", "download_count",
+              "used_bytes"]
+    # 各级精度：(名称, 聚合间隔秒, 保留点数)，聚合间隔为0的是原始采样
+    TIERS = [("raw", 0, 1440), ("10m", 600, 1008), ("1h", 3600, 720)]
+    # 写入磁盘间隔（秒）
+    SAVE_INTERVAL = 300
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._tiers: Dict[str, deque] = {name: deque(maxlen=size) for name, _, size in self.TIERS}
+        # 各云盘已用空间，每小时一个点：[时间, {云盘: 已用字节}]
+        self._spaces: deque = deque(maxlen=self.TIERS[-1][2])
+        # 聚合中的数据：名称 -> [聚合桶, 点数, 各指标合计]
+        self._buckets: Dict[str, list] = {}
+        self._saved = time.monotonic()
+        self.__load()
+
+    def add(self, values: Dict[str, Any], spaces: Dict[str, float] = None, ts: float = None):
+        """
+        添加一次采样
+        """
+        ts = int(ts or time.time())
+        row = [ts] + [round(float(values.get(field) or 0), 2) for field in self.FIELDS]
+        with self._lock:
+            self._tiers["raw"].append(row)
+            for name, step, _ in self.TIERS:
+                if not step:
+                    continue
+                bucket = ts // step
+                acc = self._buckets.get(name)
+                if acc and acc[0] != bucket:
+                    # 上一个聚合桶结束，写入平均值
+                    self._tiers[name].append([acc[0] * step] + [round(total / acc[1], 2) for total in acc[2]])
+                    acc = None
+                if not acc:
+                    acc = [bucket, 0, [0.0] * len(self.FIELDS)]
+                    self._buckets[name] = acc
+                acc[1] += 1
+                acc[2] = [total + value for total, value in zip(acc[2], row[1:])]
+            if spaces:
+                hour = ts // 3600 * 3600
+                if self._spaces and self._spaces[-1][0] == hour:
+                    self._spaces[-1][1] = spaces
+                else:
+                    self._spaces.append([hour, spaces])
+        if time.monotonic() - self._saved >= self.SAVE_INTERVAL:
+            self.save()
+
+    def query(self, seconds: float, max_points: int = 300) -> dict:
+        """
+        查询最近seconds秒的指标，选择能覆盖该时间范围的最细精度，点数超过max_points时再按平均值合并
+        """
+        since = time.time() - seconds
+        with self._lock:
+            tier_name, rows = self.__select_tier(since)
+            rows = [row for row in rows if row[0] >= since]
+            spaces = [space for space in self._spaces if space[0] >= since]
+        if max_points and len(rows) > max_points:
+            size = math.ceil(len(rows) / max_points)
+            rows = [[chunk[0][0]] + [round(sum(column) / len(chunk), 2) for column in list(zip(*chunk))[1:]]
+                    for chunk in (rows[i:i + size] for i in range(0, len(rows), size))]
+        return {
+            "tier": tier_name,
+            "fields": ["time"] + self.FIELDS,
+            "points": rows,
+            "spaces": spaces,
+        }
+
+    def save(self):
+        """
+        写入磁盘
+        """
+        with self._lock:
+            data = {
+                "tiers": {name: list(rows) for name, rows in self._tiers.items()},
+                "spaces": list(self._spaces),
+            }
+            self._saved = time.monotonic()
+        tmp_path = self._path.with_suffix(".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            logger.error(f"保存CloudDrive2运行指标失败：{str(e)}")
+
+    def __select_tier(self, since: float) -> Tuple[str, List[list]]:
+        """
+        选择最早数据早于since的最细精度，都不满足时选择数据最早的精度
+        """
+        earliest = None
+        for name, _, _ in self.TIERS:
+            rows = self._tiers.get(name)
+            if not rows:
+                continue
+            if rows[0][0] <= since:
+                return name, list(rows)
+            if not earliest or rows[0][0] < earliest[1][0][0]:
+                earliest = (name, list(rows))
+        return earliest or (self.TIERS[0][0], [])
+
+    def __load(self):
+        if not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取CloudDrive2运行指标失败：{str(e)}")
+            return
+        for name, rows in (data.get("tiers") or {}).items():
+            if name in self._tiers:
+                self._tiers[name].extend(row for row in rows if len(row) == len(self.FIELDS) + 1)
+        self._spaces.extend(data.get("spaces") or [])
+
 
 class Cd2Assistant(_PluginBase):
     # 插件名称
@@ -26,7 +282,7 @@ class Cd2Assistant(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/clouddrive.png"
     # 插件版本
-    plugin_version = "1.8.5"
+    plugin_version = "1.8.8"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -53,6 +309,10 @@ class Cd2Assistant(_PluginBase):
     _cd2_password = None
     _cd2_client = None
     _client = None
+    _snapshot: Optional[ProbeSnapshot] = None
+    _metrics_interval = None
+    _task_retry = False
+    _metrics: Optional[MetricsRing] = None
 
     _scheduler: Optional[BackgroundScheduler] = None
 
@@ -70,6 +330,8 @@ class Cd2Assistant(_PluginBase):
             self._cd2_password = config.get("cd2_password")
             self._black_dir = config.get("black_dir") or ""
             self._cloud_path = config.get("cloud_path") or ""
+            self._metrics_interval = config.get("metrics_interval")
+            self._task_retry = config.get("task_retry")
 
         # 停止现有任务
         self.stop_service()
@@ -89,9 +351,21 @@ class Cd2Assistant(_PluginBase):
                 logger.error("CloudDrive2助手连接失败，请检查配置")
                 return
 
+            # 状态快照
+            self.__init_snapshot()
+
             # 周期运行
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
 
+            # 运行指标采集
+            if self._enabled and self._metrics_interval and str(self._metrics_interval).isdigit() \
+                    and int(self._metrics_interval) > 0:
+                self._metrics = MetricsRing(self.get_data_path() / "metrics.json")
+                self._scheduler.add_job(func=self.__collect_metrics,
+                                        trigger="interval",
+                                        seconds=max(int(self._metrics_interval), 10),
+                                        name="CloudDrive2运行指标采集")
+
             if self._cron:
                 try:
                     self._scheduler.add_job(func=self.check,
@@ -147,6 +421,8 @@ class Cd2Assistant(_PluginBase):
             "cd2_password": self._cd2_password,
             "black_dir": self._black_dir,
             "cloud_path": self._cloud_path,
+            "metrics_interval": self._metrics_interval,
+            "task_retry": self._task_retry,
         })
 
     def check(self):
@@ -158,7 +434,7 @@ class Cd2Assistant(_PluginBase):
 
     def __check_cookie(self):
         """
-        检查cookie是否过期
+        检查cookie是否过期，各云盘并发检查
         """
         logger.info("开始检查CloudDrive2 cookie")
         fs = self._cd2_client.fs
@@ -166,44 +442,133 @@ class Cd2Assistant(_PluginBase):
             logger.error("CloudDrive2连接失败，请检查配置")
             return
 
-        for f in fs.listdir():
-            error_msg = None
-            if f and f not in self._black_dir.split(","):
-                try:
-                    cloud_file = fs.listdir(f)
-                    if not cloud_file or len(cloud_file) == 0:
-                        logger.warning(f"云盘 {f} 为空")
-                        error_msg = f"云盘 {f} cookie过期"
-                except Exception as err:
-                    logger.error(f"云盘 {f} cookie过期：{err}")
-                    if "429" in str(err):
-                        error_msg = f"云盘 {f} 访问频率过高，请稍后再试"
-                    else:
-                        error_msg = f"云盘 {f} cookie过期"
+        black_dirs = (self._black_dir or "").split(",")
+        roots = [f for f in fs.listdir() if f and f not in black_dirs]
+        executor = ThreadPoolExecutor(max_workers=PROBE_WORKERS, thread_name_prefix="cd2assistant-check")
+        futures = {executor.submit(self.__check_cloud, fs, f): f for f in roots}
+        try:
+            for future in as_completed(futures, timeout=CHECK_TIMEOUT):
+                error_msg = future.result()
+                # 发送通知
+                if self._notify and error_msg:
+                    self.__send_notify(error_msg)
+        except FuturesTimeoutError:
+            for future, f in futures.items():
+                if not future.done():
+                    logger.warning(f"云盘 {f} 检查超过 {CHECK_TIMEOUT} 秒，跳过")
+        finally:
+            # 超时的云盘不等待其结束
+            executor.shutdown(wait=False)
 
-            # 发送通知
-            if self._notify and error_msg:
-                self.__send_notify(error_msg)
+    @staticmethod
+    def __check_cloud(fs: Any, f: str) -> Optional[str]:
+        """
+        检查单个云盘，返回错误信息
+        """
+        try:
+            cloud_file = fs.listdir(f)
+            if not cloud_file or len(cloud_file) == 0:
+                logger.warning(f"云盘 {f} 为空")
+                return f"云盘 {f} cookie过期"
+        except Exception as err:
+            logger.error(f"云盘 {f} cookie过期：{err}")
+            if "429" in str(err):
+                return f"云盘 {f} 访问频率过高，请稍后再试"
+            return f"云盘 {f} cookie过期"
+        return None
 
     def __check_task(self):
         """
         检查上传任务
+        分页遍历上传队列，每次从上次的位置继续，只处理状态变化的任务，异常任务按错误类型汇总重试和通知
         """
         logger.info("开始检查CloudDrive2上传任务")
-        # 获取上传任务列表
-        upload_tasklist = self._cd2_client.upload_tasklist.list(page=0, page_size=10, filter="")
-        if not upload_tasklist:
-            logger.info("没有发现上传任务")
+        state = self.get_data("upload_task_state") or {}
+        cursor = state.get("cursor") or 0
+        cycle = state.get("cycle") or 0
+        # 任务key -> {"status", "retries", "cycle"}
+        tasks: Dict[str, dict] = state.get("tasks") or {}
+
+        failures = []
+        retry_keys = []
+        scanned = 0
+        for page in range(cursor, cursor + TASK_PAGES_PER_CHECK):
+            try:
+                page_tasks = self._cd2_client.upload_tasklist.list(page=page, page_size=TASK_PAGE_SIZE,
+                                                                   filter="") or []
+            except Exception as e:
+                logger.error(f"获取CloudDrive2上传任务第 {page + 1} 页失败：{str(e)}")
+                break
+            scanned += len(page_tasks)
+            for task in page_tasks:
+                key = task.get("key") or task.get("destPath")
+                if not key:
+                    continue
+                record = tasks.get(key) or {"status": None, "retries": 0}
+                status = task.get("status")
+                # 新出现的异常任务
+                if status == "FatalError" and record.get("status") != "FatalError":
+                    failures.append(task)
+                    if self._task_retry and record.get("retries", 0) < TASK_MAX_RETRIES:
+                        retry_keys.append(task.get("key"))
+                        record["retries"] = record.get("retries", 0) + 1
+                record["status"] = status
+                record["cycle"] = cycle
+                tasks[key] = record
+            cursor = page + 1
+            if len(page_tasks) < TASK_PAGE_SIZE:
+                # 已遍历完整个队列，清理不在队列中的任务，下次从头开始
+                tasks = {key: record for key, record in tasks.items() if record.get("cycle") == cycle}
+                cursor = 0
+                cycle += 1
+                break
+
+        self.save_data("upload_task_state", {
+            "cursor": cursor,
+            "cycle": cycle,
+            "tasks": tasks,
+        })
+        logger.info(f"本次检查上传任务 {scanned} 个，新增异常任务 {len(failures)} 个，"
+                    f"下次从第 {cursor + 1} 页开始检查")
+        if not failures:
             return
 
-        for task in upload_tasklist:
-            if task.get("status") == "FatalError" and self._keyword and re.search(self._keyword,
-                                                                                  task.get("errorMessage")):
-                logger.info(f"发现异常上传任务：{task.get('errorMessage')}")
-                # 发送通知
-                if self._notify:
-                    self.__send_notify(task.get("errorMessage"))
-                    break
+        # 重试异常任务
+        retry_keys = [key for key in retry_keys if key]
+        if retry_keys:
+            try:
+                self._client.ResumeUploadFiles(CloudDrive_pb2.MultpleUploadFileKeyRequest(keys=retry_keys))
+                logger.info(f"已重试异常上传任务 {len(retry_keys)} 个")
+            except Exception as e:
+                logger.error(f"重试异常上传任务失败：{str(e)}")
+                retry_keys = []
+
+        # 按错误类型汇总
+        groups: Dict[str, List[dict]] = {}
+        for task in failures:
+            groups.setdefault(self.__error_class(task.get("errorMessage")), []).append(task)
+        msgs = []
+        for error_class, group in sorted(groups.items(), key=lambda x: len(x[1]), reverse=True):
+            error_message = group[0].get("errorMessage") or ""
+            logger.info(f"发现异常上传任务 {len(group)} 个：{error_message}")
+            if self._keyword and re.search(self._keyword, error_message):
+                msgs.append(f"{error_message}\n共 {len(group)} 个，例：{group[0].get('destPath')}")
+
+        # 发送通知
+        if self._notify and msgs:
+            msg = "\n\n".join(msgs)
+            if retry_keys:
+                msg += f"\n\n已自动重试 {len(retry_keys)} 个任务"
+            self.__send_notify(msg)
+
+    @staticmethod
+    def __error_class(error_message: str) -> str:
+        """
+        错误类型，去除路径和数字后相同的错误归为一类
+        """
+        error_class = re.sub(r"(/[^\s:：,，]+)+", "<path>", str(error_message or "未知错误"))
+        error_class = re.sub(r"\d+", "#", error_class)
+        return error_class[:100]
 
     @eventmanager.register(EventType.PluginAction)
     def restart_cd2(self, event: Event = None):
@@ -222,27 +587,101 @@ class Cd2Assistant(_PluginBase):
 
         self._client.RestartService()
 
-    def __get_cloud_space(self):
+    def __init_snapshot(self):
         """
-        获取云盘空间
+        注册状态探测项
+        """
+        if self._snapshot:
+            self._snapshot.shutdown()
+        self._snapshot = ProbeSnapshot(workers=PROBE_WORKERS)
+        self._snapshot.register("running_info",
+                                partial(self.__probe_info, self._client.GetRunningInfo),
+                                PROBE_TTL.get("running_info"))
+        self._snapshot.register("task_count",
+                                partial(self.__probe_info, self._client.GetAllTasksCount),
+                                PROBE_TTL.get("task_count"))
+        self._snapshot.register("download_list",
+                                partial(self.__probe_info, self._client.GetDownloadFileList),
+                                PROBE_TTL.get("download_list"))
+        # 只需要总速度，不获取全部上传文件
+        self._snapshot.register("upload_list",
+                                partial(self.__probe_info, self._client.GetUploadFileList,
+                                        CloudDrive_pb2.GetUploadFileListRequest(itemsPerPage=1, pageNumber=0)),
+                                PROBE_TTL.get("upload_list"))
+        self._snapshot.register("roots", self.__probe_roots, PROBE_TTL.get("roots"))
+
+    def __probe_info(self, func: Callable, *args) -> dict:
+        """
+        调用gRPC接口并转换为字典
+        """
+        result = func(*args)
+        return self.__str_to_dict(result) if result else {}
+
+    def __probe_roots(self) -> List[str]:
+        """
+        获取云盘列表，并注册各云盘的空间探测项
         """
         fs = self._cd2_client.fs
         if not fs:
-            logger.error("CloudDrive2连接失败，请检查配置")
+            raise Exception("CloudDrive2连接失败，请检查配置")
+        black_dirs = (self._black_dir or "").split(",")
+        roots = [f for f in fs.listdir() if f and f not in black_dirs]
+        for f in roots:
+            self._snapshot.register(f"space:{f}",
+                                    partial(self.__probe_info, self._cd2_client.GetSpaceInfo,
+                                            CloudDrive_pb2.FileRequest(path=f)),
+                                    PROBE_TTL.get("space"))
+        self._snapshot.retain(lambda name: not name.startswith("space:") or name[len("space:"):] in roots)
+        return roots
+
+    def __collect_metrics(self):
+        """
+        采集运行指标
+        """
+        if not self._snapshot or not self._metrics:
             return
+        self._snapshot.refresh(wait=PROBE_WAIT)
+        system_info = self._snapshot.get("running_info", {})
+        task_count = self._snapshot.get("task_count", {})
+        download_info = self._snapshot.get("download_list", {})
+        upload_info = self._snapshot.get("upload_list", {})
+        spaces = {f: space_info.get("usedSpace") or 0
+                  for f, space_info in self._snapshot.items("space:").items()}
+        self._metrics.add({
+            "cpu": system_info.get("cpuUsage"),
+            "mem_mb": (system_info.get("memUsageKB") or 0) / 1024,
+            "download_bps": download_info.get("globalBytesPerSecond"),
+            "upload_bps": upload_info.get("globalBytesPerSecond"),
+            "dir_cache": system_info.get("dirCacheCount"),
+            "upload_count": task_count.get("uploadCount"),
+            "download_count": task_count.get("downloadCount"),
+            "used_bytes": sum(spaces.values()),
+        }, spaces=spaces)
+
+    def metrics(self, apikey: str, hours: float = 24, points: int = 300) -> Any:
+        """
+        查询运行指标
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not self._metrics:
+            return schemas.Response(success=False, message="未开启运行指标采集")
+        return self._metrics.query(seconds=float(hours) * 3600, max_points=int(points))
 
+    def __get_cloud_space(self):
+        """
+        获取云盘空间
+        """
+        spaces = self._snapshot.items("space:")
         _space_info = "\n"
-        for f in fs.listdir():
-            try:
-                if f and f not in self._black_dir.split(","):
-                    space_info = self._cd2_client.GetSpaceInfo(CloudDrive_pb2.FileRequest(path=f))
-                    space_info = self.__str_to_dict(space_info)
-                    total = self.__convert_bytes(space_info.get("totalSpace"))
-                    used = self.__convert_bytes(space_info.get("usedSpace"))
-                    free = self.__convert_bytes(space_info.get("freeSpace"))
-                    _space_info += f"{f}：{used}/{total}\n"
-            except Exception:
-                logger.error(f"获取云盘 {f} 空间信息失败")
+        for f in self._snapshot.get("roots", []):
+            space_info = spaces.get(f)
+            if not space_info:
+                logger.debug(f"云盘 {f} 暂无空间信息")
+                continue
+            total = self.__convert_bytes(space_info.get("totalSpace"))
+            used = self.__convert_bytes(space_info.get("usedSpace"))
+            _space_info += f"{f}：{used}/{total}\n"
 
         return _space_info
 
@@ -305,19 +744,25 @@ class Cd2Assistant(_PluginBase):
             if not event_data or event_data.get("action") != "cd2_info":
                 return
 
+        if not self._snapshot:
+            logger.error("CloudDrive2助手未连接，请检查配置")
+            return {}
+
+        # 从快照读取，过期的探测项在后台刷新，首次读取时等待探测结果
+        if self._snapshot.empty():
+            self._snapshot.refresh(wait=PROBE_WAIT)
+        else:
+            self._snapshot.refresh()
+
         # 运行信息
-        system_info = self._client.GetRunningInfo()
-        system_info = self.__str_to_dict(system_info) if system_info else {}
+        system_info = self._snapshot.get("running_info", {})
 
         # 任务数量
-        task_count = self._client.GetAllTasksCount()
-        task_count = self.__str_to_dict(task_count) if task_count else {}
+        task_count = self._snapshot.get("task_count", {})
 
         # 速度
-        downloadFileList = self._client.GetDownloadFileList()
-        downloadFileList = self.__str_to_dict(downloadFileList) if downloadFileList else {}
-        uploadFileList = self._client.GetUploadFileList(CloudDrive_pb2.GetUploadFileListRequest(getAll=True))
-        uploadFileList = self.__str_to_dict(uploadFileList) if uploadFileList else {}
+        downloadFileList = self._snapshot.get("download_list", {})
+        uploadFileList = self._snapshot.get("upload_list", {})
 
         # 云盘空间
         cloud_space = self.__get_cloud_space()
@@ -465,6 +910,12 @@ class Cd2Assistant(_PluginBase):
             "methods": ["GET"],
             "summary": "HomePage",
             "description": "HomePage自定义api",
+        }, {
+            "path": "/metrics",
+            "endpoint": self.metrics,
+            "methods": ["GET"],
+            "summary": "运行指标",
+            "description": "查询最近hours小时的CloudDrive2运行指标，按points点数聚合",
         }]
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
@@ -699,6 +1150,44 @@ class Cd2Assistant(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'metrics_interval',
+                                            'label': '运行指标采集间隔（秒）',
+                                            'placeholder': '留空不采集'
+                                        }
+                                    }
+                                ]
+                            },
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'task_retry',
+                                            'label': '自动重试异常上传任务',
+                                        }
+                                    }
+                                ]
+                            },
                         ]
                     },
                     {
@@ -715,7 +1204,7 @@ class Cd2Assistant(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '周期检测CloudDrive2上传任务，检测是否命中检测关键词，发送通知。'
+                                            'text': '周期检测CloudDrive2上传任务，检测是否命中检测关键词，发送通知。每次最多检查2000个上传任务，任务较多时分多次检查完整个队列；异常任务按错误类型汇总通知，开启自动重试后每个任务最多重试3次。'
                                         }
                                     }
                                 ]
@@ -813,6 +1302,8 @@ class Cd2Assistant(_PluginBase):
             "msgtype": "Manual",
             "black_dir": "",
             "cloud_path": "",
+            "metrics_interval": 60,
+            "task_retry": False,
         }
 
     def get_page(self) -> List[dict]:
@@ -1973,9 +2464,92 @@ class Cd2Assistant(_PluginBase):
 
                     ]
                 }]
+            # 运行指标图表
+            if self._metrics:
+                elements.append({
+                    'component': 'VRow',
+                    'content': self.__metrics_charts()
+                })
 
         return cols, attrs, elements
 
+    def __metrics_charts(self) -> List[dict]:
+        """
+        运行指标图表，只读取内存中的采样数据
+        """
+        data = self._metrics.query(seconds=CHART_HOURS * 3600, max_points=180)
+        fields = data.get("fields")
+        points = data.get("points")
+
+        def series(name: str, field: str, scale: float = 1) -> dict:
+            index = fields.index(field)
+            return {
+                'name': name,
+                'data': [[point[0] * 1000, round(point[index] / scale, 2)] for point in points]
+            }
+
+        def chart(title: str, chart_series: List[dict], yaxis: Any = None) -> dict:
+            return {
+                'component': 'VCol',
+                'props': {
+                    'cols': 12,
+                    'md': 6
+                },
+                'content': [
+                    {
+                        'component': 'VApexChart',
+                        'props': {
+                            'height': 240,
+                            'options': {
+                                'chart': {
+                                    'type': 'line',
+                                    'toolbar': {
+                                        'show': False
+                                    },
+                                    'animations': {
+                                        'enabled': False
+                                    }
+                                },
+                                'title': {
+                                    'text': title
+                                },
+                                'stroke': {
+                                    'width': 2
+                                },
+                                'xaxis': {
+                                    'type': 'datetime',
+                                    'labels': {
+                                        'datetimeUTC': False
+                                    }
+                                },
+                                'yaxis': yaxis or {},
+                                'legend': {
+                                    'show': True
+                                },
+                                'noData': {
+                                    'text': '暂无采样数据'
+                                }
+                            },
+                            'series': chart_series
+                        }
+                    }
+                ]
+            }
+
+        return [
+            chart(f'近{CHART_HOURS}小时传输速率（MB/s）', [
+                series('上传', 'upload_bps', 1024 * 1024),
+                series('下载', 'download_bps', 1024 * 1024),
+            ]),
+            chart(f'近{CHART_HOURS}小时目录缓存和CPU', [
+                series('目录缓存数量', 'dir_cache'),
+                series('CPU占用（%）', 'cpu'),
+            ], yaxis=[
+                {'title': {'text': '目录缓存数量'}},
+                {'opposite': True, 'title': {'text': 'CPU占用（%）'}},
+            ]),
+        ]
+
     def stop_service(self):
         """
         退出插件
@@ -1986,5 +2560,11 @@ class Cd2Assistant(_PluginBase):
                 if self._scheduler.running:
                     self._scheduler.shutdown()
                 self._scheduler = None
+            if self._snapshot:
+                self._snapshot.shutdown()
+                self._snapshot = None
+            if self._metrics:
+                self._metrics.save()
+                self._metrics = None
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
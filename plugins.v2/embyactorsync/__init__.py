@@ -1,10 +1,16 @@
 import json
 import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional, Any, List, Dict, Tuple
+from urllib.parse import urlencode, urlparse
 
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from app.core.config import settings
 from app.core.event import eventmanager, Event
@@ -12,7 +18,370 @@ from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType, MediaType
-from app.utils.http import RequestUtils
+
+
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class AdaptiveThrottle:
+    """
+    根据Emby响应耗时自适应调整请求间隔，响应变慢或失败时加大间隔，恢复后逐步缩小
+    """
+
+    def __init__(self, target_latency: float = 0.5, min_interval: float = 0.0, max_interval: float = 3.0):
+        self._target_latency = target_latency
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._latency = None
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        按当前间隔排队等待
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, latency: float, success: bool = True):
+        """
+        记录一次请求耗时，按指数加权平均调整间隔
+        """
+        with self._lock:
+            self._latency = latency if self._latency is None else self._latency * 0.8 + latency * 0.2
+            if not success or self._latency > self._target_latency:
+                self._interval = min(self._max_interval, max(self._interval * 2, 0.05))
+            else:
+                self._interval = max(self._min_interval, self._interval / 2)
+                if self._interval < 0.01:
+                    self._interval = self._min_interval
+
+    @property
+    def latency(self) -> float:
+        return self._latency or 0.0
+
+
+class LibrarySnapshot:
+    """
+    媒体库快照，记录媒体Etag及上次运行游标，增量获取上次运行后变化的媒体
+    """
+    # 超过该天数强制全量比对，兜底服务端未更新保存时间的变化
+    FULL_SCAN_DAYS = 7
+    # 游标回退时间，兼容服务器时间偏差，重复部分由Etag过滤
+    CURSOR_OVERLAP = timedelta(minutes=10)
+    PAGE_SIZE = 500
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = self.__load()
+
+    def __load(self) -> dict:
+        try:
+            if self._path.exists():
+                return json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取媒体库快照失败：{str(e)}")
+        return {}
+
+    def __save(self):
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self._path)
+
+    def changed_items(self, host: str, user: str, apikey: str, scope: str, parent_id,
+                      params: dict = None, signature: str = None) -> Tuple[Optional[list], dict]:
+        """
+        获取上次提交后变化的媒体，返回 (变化媒体列表, 待提交快照)，获取失败时返回 (None, {})
+        :param scope: 快照范围，如 服务器:媒体库Id
+        :param params: 额外的Items查询参数，如 IncludeItemTypes、Fields
+        :param signature: 插件配置签名，变化时视为全部媒体有变化
+        """
+        with self._lock:
+            state = self._data.get(scope) or {}
+        etags = state.get("etags") or {}
+        now = datetime.utcnow()
+        full_scan_time = state.get("full_scan_time")
+        signature_changed = state.get("signature") != signature
+        full_scan = (not state.get("cursor")
+                     or signature_changed
+                     or not full_scan_time
+                     or now - datetime.strptime(full_scan_time, "%Y-%m-%dT%H:%M:%SZ")
+                     > timedelta(days=self.FULL_SCAN_DAYS))
+
+        query = {
+            "ParentId": parent_id,
+            "Recursive": "true",
+        }
+        query.update(params or {})
+        query["Fields"] = ",".join(filter(None, ["Etag", "DateModified", query.get("Fields")]))
+        if not full_scan:
+            query["MinDateLastSaved"] = state.get("cursor")
+
+        items = self.__list_items(host, user, apikey, query)
+        if items is None:
+            return None, {}
+
+        changed = []
+        new_etags = {} if full_scan else dict(etags)
+        for item in items:
+            etag = item.get("Etag") or item.get("DateModified") or ""
+            new_etags[item.get("Id")] = etag
+            if signature_changed or etags.get(item.get("Id")) != etag:
+                changed.append(item)
+        logger.info(f"媒体库快照 {scope} {'全量' if full_scan else '增量'}获取 {len(items)} 个媒体，"
+                    f"变化 {len(changed)} 个")
+        return changed, {
+            "scope": scope,
+            "cursor": (now - self.CURSOR_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "full_scan_time": now.strftime("%Y-%m-%dT%H:%M:%SZ") if full_scan else full_scan_time,
+            "signature": signature,
+            "etags": new_etags,
+        }
+
+    def commit(self, pending: dict):
+        """
+        处理完成后提交快照，下次运行从此处增量获取
+        """
+        if not pending:
+            return
+        pending = dict(pending)
+        scope = pending.pop("scope")
+        with self._lock:
+            self._data[scope] = pending
+            try:
+                self.__save()
+            except Exception as e:
+                logger.error(f"保存媒体库快照失败：{str(e)}")
+
+    def __list_items(self, host: str, user: str, apikey: str, query: dict) -> Optional[list]:
+        """
+        分页获取媒体列表
+        """
+        items = []
+        start_index = 0
+        while True:
+            page_query = dict(query, StartIndex=start_index, Limit=self.PAGE_SIZE, api_key=apikey)
+            req_url = f"{host}emby/Users/{user}/Items?{urlencode(page_query)}"
+            try:
+                with EmbyClient.get(req_url) as res:
+                    if not res or res.status_code != 200:
+                        logger.error(f"获取媒体库快照失败，无法连接Emby！")
+                        return None
+                    result = res.json()
+            except Exception as e:
+                logger.error(f"连接媒体库Items出错：" + str(e))
+                return None
+            page_items = result.get("Items") or []
+            items.extend(page_items)
+            start_index += len(page_items)
+            if not page_items or start_index >= (result.get("TotalRecordCount") or 0):
+                return items
 
 
 class EmbyActorSync(_PluginBase):
@@ -23,7 +392,7 @@ class EmbyActorSync(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/embyactorsync.png"
     # 插件版本
-    plugin_version = "1.5"
+    plugin_version = "1.8.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -38,20 +407,26 @@ class EmbyActorSync(_PluginBase):
     _onlyonce = False
     _enabled = False
     _mediaservers = None
+    _concurrency = 4
 
     mediaserver_helper = None
     _EMBY_HOST = None
     _EMBY_USER = None
     _EMBY_APIKEY = None
     _scheduler: Optional[BackgroundScheduler] = None
+    _snapshot: Optional[LibrarySnapshot] = None
 
     def init_plugin(self, config: dict = None):
         self.mediaserver_helper = MediaServerHelper()
+        self._snapshot = LibrarySnapshot(self.get_data_path() / "library_snapshot.json")
 
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
             self._mediaservers = config.get("mediaservers") or []
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 4
 
             # 加载模块
             if self._onlyonce:
@@ -86,6 +461,7 @@ class EmbyActorSync(_PluginBase):
                 "enabled": self._enabled,
                 "onlyonce": self._onlyonce,
                 "mediaservers": self._mediaservers,
+                "concurrency": self._concurrency,
             }
         )
 
@@ -126,11 +502,8 @@ class EmbyActorSync(_PluginBase):
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+            EmbyClient.of(self._EMBY_HOST).set_concurrency(self._concurrency)
 
             # 获取媒体库信息
             librarys = emby_server.instance.get_librarys()
@@ -143,14 +516,27 @@ class EmbyActorSync(_PluginBase):
                     continue
 
                 # 获取媒体库媒体列表
-                library_items = self.__get_items(library.id)
+                library_items = self.__get_items(library.id, fields="People")
                 if not library_items:
                     logger.error(f"获取媒体库：{library.name}的媒体列表失败")
                     continue
 
                 logger.info(f"开始同步媒体库：{library.name}，ID：{library.id}")
 
+                # 全库同步时只处理上次同步后有变化的剧集
+                pending_snapshot = {}
+                if not media_name:
+                    changed, pending_snapshot = self._snapshot.changed_items(
+                        host=self._EMBY_HOST, user=self._EMBY_USER, apikey=self._EMBY_APIKEY,
+                        scope=f"{emby_name}:{library.id}", parent_id=library.id,
+                        params={"IncludeItemTypes": "Series,Season,Episode"})
+                    if changed is not None:
+                        changed_series = {item.get("SeriesId") or item.get("Id") for item in changed}
+                        library_items = [item for item in library_items if item.get("Id") in changed_series]
+                        logger.info(f"媒体库：{library.name} 有变化的剧集 {len(library_items)} 部")
+
                 # 遍历媒体列表，获取媒体的ID和名称
+                failed_cnt = 0
                 for item in library_items:
                     if media_name:
                         # 电影弹幕
@@ -159,77 +545,141 @@ class EmbyActorSync(_PluginBase):
                             continue
 
                     logger.info(f"开始同步媒体：{item.get('Name')}，ID：{item.get('Id')}")
-                    item_info = self.__get_item_info(item.get("Id"))
-                    seasons = self.__get_items(item.get("Id"))
+                    start_time = time.time()
+                    # 按季批量获取剧集演员信息，本地比对，只更新有变化的剧集
+                    changed_items = []
+                    scanned = 0
+                    seasons = self.__get_items(item.get("Id"), fields="People")
+                    if seasons is None:
+                        # 读取失败不能视为没有剧集，不推进快照
+                        failed_cnt += 1
+                        logger.error(f"获取媒体：{item.get('Name')} 的季列表失败")
+                        continue
                     for season in seasons:
-                        season_info = self.__get_item_info(season.get("Id"))
-                        peoples = season_info.get("People") or item_info.get("People")
-                        season_items = self.__get_items(season.get("Id"))
+                        peoples = season.get("People") or item.get("People")
+                        season_items = self.__get_items(season.get("Id"), fields="People")
+                        if season_items is None:
+                            failed_cnt += 1
+                            logger.error(f"获取媒体：{item.get('Name')} {season.get('Name')} 的剧集列表失败")
+                            continue
+                        scanned += len(season_items)
                         for season_item in season_items:
-                            retry = 0
-                            while retry < 3:
-                                season_item_info = self.__get_item_info(season_item.get("Id"))
-                                try:
-                                    if season_item_info.get("People") == peoples:
-                                        logger.warn(
-                                            f"媒体：{item.get('Name')} {season_item_info.get('SeasonName')} {season_item_info.get('IndexNumber')} {season_item_info.get('Name')} 演员信息已更新")
-                                        retry = 3
-                                        continue
-                                    season_item_info.update({
-                                        "People": peoples
-                                    })
-                                    season_item_info["LockedFields"].append("Cast")
-                                    flag = self.__update_item_info(season_item.get("Id"), season_item_info)
-                                    logger.info(
-                                        f"更新媒体：{item.get('Name')} {season_item_info.get('SeasonName')} {season_item_info.get('IndexNumber')} {season_item_info.get('Name')} 成功：{flag}")
-                                    if flag:
-                                        retry = 3
-                                        time.sleep(0.5)
-                                    else:
-                                        retry += 1
-                                except Exception as e:
-                                    retry += 1
-                                    logger.error(
-                                        f"更新媒体：{item.get('Name')} {season_item_info.get('SeasonName')} {season_item_info.get('IndexNumber')} {season_item_info.get('Name')} 信息出错：{e} 开始重试...{retry} / 3")
+                            if self.__people_key(season_item.get("People")) == self.__people_key(peoples):
+                                logger.debug(
+                                    f"媒体：{item.get('Name')} {season_item.get('SeasonName')} {season_item.get('IndexNumber')} {season_item.get('Name')} 演员信息已更新")
+                                continue
+                            changed_items.append((season_item, peoples))
+
+                    success_cnt = self.__update_peoples(item.get("Name"), changed_items)
+                    failed_cnt += len(changed_items) - success_cnt
+                    logger.info(f"媒体：{item.get('Name')} 同步完成，共 {scanned} 集，跳过 {scanned - len(changed_items)} 集，"
+                                f"更新成功 {success_cnt} 集，失败 {len(changed_items) - success_cnt} 集，"
+                                f"耗时 {round(time.time() - start_time, 2)} 秒")
                     if event:
                         self.post_message(channel=event.event_data.get("channel"),
                                           title=f"{library_name} {media_name} 同步完成",
                                           userid=event.event_data.get("user"))
+
+                # 有读取或更新失败的剧集时不推进快照，下次重新处理
+                if not failed_cnt:
+                    self._snapshot.commit(pending_snapshot)
             logger.info(f"{emby_name} 剧集演员同步完成")
+            EmbyClient.report()
+
+    @staticmethod
+    def __people_key(peoples: Optional[list]) -> list:
+        """
+        演员信息比对键，忽略图片等非关键字段
+        """
+        return [(people.get("Id"), people.get("Name"), people.get("Role"), people.get("Type"))
+                for people in peoples or []]
+
+    def __update_peoples(self, media_name: str, changed_items: List[tuple]) -> int:
+        """
+        并发更新剧集演员信息，按Emby响应耗时自适应限速，返回成功数量
+        """
+        if not changed_items:
+            return 0
+        throttle = AdaptiveThrottle()
+        success_cnt = 0
+        with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+            futures = {executor.submit(self.__update_people, throttle, season_item, peoples): season_item
+                       for season_item, peoples in changed_items}
+            for future in as_completed(futures):
+                season_item = futures[future]
+                title = f"{media_name} {season_item.get('SeasonName')} {season_item.get('IndexNumber')} {season_item.get('Name')}"
+                try:
+                    flag = future.result()
+                except Exception as e:
+                    flag = False
+                    logger.error(f"更新媒体：{title} 信息出错：{e}")
+                logger.info(f"更新媒体：{title} 成功：{flag}")
+                if flag:
+                    success_cnt += 1
+        logger.info(f"媒体：{media_name} 平均响应耗时 {round(throttle.latency, 3)} 秒")
+        return success_cnt
+
+    def __update_people(self, throttle: AdaptiveThrottle, season_item: dict, peoples: list) -> bool:
+        """
+        更新单集演员信息，失败重试3次
+        """
+        for retry in range(3):
+            throttle.wait()
+            start_time = time.monotonic()
+            flag = False
+            try:
+                # 更新需提交完整媒体信息
+                season_item_info = self.__get_item_info(season_item.get("Id"))
+                if season_item_info:
+                    season_item_info.update({
+                        "People": peoples
+                    })
+                    locked_fields = season_item_info.setdefault("LockedFields", [])
+                    if "Cast" not in locked_fields:
+                        locked_fields.append("Cast")
+                    flag = self.__update_item_info(season_item.get("Id"), season_item_info)
+            except Exception as e:
+                logger.error(f"更新媒体：{season_item.get('Name')} 信息出错：{e} 开始重试...{retry + 1} / 3")
+            throttle.record(time.monotonic() - start_time, flag)
+            if flag:
+                return True
+        return False
 
     def __update_item_info(self, item_id, data):
         headers = {
             'accept': '*/*',
             'Content-Type': 'application/json'
         }
-        res = RequestUtils(headers=headers).post(
+        res = EmbyClient.post(
             f"{self._EMBY_HOST}/emby/Items/{item_id}?api_key={self._EMBY_APIKEY}",
-            data=json.dumps(data))
+            data=json.dumps(data), headers=headers)
         if res and res.status_code == 204:
             return True
         return False
 
-    def __get_items(self, parent_id) -> list:
+    def __get_items(self, parent_id, fields: str = None) -> Optional[list]:
         """
-        获取媒体库媒体列表
+        获取媒体库媒体列表，获取失败时返回None
         """
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return []
+            return None
         req_url = f"%semby/Users/%s/Items?ParentId=%s&api_key=%s" % (
             self._EMBY_HOST, self._EMBY_USER, parent_id, self._EMBY_APIKEY)
+        if fields:
+            req_url += f"&Fields={fields}"
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
-                    return res.json().get("Items")
+                    return res.json().get("Items") or []
                 else:
                     logger.info(f"获取媒体库媒体列表失败，无法连接Emby！")
-                    return []
+                    return None
         except Exception as e:
             logger.error(f"连接媒体库媒体列表Items出错：" + str(e))
-            return []
+            return None
 
     def __get_item_info(self, item_id):
-        res = RequestUtils().get_res(
+        res = EmbyClient.get(
             f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items/{item_id}?api_key={self._EMBY_APIKEY}")
         if res and res.status_code == 200:
             return res.json()
@@ -295,6 +745,23 @@ class EmbyActorSync(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '并发数',
+                                            'placeholder': '同时更新的剧集数量，默认4'
+                                        }
+                                    }
+                                ]
+                            },
                         ]
                     },
                     {
@@ -350,6 +817,7 @@ class EmbyActorSync(_PluginBase):
             "enabled": False,
             "onlyonce": False,
             "mediaservers": [],
+            "concurrency": 4,
         }
 
     def get_page(self) -> List[dict]:
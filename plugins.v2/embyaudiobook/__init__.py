@@ -1,12 +1,16 @@
-import datetime
 import json
 import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional
+from urllib.parse import urlencode, urlparse
 
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -17,7 +21,370 @@ from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas import NotificationType
 from app.schemas.types import EventType
-from app.utils.http import RequestUtils
+
+
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class AdaptiveThrottle:
+    """
+    根据Emby响应耗时自适应调整请求间隔，响应变慢或失败时加大间隔，恢复后逐步缩小
+    """
+
+    def __init__(self, target_latency: float = 0.5, min_interval: float = 0.0, max_interval: float = 3.0):
+        self._target_latency = target_latency
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._latency = None
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        按当前间隔排队等待
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, latency: float, success: bool = True):
+        """
+        记录一次请求耗时，按指数加权平均调整间隔
+        """
+        with self._lock:
+            self._latency = latency if self._latency is None else self._latency * 0.8 + latency * 0.2
+            if not success or self._latency > self._target_latency:
+                self._interval = min(self._max_interval, max(self._interval * 2, 0.05))
+            else:
+                self._interval = max(self._min_interval, self._interval / 2)
+                if self._interval < 0.01:
+                    self._interval = self._min_interval
+
+    @property
+    def latency(self) -> float:
+        return self._latency or 0.0
+
+
+class LibrarySnapshot:
+    """
+    媒体库快照，记录媒体Etag及上次运行游标，增量获取上次运行后变化的媒体
+    """
+    # 超过该天数强制全量比对，兜底服务端未更新保存时间的变化
+    FULL_SCAN_DAYS = 7
+    # 游标回退时间，兼容服务器时间偏差，重复部分由Etag过滤
+    CURSOR_OVERLAP = timedelta(minutes=10)
+    PAGE_SIZE = 500
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = self.__load()
+
+    def __load(self) -> dict:
+        try:
+            if self._path.exists():
+                return json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取媒体库快照失败：{str(e)}")
+        return {}
+
+    def __save(self):
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self._path)
+
+    def changed_items(self, host: str, user: str, apikey: str, scope: str, parent_id,
+                      params: dict = None, signature: str = None) -> Tuple[Optional[list], dict]:
+        """
+        获取上次提交后变化的媒体，返回 (变化媒体列表, 待提交快照)，获取失败时返回 (None, {})
+        :param scope: 快照范围，如 服务器:媒体库Id
+        :param params: 额外的Items查询参数，如 IncludeItemTypes、Fields
+        :param signature: 插件配置签名，变化时视为全部媒体有变化
+        """
+        with self._lock:
+            state = self._data.get(scope) or {}
+        etags = state.get("etags") or {}
+        now = datetime.utcnow()
+        full_scan_time = state.get("full_scan_time")
+        signature_changed = state.get("signature") != signature
+        full_scan = (not state.get("cursor")
+                     or signature_changed
+                     or not full_scan_time
+                     or now - datetime.strptime(full_scan_time, "%Y-%m-%dT%H:%M:%SZ")
+                     > timedelta(days=self.FULL_SCAN_DAYS))
+
+        query = {
+            "ParentId": parent_id,
+            "Recursive": "true",
+        }
+        query.update(params or {})
+        query["Fields"] = ",".join(filter(None, ["Etag", "DateModified", query.get("Fields")]))
+        if not full_scan:
+            query["MinDateLastSaved"] = state.get("cursor")
+
+        items = self.__list_items(host, user, apikey, query)
+        if items is None:
+            return None, {}
+
+        changed = []
+        new_etags = {} if full_scan else dict(etags)
+        for item in items:
+            etag = item.get("Etag") or item.get("DateModified") or ""
+            new_etags[item.get("Id")] = etag
+            if signature_changed or etags.get(item.get("Id")) != etag:
+                changed.append(item)
+        logger.info(f"媒体库快照 {scope} {'全量' if full_scan else '增量'}获取 {len(items)} 个媒体，"
+                    f"变化 {len(changed)} 个")
+        return changed, {
+            "scope": scope,
+            "cursor": (now - self.CURSOR_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "full_scan_time": now.strftime("%Y-%m-%dT%H:%M:%SZ") if full_scan else full_scan_time,
+            "signature": signature,
+            "etags": new_etags,
+        }
+
+    def commit(self, pending: dict):
+        """
+        处理完成后提交快照，下次运行从此处增量获取
+        """
+        if not pending:
+            return
+        pending = dict(pending)
+        scope = pending.pop("scope")
+        with self._lock:
+            self._data[scope] = pending
+            try:
+                self.__save()
+            except Exception as e:
+                logger.error(f"保存媒体库快照失败：{str(e)}")
+
+    def __list_items(self, host: str, user: str, apikey: str, query: dict) -> Optional[list]:
+        """
+        分页获取媒体列表
+        """
+        items = []
+        start_index = 0
+        while True:
+            page_query = dict(query, StartIndex=start_index, Limit=self.PAGE_SIZE, api_key=apikey)
+            req_url = f"{host}emby/Users/{user}/Items?{urlencode(page_query)}"
+            try:
+                with EmbyClient.get(req_url) as res:
+                    if not res or res.status_code != 200:
+                        logger.error(f"获取媒体库快照失败，无法连接Emby！")
+                        return None
+                    result = res.json()
+            except Exception as e:
+                logger.error(f"连接媒体库Items出错：" + str(e))
+                return None
+            page_items = result.get("Items") or []
+            items.extend(page_items)
+            start_index += len(page_items)
+            if not page_items or start_index >= (result.get("TotalRecordCount") or 0):
+                return items
 
 
 class EmbyAudioBook(_PluginBase):
@@ -28,7 +395,7 @@ class EmbyAudioBook(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/audiobook.png"
     # 插件版本
-    plugin_version = "1.4"
+    plugin_version = "1.7.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -55,12 +422,18 @@ class EmbyAudioBook(_PluginBase):
     _EMBY_HOST = None
     _EMBY_USER = None
     _EMBY_APIKEY = None
+    _snapshot: Optional[LibrarySnapshot] = None
+    _concurrency = 4
+    _page_size = 500
+    # 有变化的有声书超过该数量时一次分页获取全部剧集，否则逐本获取
+    _bulk_books = 20
 
     # 退出事件
     _event = threading.Event()
 
     def init_plugin(self, config: dict = None):
         self.mediaserver_helper = MediaServerHelper()
+        self._snapshot = LibrarySnapshot(self.get_data_path() / "library_snapshot.json")
 
         # 读取配置
         if config:
@@ -72,6 +445,9 @@ class EmbyAudioBook(_PluginBase):
             self._rename = config.get("rename")
             self._msgtype = config.get("msgtype")
             self._mediaservers = config.get("mediaservers") or []
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 4
 
             # 停止现有任务
             self.stop_service()
@@ -95,8 +471,8 @@ class EmbyAudioBook(_PluginBase):
                 if self._onlyonce:
                     logger.info("Emby有声书整理服务启动，立即运行一次")
                     self._scheduler.add_job(name="Emby有声书整理", func=self.check, trigger='date',
-                                            run_date=datetime.datetime.now(
-                                                tz=pytz.timezone(settings.TZ)) + datetime.timedelta(seconds=3)
+                                            run_date=datetime.now(
+                                                tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3)
                                             )
                     # 关闭一次性开关
                     self._onlyonce = False
@@ -121,6 +497,7 @@ class EmbyAudioBook(_PluginBase):
             "notify": self._notify,
             "msgtype": self._msgtype,
             "mediaservers": self._mediaservers,
+            "concurrency": self._concurrency,
         })
 
     def check(self):
@@ -137,11 +514,8 @@ class EmbyAudioBook(_PluginBase):
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+            EmbyClient.of(self._EMBY_HOST).set_concurrency(self._concurrency)
 
             # 获取所有有声书
             items = self.__get_items(parent_id=int(self._library_id))
@@ -149,9 +523,45 @@ class EmbyAudioBook(_PluginBase):
                 logger.error(f"获取媒体库 {self._library_id} 有声书列表失败！")
                 return
 
+            # 只检查上次运行后有变化的有声书
+            changed, pending_snapshot = self._snapshot.changed_items(
+                host=self._EMBY_HOST, user=self._EMBY_USER, apikey=self._EMBY_APIKEY,
+                scope=f"{emby_name}:{self._library_id}", parent_id=self._library_id,
+                params={"Fields": "ParentId"})
+            if changed is not None:
+                changed_books = {change.get("Id") if str(change.get("ParentId")) == str(self._library_id)
+                                 else change.get("ParentId") for change in changed}
+                items = [item for item in items if item.get("Id") in changed_books]
+                logger.info(f"有声书库 {self._library_id} 有变化的有声书 {len(items)} 本")
+
+            # 首次运行、全量比对等有变化的有声书较多时一次分页获取全部剧集，少量变化时只获取有变化的有声书的剧集
+            book_tracks = {}
+            if items and (changed is None or len(items) > self._bulk_books):
+                tracks = self.__list_items({
+                    "ParentId": self._library_id,
+                    "Recursive": "true",
+                    "IncludeItemTypes": "Audio",
+                    "Fields": "ParentId",
+                })
+                for track in tracks or []:
+                    book_tracks.setdefault(str(track.get("ParentId")), []).append(track)
+            else:
+                for item in items:
+                    tracks = self.__list_items({
+                        "ParentId": item.get("Id"),
+                        "IncludeItemTypes": "Audio",
+                        "Fields": "ParentId",
+                    })
+                    if tracks:
+                        book_tracks[str(item.get("Id"))] = tracks
+
             # 检查有声书是否需要整理
+            failed_cnt = 0
             for item in items:
-                book_items = self.__get_items(item.get("Id"))
+                book_items = book_tracks.get(str(item.get("Id")))
+                if not book_items:
+                    # 剧集不在有声书目录下一级时单独获取
+                    book_items = self.__get_items(item.get("Id"))
                 if not book_items:
                     logger.error(f"获取 {item.get('Name')} {item.get('Id')} 有声书失败！")
                     return
@@ -178,13 +588,27 @@ class EmbyAudioBook(_PluginBase):
                 else:
                     # 不需要整理的锁定
                     other_book_info = self.__get_item_info(item.get("Id"))
+                    if not other_book_info:
+                        failed_cnt += 1
+                        continue
+                    if other_book_info.get("LockData"):
+                        continue
                     other_book_info.update({
                         "LockData": True,
                     })
-                    self.__update_item_info(item.get("Id"), other_book_info)
+                    if not self.__update_item_info(item.get("Id"), other_book_info):
+                        failed_cnt += 1
+                        logger.error(f"有声书 {item.get('Name')} 锁定失败")
+                        continue
                     logger.info(f"有声书 {item.get('Name')} 不需要整理，已锁定")
 
+            # 有锁定失败的有声书时不推进快照，下次重新处理
+            if not failed_cnt:
+                self._snapshot.commit(pending_snapshot)
+            else:
+                logger.warning(f"{emby_name} 有 {failed_cnt} 本有声书锁定失败，下次运行时重新处理")
             logger.info(f"{emby_name} 有声书整理服务执行完毕")
+            EmbyClient.report()
 
     @eventmanager.register(EventType.PluginAction)
     def audiobook(self, event: Event = None):
@@ -231,11 +655,8 @@ class EmbyAudioBook(_PluginBase):
                 logger.info(f"开始处理媒体服务器 {emby_name}")
                 self._EMBY_USER = emby_server.instance.get_user()
                 self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-                self._EMBY_HOST = emby_server.config.config.get("host")
-                if not self._EMBY_HOST.endswith("/"):
-                    self._EMBY_HOST += "/"
-                if not self._EMBY_HOST.startswith("http"):
-                    self._EMBY_HOST = "http://" + self._EMBY_HOST
+                self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+                EmbyClient.of(self._EMBY_HOST).set_concurrency(self._concurrency)
 
                 # 获取所有有声书
                 items = self.__get_items(self._library_id)
@@ -262,7 +683,10 @@ class EmbyAudioBook(_PluginBase):
                                       userid=event.event_data.get("user"))
                     return
 
-                items = self.__get_items(book_id)
+                items = self.__list_items({
+                    "ParentId": book_id,
+                    "Fields": "Path",
+                })
                 if not items:
                     logger.error(f"获取 {book_name} {book_id} 有声书失败！")
                     self.post_message(channel=event.event_data.get("channel"),
@@ -282,50 +706,26 @@ class EmbyAudioBook(_PluginBase):
 
     def __zl(self, items, book_idx):
         """
-        有声书整理
+        有声书整理，本地计算每集应有的专辑及集数信息，只更新信息不一致的剧集
         """
-        AlbumId = None
-        Album = None
-        AlbumPrimaryImageTag = None
-        Artists = None
-        ArtistItems = None
-        Composers = None
-        AlbumArtist = None
-        AlbumArtists = None
-        ParentIndexNumber = None
-
+        album_info = None
         if book_idx == -1:
             for item in items:
-                AlbumId = item.get("AlbumId")
-                if not AlbumId:
+                if not item.get("AlbumId"):
                     continue
-
-                Album = item.get("Album")
-                AlbumPrimaryImageTag = item.get("AlbumPrimaryImageTag")
-                Artists = item.get("Artists")
-                ArtistItems = item.get("ArtistItems")
-                Composers = item.get("Composers")
-                AlbumArtist = item.get("AlbumArtist")
-                AlbumArtists = item.get("AlbumArtists")
-                ParentIndexNumber = item.get("ParentIndexNumber")
-                if AlbumId and Album and Artists and AlbumArtist and AlbumArtists and ParentIndexNumber:
-                    logger.info(
-                        f"从集数 {item.get('IndexNumber')} 获取到有声书信息：{Album} - {Artists} - {Composers} - {AlbumArtist} - {AlbumArtists} - {ParentIndexNumber}")
+                album_info = self.__album_info(item)
+                if all(album_info.get(key) for key in ["AlbumId", "Album", "Artists", "AlbumArtist",
+                                                       "AlbumArtists", "ParentIndexNumber"]):
+                    logger.info(f"从集数 {item.get('IndexNumber')} 获取到有声书信息：{self.__album_desc(album_info)}")
                     break
         else:
-            Album = items[book_idx - 1].get("Album")
-            AlbumId = items[book_idx - 1].get("AlbumId")
-            AlbumPrimaryImageTag = items[book_idx - 1].get("AlbumPrimaryImageTag")
-            Artists = items[book_idx - 1].get("Artists")
-            ArtistItems = items[book_idx - 1].get("ArtistItems")
-            Composers = items[book_idx - 1].get("Composers")
-            AlbumArtist = items[book_idx - 1].get("AlbumArtist")
-            AlbumArtists = items[book_idx - 1].get("AlbumArtists")
-            ParentIndexNumber = items[book_idx - 1].get("ParentIndexNumber")
-            logger.info(
-                f"从集数 {book_idx} 获取到有声书信息：{Album} - {Artists} - {Composers} - {AlbumArtist} - {AlbumArtists} - {ParentIndexNumber}")
-
-        # 更新有声书信息
+            album_info = self.__album_info(items[book_idx - 1])
+            logger.info(f"从集数 {book_idx} 获取到有声书信息：{self.__album_desc(album_info)}")
+        if not album_info:
+            album_info = self.__album_info({})
+
+        # 本地计算需要更新的剧集
+        changes = []
         for i, item in enumerate(items):
             episode = i + 1
             # 使用正则表达式匹配集数
@@ -337,56 +737,93 @@ class EmbyAudioBook(_PluginBase):
                 match = re.search(r'\d+', item.get("Name"))
                 if match:
                     # 提取数字
-                    episode = match.group()
-
-            if Album == item.get("Album") and \
-                    AlbumId == item.get("AlbumId") and \
-                    AlbumPrimaryImageTag == item.get("AlbumPrimaryImageTag") and \
-                    Artists == item.get("Artists") and \
-                    ArtistItems == item.get("ArtistItems") and \
-                    Composers == item.get("Composers") and \
-                    AlbumArtist == item.get("AlbumArtist") and \
-                    AlbumArtists == item.get("AlbumArtists") and not self._rename:
-                logger.info(f"有声书 第{episode}集 {item.get('Name')} 信息完整，跳过！")
+                    episode = int(match.group())
+
+            fields = dict(album_info, IndexNumber=episode)
+            if (item.get("Name") == "filename" or self._rename) and item.get("Path"):
+                fields["Name"] = Path(Path(item.get("Path")).name).stem
+            if all(item.get(key) == value for key, value in fields.items()):
+                logger.debug(f"有声书 第{episode}集 {item.get('Name')} 信息完整，跳过！")
                 continue
+            changes.append((item, fields))
 
-            retry = 0
-            while retry < 3:
-                try:
-                    # 获取有声书信息
-                    item_info = self.__get_item_info(item.get("Id"))
+        logger.info(f"{album_info.get('Album')} 共 {len(items)} 集，需要更新 {len(changes)} 集")
+        self.__update_tracks(album_info.get("Album"), changes)
 
-                    # 重命名前判断名称是否一致
-                    if self._rename and item.get("Name") == Path(Path(item_info.get("Path")).name).stem:
-                        logger.info(f"有声书 第{episode}集 {item.get('Name')} 名称相同，跳过！")
-                        continue
+    @staticmethod
+    def __album_info(item: dict) -> dict:
+        """
+        剧集中需要统一的有声书信息
+        """
+        return {
+            "Album": item.get("Album"),
+            "AlbumId": item.get("AlbumId"),
+            "AlbumPrimaryImageTag": item.get("AlbumPrimaryImageTag"),
+            "Artists": item.get("Artists"),
+            "ArtistItems": item.get("ArtistItems"),
+            "Composers": item.get("Composers"),
+            "AlbumArtist": item.get("AlbumArtist"),
+            "AlbumArtists": item.get("AlbumArtists"),
+            "ParentIndexNumber": item.get("ParentIndexNumber"),
+        }
+
+    @staticmethod
+    def __album_desc(album_info: dict) -> str:
+        return (f"{album_info.get('Album')} - {album_info.get('Artists')} - {album_info.get('Composers')} - "
+                f"{album_info.get('AlbumArtist')} - {album_info.get('AlbumArtists')} - "
+                f"{album_info.get('ParentIndexNumber')}")
+
+    def __update_tracks(self, album: str, changes: List[tuple]) -> int:
+        """
+        并发更新有声书剧集信息，按Emby响应耗时自适应限速，返回成功数量
+        """
+        if not changes:
+            return 0
+        throttle = AdaptiveThrottle()
+        success_cnt = 0
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+            futures = {executor.submit(self.__update_track, throttle, item, fields): (item, fields)
+                       for item, fields in changes}
+            for future in as_completed(futures):
+                item, fields = futures[future]
+                try:
+                    flag = future.result()
+                except Exception as e:
+                    flag = False
+                    logger.error(f"更新有声书 第{fields.get('IndexNumber')}集 {item.get('Name')} 信息出错：{e}")
+                logger.info(f"{album} 第{fields.get('IndexNumber')}集 {fields.get('Name') or item.get('Name')} "
+                            f"更新{'成功' if flag else '失败'}")
+                if flag:
+                    success_cnt += 1
+        logger.info(f"{album} 更新完成：成功 {success_cnt} 集，失败 {len(changes) - success_cnt} 集，"
+                    f"耗时 {round(time.monotonic() - start_time, 1)} 秒，平均响应耗时 {round(throttle.latency, 3)} 秒")
+        return success_cnt
 
+    def __update_track(self, throttle: AdaptiveThrottle, item: dict, fields: dict) -> bool:
+        """
+        更新单集有声书信息，失败重试3次
+        """
+        for retry in range(3):
+            throttle.wait()
+            start_time = time.monotonic()
+            flag = False
+            try:
+                # 更新需提交完整媒体信息
+                item_info = self.__get_item_info(item.get("Id"))
+                if item_info:
+                    item_info.update(fields)
                     item_info.update({
-                        "Album": Album,
-                        "AlbumId": AlbumId,
-                        "AlbumPrimaryImageTag": AlbumPrimaryImageTag,
-                        "Artists": Artists,
-                        "ArtistItems": ArtistItems,
-                        "Composers": Composers,
-                        "AlbumArtist": AlbumArtist,
-                        "AlbumArtists": AlbumArtists,
-                        "ParentIndexNumber": ParentIndexNumber,
-                        "IndexNumber": episode,
                         "LockData": True,
                     })
-                    retry = 3
-                except Exception as e:
-                    retry += 1
-                    logger.error(f"更新有声书 第{episode}集 {item.get('Name')} 信息出错：{e} 开始重试...{retry} / 3")
-                    continue
-
-            if item_info.get("Name") == "filename" or self._rename:
-                item_info.update({
-                    "Name": Path(Path(item_info.get("Path")).name).stem
-                })
-            flag = self.__update_item_info(item.get("Id"), item_info)
-            logger.info(f"{Album} 第{episode}集 {item_info.get('Name')} 更新{'成功' if flag else '失败'}")
-            time.sleep(0.5)
+                    flag = self.__update_item_info(item.get("Id"), item_info)
+            except Exception as e:
+                logger.error(f"更新有声书 第{fields.get('IndexNumber')}集 {item.get('Name')} 信息出错：{e} "
+                             f"开始重试...{retry + 1} / 3")
+            throttle.record(time.monotonic() - start_time, flag)
+            if flag:
+                return True
+        return False
 
     def get_state(self) -> bool:
         return self._enabled
@@ -400,7 +837,7 @@ class EmbyAudioBook(_PluginBase):
         req_url = f"%semby/Users/%s/Items?ParentId=%s&api_key=%s" % (
             self._EMBY_HOST, self._EMBY_USER, parent_id, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.json().get("Items")
                 else:
@@ -410,6 +847,32 @@ class EmbyAudioBook(_PluginBase):
             logger.error(f"连接有声书Items出错：" + str(e))
             return []
 
+    def __list_items(self, params: dict) -> Optional[list]:
+        """
+        分页获取媒体列表，获取失败时返回None
+        """
+        if not self._EMBY_HOST or not self._EMBY_APIKEY:
+            return None
+        items = []
+        start_index = 0
+        while True:
+            query = dict(params, StartIndex=start_index, Limit=self._page_size, api_key=self._EMBY_APIKEY)
+            req_url = f"{self._EMBY_HOST}emby/Users/{self._EMBY_USER}/Items?{urlencode(query)}"
+            try:
+                with EmbyClient.get(req_url) as res:
+                    if not res or res.status_code != 200:
+                        logger.info(f"获取有声书剧集失败，无法连接Emby！")
+                        return None
+                    result = res.json()
+            except Exception as e:
+                logger.error(f"连接有声书Items出错：" + str(e))
+                return None
+            page_items = result.get("Items") or []
+            items.extend(page_items)
+            start_index += len(page_items)
+            if not page_items or start_index >= (result.get("TotalRecordCount") or 0):
+                return items
+
     def __get_item_info(self, item_id) -> dict:
         """
         获取有声书剧集详情
@@ -418,7 +881,7 @@ class EmbyAudioBook(_PluginBase):
             return {}
         req_url = f"%semby/Users/%s/Items/%s?fields=ShareLevel&ExcludeFields=Chapters,Overview,People,MediaStreams,Subviews&api_key=%s" % (
             self._EMBY_HOST, self._EMBY_USER, item_id, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
+        with EmbyClient.get(req_url) as res:
             if res:
                 return res.json()
             else:
@@ -430,9 +893,9 @@ class EmbyAudioBook(_PluginBase):
             'accept': '*/*',
             'Content-Type': 'application/json'
         }
-        res = RequestUtils(headers=headers).post(
+        res = EmbyClient.post(
             f"{self._EMBY_HOST}/emby/Items/{item_id}?api_key={self._EMBY_APIKEY}",
-            data=json.dumps(data))
+            data=json.dumps(data), headers=headers)
         if res and res.status_code == 204:
             return True
         return False
@@ -601,7 +1064,8 @@ class EmbyAudioBook(_PluginBase):
                             {
                                 'component': 'VCol',
                                 'props': {
-                                    'cols': 12
+                                    'cols': 12,
+                                    'md': 8
                                 },
                                 'content': [
                                     {
@@ -618,6 +1082,23 @@ class EmbyAudioBook(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '并发数',
+                                            'placeholder': '整理时同时更新的剧集数量，默认4'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -653,6 +1134,7 @@ class EmbyAudioBook(_PluginBase):
             "msgtype": "",
             "library_id": "",
             "mediaservers": [],
+            "concurrency": 4,
         }
 
     def get_page(self) -> List[dict]:
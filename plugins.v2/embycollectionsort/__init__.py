@@ -1,10 +1,17 @@
 import json
+import re
 import threading
 import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional, Any, List, Dict, Tuple
+from urllib.parse import urlencode, urlparse
 
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -14,9 +21,363 @@ from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType
-from app.utils.http import RequestUtils
 
-lock = threading.Lock()
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class LibrarySnapshot:
+    """
+    媒体库快照，记录媒体Etag及上次运行游标，增量获取上次运行后变化的媒体
+    """
+    # 超过该天数强制全量比对，兜底服务端未更新保存时间的变化
+    FULL_SCAN_DAYS = 7
+    # 游标回退时间，兼容服务器时间偏差，重复部分由Etag过滤
+    CURSOR_OVERLAP = timedelta(minutes=10)
+    PAGE_SIZE = 500
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = self.__load()
+
+    def __load(self) -> dict:
+        try:
+            if self._path.exists():
+                return json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取媒体库快照失败：{str(e)}")
+        return {}
+
+    def __save(self):
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self._path)
+
+    def changed_items(self, host: str, user: str, apikey: str, scope: str, parent_id,
+                      params: dict = None, signature: str = None) -> Tuple[Optional[list], dict]:
+        """
+        获取上次提交后变化的媒体，返回 (变化媒体列表, 待提交快照)，获取失败时返回 (None, {})
+        :param scope: 快照范围，如 服务器:媒体库Id
+        :param params: 额外的Items查询参数，如 IncludeItemTypes、Fields
+        :param signature: 插件配置签名，变化时视为全部媒体有变化
+        """
+        with self._lock:
+            state = self._data.get(scope) or {}
+        etags = state.get("etags") or {}
+        now = datetime.utcnow()
+        full_scan_time = state.get("full_scan_time")
+        signature_changed = state.get("signature") != signature
+        full_scan = (not state.get("cursor")
+                     or signature_changed
+                     or not full_scan_time
+                     or now - datetime.strptime(full_scan_time, "%Y-%m-%dT%H:%M:%SZ")
+                     > timedelta(days=self.FULL_SCAN_DAYS))
+
+        query = {
+            "ParentId": parent_id,
+            "Recursive": "true",
+        }
+        query.update(params or {})
+        query["Fields"] = ",".join(filter(None, ["Etag", "DateModified", query.get("Fields")]))
+        if not full_scan:
+            query["MinDateLastSaved"] = state.get("cursor")
+
+        items = self.__list_items(host, user, apikey, query)
+        if items is None:
+            return None, {}
+
+        changed = []
+        new_etags = {} if full_scan else dict(etags)
+        for item in items:
+            etag = item.get("Etag") or item.get("DateModified") or ""
+            new_etags[item.get("Id")] = etag
+            if signature_changed or etags.get(item.get("Id")) != etag:
+                changed.append(item)
+        logger.info(f"媒体库快照 {scope} {'全量' if full_scan else '增量'}获取 {len(items)} 个媒体，"
+                    f"变化 {len(changed)} 个")
+        return changed, {
+            "scope": scope,
+            "cursor": (now - self.CURSOR_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "full_scan_time": now.strftime("%Y-%m-%dT%H:%M:%SZ") if full_scan else full_scan_time,
+            "signature": signature,
+            "etags": new_etags,
+        }
+
+    def commit(self, pending: dict):
+        """
+        处理完成后提交快照，下次运行从此处增量获取
+        """
+        if not pending:
+            return
+        pending = dict(pending)
+        scope = pending.pop("scope")
+        with self._lock:
+            self._data[scope] = pending
+            try:
+                self.__save()
+            except Exception as e:
+                logger.error(f"保存媒体库快照失败：{str(e)}")
+
+    def __list_items(self, host: str, user: str, apikey: str, query: dict) -> Optional[list]:
+        """
+        分页获取媒体列表
+        """
+        items = []
+        start_index = 0
+        while True:
+            page_query = dict(query, StartIndex=start_index, Limit=self.PAGE_SIZE, api_key=apikey)
+            req_url = f"{host}emby/Users/{user}/Items?{urlencode(page_query)}"
+            try:
+                with EmbyClient.get(req_url) as res:
+                    if not res or res.status_code != 200:
+                        logger.error(f"获取媒体库快照失败，无法连接Emby！")
+                        return None
+                    result = res.json()
+            except Exception as e:
+                logger.error(f"连接媒体库Items出错：" + str(e))
+                return None
+            page_items = result.get("Items") or []
+            items.extend(page_items)
+            start_index += len(page_items)
+            if not page_items or start_index >= (result.get("TotalRecordCount") or 0):
+                return items
+
+
+class ReservedTimeIndex:
+    """
+    已预留入库时间区间索引，区间以秒为单位，有序且互不相交，相邻区间自动合并
+    """
+
+    def __init__(self):
+        self._starts: List[int] = []
+        self._ends: List[int] = []
+
+    def reserve(self, end: int, length: int) -> int:
+        """
+        预留以end结尾、长度为length秒的连续区间，与已预留区间冲突时整体后移到冲突区间之后，返回实际区间结尾
+        """
+        while True:
+            start = end - length + 1
+            # 第一个结尾不早于start的区间，若其开始不晚于end则冲突
+            idx = bisect_left(self._ends, start)
+            if idx < len(self._starts) and self._starts[idx] <= end:
+                end = self._ends[idx] + length
+                continue
+            break
+        # 与前后相邻区间合并
+        if idx > 0 and self._ends[idx - 1] + 1 == start:
+            idx -= 1
+            start = self._starts[idx]
+            del self._starts[idx], self._ends[idx]
+        if idx < len(self._starts) and self._starts[idx] == end + 1:
+            end_merged = self._ends[idx]
+            del self._starts[idx], self._ends[idx]
+            self._starts.insert(idx, start)
+            self._ends.insert(idx, end_merged)
+            return end
+        self._starts.insert(idx, start)
+        self._ends.insert(idx, end)
+        return end
 
 
 class EmbyCollectionSort(_PluginBase):
@@ -27,7 +388,7 @@ class EmbyCollectionSort(_PluginBase):
     # 插件图标
     plugin_icon = "Element_A.png"
     # 插件版本
-    plugin_version = "1.2"
+    plugin_version = "1.5.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -46,17 +407,20 @@ class EmbyCollectionSort(_PluginBase):
     _sort_type = None
     _collection_library_id = None
     _mediaservers = None
+    _concurrency = 4
 
     mediaserver_helper = None
     _EMBY_HOST = None
     _EMBY_USER = None
     _EMBY_APIKEY = None
     _scheduler: Optional[BackgroundScheduler] = None
+    _snapshot: Optional[LibrarySnapshot] = None
 
     def init_plugin(self, config: dict = None):
         # 停止现有任务
         self.stop_service()
         self.mediaserver_helper = MediaServerHelper()
+        self._snapshot = LibrarySnapshot(self.get_data_path() / "library_snapshot.json")
 
         if config:
             self._enabled = config.get("enabled")
@@ -65,6 +429,9 @@ class EmbyCollectionSort(_PluginBase):
             self._sort_type = config.get("sort_type") or "asc"
             self._collection_library_id = config.get("collection_library_id")
             self._mediaservers = config.get("mediaservers") or []
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 4
 
             # 加载模块
             if self._enabled or self._onlyonce:
@@ -112,6 +479,7 @@ class EmbyCollectionSort(_PluginBase):
                 "sort_type": self._sort_type,
                 "collection_library_id": self._collection_library_id,
                 "mediaservers": self._mediaservers,
+                "concurrency": self._concurrency,
             }
         )
 
@@ -132,91 +500,86 @@ class EmbyCollectionSort(_PluginBase):
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+            EmbyClient.of(self._EMBY_HOST).set_concurrency(self._concurrency)
+
+            # 合集及排序方式均无变化时跳过，入库时间在合集间全局分配，有变化时需整体重排
+            changed, pending_snapshot = self._snapshot.changed_items(
+                host=self._EMBY_HOST, user=self._EMBY_USER, apikey=self._EMBY_APIKEY,
+                scope=f"{emby_name}:{self._collection_library_id}", parent_id=self._collection_library_id,
+                params={"IncludeItemTypes": "BoxSet"}, signature=self._sort_type)
+            if changed is not None and not changed:
+                logger.info(f"{emby_name} 合集无变化，跳过排序")
+                continue
 
             # 获取合集列表
             collections = self.__get_items(self._collection_library_id)
-            handle_times = []
+            if collections is None:
+                logger.error(f"{emby_name} 获取合集列表失败")
+                continue
+            reserved_times = ReservedTimeIndex()
+            update_items = []
+            # 读取失败的合集不能视为空合集，不推进快照
+            read_failed = False
 
             for collection in collections:
                 logger.info(f"开始处理合集: {collection.get('Name')} {collection.get('Id')}")
-                items = self.__get_items(collection.get("Id"))
-                item_dict = []
-                for item in items:
-                    item_info = self.__get_item_info(item.get("Id"))
-                    item_dict.append({"Name": item.get("Name"), "Id": item.get("Id"), "item_info": item_info})
+                items = self.__get_items(collection.get("Id"), fields="PremiereDate,DateCreated")
+                if items is None:
+                    read_failed = True
+                    logger.error(f"获取合集: {collection.get('Name')} {collection.get('Id')} 媒体失败")
+                    continue
+                if not items:
+                    continue
 
                 # 按照发布时间排序
-                sorted_items = sorted(item_dict, key=lambda x: x.get("item_info").get("PremiereDate"),
+                sorted_items = sorted(items, key=lambda x: x.get("PremiereDate") or "",
                                       reverse=self._sort_type == "降序")
                 # 初始化时间
-                current_time = datetime.strptime(sorted_items[0]["item_info"]["DateCreated"], "%Y-%m-%dT%H:%M:%S.%f0Z")
-
-                # 更新每个 item 的 DateCreated，规则为
-                updated_items = []
-
-                while sorted_items:
-                    sub_update_items = []
-
-                    for item in sorted_items:
-                        with lock:
-                            new_date_created = current_time.strftime("%Y-%m-%dT%H:%M:%S.%f0Z")
-                            # 时间相同，跳过
-                            if str(new_date_created) == str(item['item_info']['DateCreated']):
-                                logger.debug(
-                                    f"合集媒体: {item.get('Name')} 原入库时间 {item['item_info']['DateCreated']} 新入库时间 {new_date_created} 时间相同，跳过")
-                                handle_times.append(str(current_time))
-                                sub_update_items.append(str(current_time))
-                                # 时间减一秒，用于下一个 item 的更新
-                                current_time -= timedelta(seconds=1)
-                                continue
-
-                            if str(current_time) in handle_times:
-                                logger.warn(
-                                    f"合集媒体: {item.get('Name')} {current_time} 时间已被占用，开始增加 {len(sorted_items) + 1} 秒，重新尝试处理")
-                                # 处理完成的 items 从列表中移除
-                                handle_times = [str(_time) for _time in handle_times if _time not in sub_update_items]
-                                # 如果时间已被占用，增加 len(sorted_items) + 1 秒
-                                current_time += timedelta(seconds=len(sorted_items) + 1)
-                                # 重置已处理的 items 列表和 handle_times 集合
-                                updated_items.clear()
-                                # 时间已被占用，跳出 for 循环
-                                break
-
-                            logger.debug(
-                                f"合集媒体: {item.get('Name')} 原入库时间 {item['item_info']['DateCreated']} 新入库时间 {new_date_created}")
-                            item["item_info"]["DateCreated"] = new_date_created
-                            updated_items.append(item["item_info"])
-                            handle_times.append(str(current_time))
-                            sub_update_items.append(str(current_time))
-                            # 时间减一秒，用于下一个 item 的更新
-                            current_time -= timedelta(seconds=1)
+                current_time = datetime.strptime(sorted_items[0]["DateCreated"], "%Y-%m-%dT%H:%M:%S.%f0Z")
+
+                # 为合集预留连续的入库时间段，每个媒体间隔一秒，与其他合集冲突时整体后移
+                start_second = self.__to_seconds(current_time)
+                end_second = reserved_times.reserve(start_second, len(sorted_items))
+                if end_second != start_second:
+                    logger.warn(f"合集: {collection.get('Name')} {current_time} 时间已被占用，"
+                                f"后移 {end_second - start_second} 秒")
+                    current_time += timedelta(seconds=end_second - start_second)
+
+                # 只更新入库时间有变化的媒体
+                sub_update_items = []
+                for item in sorted_items:
+                    new_date_created = current_time.strftime("%Y-%m-%dT%H:%M:%S.%f0Z")
+                    if str(new_date_created) == str(item.get("DateCreated")):
+                        logger.debug(
+                            f"合集媒体: {item.get('Name')} 原入库时间 {item.get('DateCreated')} 新入库时间 {new_date_created} 时间相同，跳过")
                     else:
-                        # 所有 item 处理完成，跳出 while 循环
-                        break
-                    time.sleep(1)
+                        logger.debug(
+                            f"合集媒体: {item.get('Name')} 原入库时间 {item.get('DateCreated')} 新入库时间 {new_date_created}")
+                        sub_update_items.append((item, new_date_created))
+                    # 时间减一秒，用于下一个 item 的更新
+                    current_time -= timedelta(seconds=1)
 
-                if not updated_items:
+                if not sub_update_items:
                     logger.warn(f"合集: {collection.get('Name')} {collection.get('Id')} 无需更新入库时间")
                     continue
-
-                logger.debug(f"获取合集排序后最新的入库时间: {current_time}")
-
-                # 更新入库时间
-                for item_info in updated_items:
-                    update_flag = self.__update_item_info(item_info.get("Id"), item_info)
-                    if update_flag:
-                        logger.info(f"{item_info.get('Name')} 更新入库时间到{item_info.get('DateCreated')}成功")
-                    else:
-                        logger.error(f"{item_info.get('Name')} 更新入库时间到{item_info.get('DateCreated')}失败")
-
-                logger.info(f"合集处理完成: {collection.get('Name')} {collection.get('Id')}")
-
+                update_items += sub_update_items
+                logger.info(f"合集处理完成: {collection.get('Name')} {collection.get('Id')}，"
+                            f"需更新 {len(sub_update_items)} 个媒体")
+
+            # 并发更新入库时间
+            all_updated = True
+            if update_items:
+                with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+                    results = executor.map(lambda update_item: self.__update_date_created(*update_item),
+                                           update_items)
+                    all_updated = all(list(results))
+
+            # 有读取或更新失败的媒体时不推进快照，下次重新处理
+            if all_updated and not read_failed:
+                self._snapshot.commit(pending_snapshot)
             logger.info(f"更新 {emby_name} 合集媒体排序完成")
+            EmbyClient.report()
 
     @eventmanager.register(EventType.PluginAction)
     def remote_sync(self, event: Event):
@@ -235,16 +598,41 @@ class EmbyCollectionSort(_PluginBase):
             self.post_message(channel=event.event_data.get("channel"),
                               title="更新Emby合集媒体排序完成！", userid=event.event_data.get("user"))
 
-    def __get_items(self, parent_id):
-        res = RequestUtils().get_res(
-            f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items?ParentId={parent_id}&api_key={self._EMBY_APIKEY}")
+    @staticmethod
+    def __to_seconds(date_time: datetime) -> int:
+        return int((date_time - datetime(1970, 1, 1)).total_seconds())
+
+    def __update_date_created(self, item: dict, date_created: str) -> bool:
+        """
+        更新媒体入库时间，更新需提交完整媒体信息
+        """
+        item_info = self.__get_item_info(item.get("Id"))
+        if not item_info:
+            logger.error(f"{item.get('Name')} 获取媒体信息失败")
+            return False
+        item_info["DateCreated"] = date_created
+        update_flag = self.__update_item_info(item.get("Id"), item_info)
+        if update_flag:
+            logger.info(f"{item.get('Name')} 更新入库时间到{date_created}成功")
+        else:
+            logger.error(f"{item.get('Name')} 更新入库时间到{date_created}失败")
+        return update_flag
+
+    def __get_items(self, parent_id, fields: str = None) -> Optional[list]:
+        """
+        获取媒体列表，获取失败时返回None
+        """
+        req_url = f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items?ParentId={parent_id}&api_key={self._EMBY_APIKEY}"
+        if fields:
+            req_url += f"&Fields={fields}"
+        res = EmbyClient.get(req_url)
         if res and res.status_code == 200:
             results = res.json().get("Items") or []
             return results
-        return []
+        return None
 
     def __get_item_info(self, item_id):
-        res = RequestUtils().get_res(
+        res = EmbyClient.get(
             f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items/{item_id}?api_key={self._EMBY_APIKEY}")
         if res and res.status_code == 200:
             return res.json()
@@ -255,9 +643,9 @@ class EmbyCollectionSort(_PluginBase):
             'accept': '*/*',
             'Content-Type': 'application/json'
         }
-        res = RequestUtils(headers=headers).post(
+        res = EmbyClient.post(
             f"{self._EMBY_HOST}/emby/Items/{item_id}?api_key={self._EMBY_APIKEY}",
-            data=json.dumps(data))
+            data=json.dumps(data), headers=headers)
         if res and res.status_code == 204:
             return True
         return False
@@ -320,6 +708,23 @@ class EmbyCollectionSort(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '并发数',
+                                            'placeholder': '同时更新的媒体数量，默认4'
+                                        }
+                                    }
+                                ]
+                            },
                         ]
                     },
                     {
@@ -436,6 +841,7 @@ class EmbyCollectionSort(_PluginBase):
             "cron": "5 1 * * *",
             "collection_library_id": "",
             "mediaservers": [],
+            "concurrency": 4,
         }
 
     def get_page(self) -> List[dict]:
@@ -1,15 +1,497 @@
+import fnmatch
 import json
 import re
+import threading
 import time
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Callable, Optional
+from urllib.parse import urlparse
 
+import requests
+from requests.adapters import HTTPAdapter
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from app.core.config import settings
 from app.core.event import eventmanager, Event
 from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType
-from app.utils.http import RequestUtils
+
+
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class DanmuFileHandler(FileSystemEventHandler):
+    """
+    弹幕目录监控响应类
+    """
+
+    def __init__(self, tracker: Any, **kwargs):
+        super(DanmuFileHandler, self).__init__(**kwargs)
+        self.tracker = tracker
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.tracker.on_file(Path(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.tracker.on_file(Path(event.dest_path))
+
+
+class DanmuTask:
+    """
+    弹幕下载跟踪任务
+    """
+
+    def __init__(self, key: str, directory: Path, pattern: str, expected: int, item_name: str, item_year: Any,
+                 sources: List[str], log_key: str, callback: Callable, timeout: int):
+        self.key = key
+        self.directory = directory
+        self.pattern = pattern
+        self.expected = expected
+        self.item_name = item_name
+        self.item_year = item_year
+        self.sources = sources or []
+        self.log_key = log_key
+        self.callback = callback
+        self.deadline = time.time() + timeout
+        # 已存在的弹幕文件
+        self.found = set()
+        # 日志中已出现的失败记录：(弹幕源, 类型)
+        self.failures = set()
+
+
+class DanmuTracker:
+    """
+    弹幕下载完成跟踪器
+    监控弹幕目录的文件创建事件，并按偏移量增量读取Emby日志判断弹幕源是否全部匹配失败，
+    下载完成、全部失败或超时后回调，等待期间不占用线程
+    """
+    # 日志轮询间隔（秒）
+    POLL_INTERVAL = 5
+    # 目录兜底扫描间隔（秒），兼容不支持文件事件的网络存储
+    RESCAN_INTERVAL = 30
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._tasks: Dict[str, DanmuTask] = {}
+        self._observer = None
+        self._watches: Dict[Path, Any] = {}
+        # 日志读取状态：log_key -> {"url", "offset", "partial"}
+        self._logs: Dict[str, dict] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._handler = DanmuFileHandler(self)
+
+    def track(self, key: str, directory: Path, pattern: str, expected: int, item_name: str, item_year: Any,
+              sources: List[str], log_key: str, log_url: str, callback: Callable, timeout: int):
+        """
+        添加跟踪任务，应在通知下载前调用，避免遗漏下载过程中的文件和日志
+        """
+        task = DanmuTask(key=key, directory=directory, pattern=pattern, expected=expected,
+                         item_name=item_name, item_year=item_year, sources=sources, log_key=log_key,
+                         callback=callback, timeout=timeout)
+        if directory.exists():
+            task.found = {file.name for file in directory.glob(pattern)}
+        with self._lock:
+            if log_key not in self._logs:
+                self._logs[log_key] = {"url": log_url, "offset": None, "partial": ""}
+                # 记录当前日志位置，只解析之后的日志
+                self.__read_log(self._logs[log_key])
+            self._tasks[key] = task
+            self.__watch(directory)
+            if not self._thread or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self.__run, name="DanmuTracker", daemon=True)
+                self._thread.start()
+
+    def cancel(self, key: str):
+        """
+        取消跟踪任务，不回调
+        """
+        with self._lock:
+            task = self._tasks.pop(key, None)
+            if task:
+                self.__unwatch(task.directory)
+                self.__drop_log(task.log_key)
+
+    def on_file(self, file_path: Path):
+        """
+        弹幕文件创建
+        """
+        with self._lock:
+            tasks = [task for task in self._tasks.values()
+                     if task.directory == file_path.parent and fnmatch.fnmatch(file_path.name, task.pattern)]
+        for task in tasks:
+            if file_path.name not in task.found:
+                task.found.add(file_path.name)
+                logger.info(f"已下载弹幕文件：{file_path.name}")
+            if len(task.found) >= task.expected:
+                self.__finish(task, "completed")
+
+    def stop(self):
+        """
+        停止跟踪，未结束的任务以cancelled状态回调
+        """
+        self._stop_event.set()
+        with self._lock:
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            self._logs.clear()
+            self._watches.clear()
+            if self._observer:
+                try:
+                    self._observer.stop()
+                except Exception as e:
+                    logger.error(f"停止弹幕目录监控出错：{str(e)}")
+                self._observer = None
+        for task in tasks:
+            try:
+                task.callback("cancelled", len(task.found), task.expected)
+            except Exception as e:
+                logger.error(f"弹幕任务 {task.key} 回调出错：{str(e)}")
+
+    def __watch(self, directory: Path):
+        if directory in self._watches:
+            return
+        try:
+            if not self._observer:
+                self._observer = Observer(timeout=10)
+                self._observer.daemon = True
+                self._observer.start()
+            self._watches[directory] = self._observer.schedule(self._handler, path=str(directory), recursive=False)
+        except Exception as e:
+            # 无法监控时依靠定时扫描
+            self._watches[directory] = None
+            logger.warn(f"弹幕目录 {directory} 监控失败，改为定时扫描：{str(e)}")
+
+    def __unwatch(self, directory: Path):
+        if any(task.directory == directory for task in self._tasks.values()):
+            return
+        watch = self._watches.pop(directory, None)
+        if watch and self._observer:
+            try:
+                self._observer.unschedule(watch)
+            except Exception as e:
+                logger.debug(f"取消弹幕目录 {directory} 监控出错：{str(e)}")
+
+    def __drop_log(self, log_key: str):
+        """
+        没有任务使用时删除日志读取状态，需持有_lock
+        """
+        if any(task.log_key == log_key for task in self._tasks.values()):
+            return
+        self._logs.pop(log_key, None)
+
+    def __finish(self, task: DanmuTask, status: str):
+        with self._lock:
+            if self._tasks.get(task.key) is not task:
+                return
+            self._tasks.pop(task.key)
+            self.__unwatch(task.directory)
+            self.__drop_log(task.log_key)
+        try:
+            task.callback(status, len(task.found), task.expected)
+        except Exception as e:
+            logger.error(f"弹幕任务 {task.key} 回调出错：{str(e)}")
+
+    def __run(self):
+        last_rescan = time.time()
+        while not self._stop_event.wait(self.POLL_INTERVAL):
+            with self._lock:
+                tasks = list(self._tasks.values())
+                if not tasks:
+                    self._thread = None
+                    return
+                logs = {task.log_key: self._logs.get(task.log_key) for task in tasks}
+            # 增量解析日志
+            for log_key, log_state in logs.items():
+                if not log_state:
+                    continue
+                lines = self.__read_log(log_state)
+                if lines:
+                    for task in tasks:
+                        if task.log_key == log_key:
+                            self.__parse_failures(task, lines)
+            # 兜底扫描目录
+            if time.time() - last_rescan >= self.RESCAN_INTERVAL:
+                last_rescan = time.time()
+                for task in tasks:
+                    if task.directory.exists():
+                        for file in task.directory.glob(task.pattern):
+                            self.on_file(file)
+            now = time.time()
+            for task in tasks:
+                if task.failures and self.__all_failed(task):
+                    logger.error(f"解析日志判断已配置弹幕源全部匹配弹幕失败：{task.item_name}")
+                    self.__finish(task, "failed")
+                elif now >= task.deadline:
+                    self.__finish(task, "timeout")
+
+    def __parse_failures(self, task: DanmuTask, lines: List[str]):
+        """
+        解析日志中的弹幕源失败记录
+        """
+        item_name = re.escape(str(task.item_name))
+        for source in task.sources:
+            failed_pattern = fr'\[{re.escape(source)}\]匹配失败：{item_name} \({re.escape(str(task.item_year))}\)'
+            small_pattern = fr'\[{re.escape(source)}\]弹幕内容少于1KB，忽略处理：.{item_name}'
+            for line in lines:
+                if re.search(failed_pattern, line):
+                    task.failures.add((source, "failed"))
+                if re.search(small_pattern, line):
+                    task.failures.add((source, "small"))
+
+    @staticmethod
+    def __all_failed(task: DanmuTask) -> bool:
+        return bool(task.sources) and all((source, "failed") in task.failures and (source, "small") in task.failures
+                                          for source in task.sources)
+
+    @staticmethod
+    def __read_log(log_state: dict) -> List[str]:
+        """
+        按偏移量增量读取Emby日志，支持Range时只下载新增部分，日志轮转后从头读取
+        """
+        offset = log_state.get("offset")
+        headers = {"Range": f"bytes={offset}-"} if offset else None
+        try:
+            res = EmbyClient.get(log_state.get("url"), headers=headers)
+        except Exception as e:
+            logger.error(f"读取Emby日志出错：{str(e)}")
+            return []
+        if res is None:
+            return []
+        if res.status_code == 206:
+            content = res.content
+            log_state["offset"] = offset + len(content)
+        elif res.status_code == 200:
+            content = res.content
+            if offset is None:
+                # 首次读取只记录位置
+                log_state["offset"] = len(content)
+                return []
+            if len(content) < offset:
+                # 日志已轮转
+                offset = 0
+            log_state["offset"] = len(content)
+            content = content[offset:]
+        elif res.status_code == 416:
+            # 请求位置超出文件大小，日志已轮转
+            content_range = res.headers.get("Content-Range") or ""
+            size = content_range.split("/")[-1]
+            if size.isdigit() and int(size) < (offset or 0):
+                log_state["offset"] = 0
+            return []
+        else:
+            return []
+        text = log_state.get("partial", "") + content.decode("utf-8", errors="ignore")
+        lines = text.split("\n")
+        # 最后一行可能不完整，留到下次拼接
+        log_state["partial"] = lines.pop()
+        return lines
 
 
 class EmbyDanmu(_PluginBase):
@@ -20,7 +502,7 @@ class EmbyDanmu(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/danmu.png"
     # 插件版本
-    plugin_version = "1.6"
+    plugin_version = "1.9.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -35,6 +517,15 @@ class EmbyDanmu(_PluginBase):
     # 私有属性
     _enabled = False
     _library_task = {}
+    _library_context = {}
+    _library_lock = threading.Lock()
+    _tracker = None
+    # 批量任务运行状态：batch_id -> {"record", "context", "pending", "active", "scheduling"}
+    _batches = {}
+    _batch_lock = threading.RLock()
+    # 切换媒体服务器的锁，命令与批量任务共用_EMBY_*属性
+    _emby_lock = threading.RLock()
+    _concurrency = 2
     _danmu_source = []
     _mediaservers = None
     _dirs = None
@@ -46,19 +537,29 @@ class EmbyDanmu(_PluginBase):
     _paths = {}
 
     def init_plugin(self, config: dict = None):
-        self._library_task = {}
         self.mediaserver_helper = MediaServerHelper()
+        self.stop_service()
+        self._library_task = {}
+        self._library_context = {}
+        self._tracker = DanmuTracker()
 
         # 读取配置
         if config:
             self._enabled = config.get("enabled")
             self._dirs = config.get("dirs")
             self._mediaservers = config.get("mediaservers") or []
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 2
 
             if self._dirs:
                 for path in str(self._dirs).split("\n"):
                     self._paths[path.split(":")[0]] = path.split(":")[1]
 
+        # 恢复未完成的批量任务
+        if self._enabled and self.get_data("batches"):
+            threading.Thread(target=self.__resume_batches, name="EmbyDanmuResume", daemon=True).start()
+
     @eventmanager.register(EventType.PluginAction)
     def danmu(self, event: Event = None):
         if not self._enabled:
@@ -74,10 +575,10 @@ class EmbyDanmu(_PluginBase):
                 return
 
             args_list = args.split(" ")
-            if len(args_list) != 2 and len(args_list) != 3:
+            if len(args_list) not in (1, 2, 3):
                 logger.error(f"参数错误：{args_list}")
                 self.post_message(channel=event.event_data.get("channel"),
-                                  title=f"参数错误！ /danmu 媒体库名 媒体名 (季)",
+                                  title=f"参数错误！ /danmu 媒体库名 (媒体名1,媒体名2) (季)",
                                   userid=event.event_data.get("user"))
                 return
 
@@ -86,360 +587,590 @@ class EmbyDanmu(_PluginBase):
                 logger.error("未配置Emby媒体服务器")
                 return
 
-            for emby_name, emby_server in emby_servers.items():
-                logger.info(f"开始处理媒体服务器 {emby_name}")
-                self._EMBY_USER = emby_server.instance.get_user()
-                self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-                self._EMBY_HOST = emby_server.config.config.get("host")
-                if not self._EMBY_HOST.endswith("/"):
-                    self._EMBY_HOST += "/"
-                if not self._EMBY_HOST.startswith("http"):
-                    self._EMBY_HOST = "http://" + self._EMBY_HOST
-
-                self._danmu_source = self.__get_danmu_source()
-
-                # 检查插件是否正确配置
-                if not self._danmu_source:
-                    logger.error(f"未配置弹幕源")
-                    self.post_message(channel=event.event_data.get("channel"),
-                                      title=f"Emby未正确配置弹幕源",
-                                      userid=event.event_data.get("user"))
-                    return
+            library_name = args_list[0]
+            library_item_name = args_list[1] if len(args_list) > 1 else None
+            library_item_season = None
+            if len(args_list) == 3:
+                library_item_season = int(args_list[2])
+            # 只指定媒体库或指定多个媒体时批量下载
+            batch_titles = None
+            if library_item_name:
+                batch_titles = [title for title in re.split(r"[,，]", library_item_name) if title]
+            batch = not library_item_name or len(batch_titles) > 1
 
-                library_name = args_list[0]
-                library_item_name = args_list[1]
-                library_item_season = None
-                if len(args_list) == 3:
-                    library_item_season = int(args_list[2])
-                logger.info(
-                    f"开始下载弹幕文件：{library_name} - {library_item_name} {f'(季{library_item_season})' if library_item_season else ''}")
-
-                # 获取媒体库信息
-                librarys = self.__get_librarys()
-
-                library_id = None
-                library_options = None
-                library_type = None
-                # 匹配需要的媒体库
-                for library in librarys:
-                    if library.get("Name") == library_name:
-                        logger.info(f"{emby_name} 找到媒体库：{library_name}，ID：{library.get('Id')}")
-                        library_type = library.get("CollectionType")
-                        library_id = library.get("Id")
-                        library_options = library.get("LibraryOptions")
-                        break
+            with self._emby_lock:
+                for emby_name, emby_server in emby_servers.items():
+                    logger.info(f"开始处理媒体服务器 {emby_name}")
+                    server_context = self.__server_context(emby_name, emby_server)
 
-                if not library_id or not library_options:
-                    logger.error(f"{emby_name} 未找到媒体库：{library_name}")
-                    self.post_message(channel=event.event_data.get("channel"),
-                                      title=f"{emby_name} 未找到媒体库：{library_name}",
-                                      userid=event.event_data.get("user"))
-                    break
-
-                # 开启Danmu插件
-                # 检查是否已经禁用了Danmu插件，如禁用则先启用
-                enabled_danmu = False
-                library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
-                if "Danmu" in library_disabled_subtitle_fetchers:
-                    library_disabled_subtitle_fetchers.remove("Danmu")
-                    library_options.update({
-                        "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
-                    })
-                    enabled_danmu = True
-
-                # 启用Danmu插件
-                if enabled_danmu:
-                    update_flag = self.__update_library(library_id, library_options)
-                    if update_flag:
-                        logger.info(f"{emby_name} 已启用媒体库：{library_name}的Danmu插件")
-                    else:
-                        logger.error(f"{emby_name} 启用媒体库：{library_name}的Danmu插件失败")
+                    # 检查插件是否正确配置
+                    if not self._danmu_source:
+                        logger.error(f"未配置弹幕源")
                         self.post_message(channel=event.event_data.get("channel"),
-                                          title=f"{emby_name} 启用媒体库：{library_name}的Danmu插件失败",
+                                          title=f"Emby未正确配置弹幕源",
                                           userid=event.event_data.get("user"))
                         return
-                else:
-                    logger.info(f"{emby_name} 媒体库：{library_name}的Danmu插件已启用")
 
-                # 媒体库设置为正在任务，不关闭弹幕插件
-                _library_task = self._library_task.get(library_id, [])
-                _library_task.append(library_item_name)
-                self._library_task[library_id] = _library_task
+                    logger.info(
+                        f"开始下载弹幕文件：{library_name} - {library_item_name or '全部媒体'} {f'(季{library_item_season})' if library_item_season else ''}")
 
-                try:
-                    # 获取媒体库媒体列表
-                    library_items = self.__get_items(library_id, nameStartsWith=library_item_name)
-                    if not library_items:
-                        logger.error(f"{emby_name} 获取媒体库：{library_name}的媒体列表失败")
+                    # 获取媒体库信息
+                    librarys = self.__get_librarys()
+
+                    library_id = None
+                    library_options = None
+                    library_type = None
+                    # 匹配需要的媒体库
+                    for library in librarys:
+                        if library.get("Name") == library_name:
+                            logger.info(f"{emby_name} 找到媒体库：{library_name}，ID：{library.get('Id')}")
+                            library_type = library.get("CollectionType")
+                            library_id = library.get("Id")
+                            library_options = library.get("LibraryOptions")
+                            break
+
+                    if not library_id or not library_options:
+                        logger.error(f"{emby_name} 未找到媒体库：{library_name}")
                         self.post_message(channel=event.event_data.get("channel"),
-                                          title=f"{emby_name} 获取媒体库：{library_name}的媒体列表失败",
+                                          title=f"{emby_name} 未找到媒体库：{library_name}",
                                           userid=event.event_data.get("user"))
-                    else:
-                        found_item = False
-                        # 遍历媒体列表，获取媒体的ID和名称
-                        for item in library_items:
-                            logger.debug(
-                                f"服务器：{emby_name} 媒体库：{library_name} 媒体库类型：{library_type} 媒体：{item}")
-                            if library_type == "tvshows":
-                                if item.get("Name") == library_item_name:
-                                    found_item = True
-                                    logger.info(f"{emby_name} 找到媒体：{library_item_name}，ID：{item.get('Id')}")
-
-                                    # 电视剧弹幕
-                                    seasons = self.__get_items(item.get("Id"))
-                                    if len(seasons) == 1:
-                                        season_item = seasons[0]
-                                        if library_item_season and season_item.get(
-                                                "IndexNumber") != library_item_season:
-                                            found_item = False
-                                            break
-
-                                        # 通知Danmu插件获取弹幕
-                                        season_id = season_item.get("Id")
-                                        # 判断本地弹幕是否存在
-                                        danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                               only_check=True)
-                                        if season_item_cnt == danmu_cnt:
-                                            logger.info(
-                                                f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                              userid=event.event_data.get("user"))
-                                            break
-
-                                        danmu_flag = self.__download_danmu(season_id)
-                                        if danmu_flag:
-                                            logger.info(
-                                                f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                              userid=event.event_data.get("user"))
-                                            danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                   only_check=False)
-                                            if danmu_cnt == 0:
-                                                logger.error(
-                                                    f"{emby_name} {library_name} {library_item_name} Emby已配置弹幕源全部匹配弹幕失败")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {library_item_name} Emby已配置弹幕源全部匹配弹幕失败",
-                                                                  userid=event.event_data.get("user"))
-                                            else:
-                                                if season_item_cnt == danmu_cnt:
-                                                    logger.info(
-                                                        f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                                else:
-                                                    logger.error(
-                                                        f"{emby_name} {library_name} {library_item_name} 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                        else:
-                                            logger.error(
-                                                f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕失败")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕失败",
-                                                              userid=event.event_data.get("user"))
-                                    else:
-                                        for season in seasons:
-                                            # 指定季度则只获取指定季度的弹幕
-                                            if library_item_season:
-                                                found_item = False
-                                                if season.get("IndexNumber") == library_item_season:
-                                                    found_item = True
-                                                    season_id = season.get("Id")
-                                                    # 判断本地弹幕是否存在
-                                                    danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                           only_check=True)
-                                                    if season_item_cnt == danmu_cnt:
-                                                        logger.info(
-                                                            f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                                          userid=event.event_data.get("user"))
-                                                        break
-
-                                                    # 通知Danmu插件获取弹幕
-                                                    danmu_flag = self.__download_danmu(season_id)
-                                                    if danmu_flag:
-                                                        logger.info(
-                                                            f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                                          userid=event.event_data.get("user"))
-                                                        danmu_cnt, season_item_cnt = self.__check_danmu_exists(
-                                                            season_id,
-                                                            only_check=False)
-                                                        if danmu_cnt == 0:
-                                                            logger.error(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败",
-                                                                              userid=event.event_data.get("user"))
-                                                        else:
-                                                            if season_item_cnt == danmu_cnt:
-                                                                logger.info(
-                                                                    f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                                self.post_message(
-                                                                    channel=event.event_data.get("channel"),
-                                                                    title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                    userid=event.event_data.get("user"))
-                                                            else:
-                                                                logger.error(
-                                                                    f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                                self.post_message(
-                                                                    channel=event.event_data.get("channel"),
-                                                                    title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                    userid=event.event_data.get("user"))
-                                                    else:
-                                                        logger.error(
-                                                            f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败",
-                                                                          userid=event.event_data.get("user"))
-                                                    break
-                                            else:
-                                                # 未指定季度则获取全部季度的弹幕
-                                                season_id = season.get("Id")
-                                                # 判断本地弹幕是否存在
-                                                danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                       only_check=True)
-                                                if season_item_cnt == danmu_cnt:
-                                                    logger.info(
-                                                        f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                                    continue
-
-                                                # 通知Danmu插件获取弹幕
-                                                danmu_flag = self.__download_danmu(season_id)
-                                                if danmu_flag:
-                                                    logger.info(
-                                                        f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                                      userid=event.event_data.get("user"))
-                                                    danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                           only_check=False)
-                                                    if danmu_cnt == 0:
-                                                        logger.error(
-                                                            f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败",
-                                                                          userid=event.event_data.get("user"))
-                                                    else:
-                                                        if season_item_cnt == danmu_cnt:
-                                                            logger.info(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                              userid=event.event_data.get("user"))
-                                                        else:
-                                                            logger.error(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                              userid=event.event_data.get("user"))
-                                                else:
-                                                    logger.error(
-                                                        f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败",
-                                                                      userid=event.event_data.get("user"))
-                            else:
-                                # 电影弹幕
-                                matches = re.findall(r'^(.*?)(?= ?\(\d{4}\)?|$)', item.get("Name"), re.MULTILINE)
-                                if matches and str(matches[0]) == library_item_name:
-                                    logger.info(f"{emby_name} 开始检查电影：{library_name} {library_item_name}")
-                                    found_item = True
-                                    movie_id = item.get("Id")
-                                    # 获取媒体详情
-                                    item_info = self.__get_item_info(movie_id)
-                                    item_path = item_info.get("Path")
-                                    parent_path = Path(self.__get_path(str(Path(item_path).parent)))
-                                    logger.info(f"{emby_name} 开始检查MoviePilot路径 {parent_path} 下是是否有弹幕文件")
-                                    # 检查是否有弹幕文件
-                                    danmu_path_pattern = Path(item_path).stem + "*.xml"
-
-                                    if len(list(parent_path.glob(danmu_path_pattern))) >= 1:
-                                        logger.info(
-                                            f"{emby_name} {parent_path} 下已存在弹幕文件：{danmu_path_pattern}")
-                                        self.post_message(channel=event.event_data.get("channel"),
-                                                          title=f"{emby_name} {library_name} {item.get('Name')} 弹幕已存在",
-                                                          userid=event.event_data.get("user"))
-                                    else:
-                                        # 通知Danmu插件获取弹幕
-                                        danmu_flag = self.__download_danmu(movie_id)
-                                        if danmu_flag:
-                                            logger.info(
-                                                f"{emby_name} 已通知弹幕插件获取 {library_name} {item.get('Name')} {movie_id} 的弹幕")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 开始通知Emby下载 {library_name} {item.get('Name')} 弹幕，异步执行，请耐心等候执行完成消息",
-                                                              userid=event.event_data.get("user"))
-                                            retry_cnt = 3
-                                            while len(
-                                                    list(parent_path.glob(
-                                                        danmu_path_pattern))) == 0 and retry_cnt > 0:
-                                                # 解析日志判断是否全部失败
-                                                if self.__check_all_failed_by_log(item_name=item_info.get("Name"),
-                                                                                  item_year=item_info.get(
-                                                                                      "ProductionYear")):
-                                                    logger.error(
-                                                        f"{emby_name} 解析日志判断已配置弹幕源全部匹配弹幕失败")
-                                                    retry_cnt = -1
-                                                else:
-                                                    retry_cnt -= 1
-                                                    logger.warn(
-                                                        f"{emby_name} {parent_path} 下未找到弹幕文件：{danmu_path_pattern}，等待60秒后重试 ({retry_cnt}次)")
-                                                    time.sleep(60)
-
-                                            if len(list(parent_path.glob(danmu_path_pattern))) >= 1:
-                                                logger.info(
-                                                    f"{emby_name} {parent_path} 下已找到弹幕文件：{danmu_path_pattern}")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {item.get('Name')} 下载弹幕文件成功",
-                                                                  userid=event.event_data.get("user"))
-                                            else:
-                                                logger.error(
-                                                    f"{emby_name} {parent_path} 下未找到弹幕文件：{danmu_path_pattern}")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {item.get('Name')} 已配置弹幕源全部匹配弹幕失败",
-                                                                  userid=event.event_data.get("user"))
-                                        else:
-                                            logger.error(
-                                                f"{emby_name} 通知弹幕插件获取 {library_name} {item.get('Name')} {movie_id} 的弹幕失败")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 通知弹幕插件获取 {library_name} 电影 {item.get('Name')} {movie_id} 的弹幕失败",
-                                                              userid=event.event_data.get("user"))
-                        if not found_item:
-                            logger.error(
-                                f"{emby_name} 未找到媒体：{library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}")
-                            self.post_message(channel=event.event_data.get("channel"),
-                                              title=f"{emby_name} 未找到媒体：{library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}",
-                                              userid=event.event_data.get("user"))
-                except Exception as e:
-                    logger.error(
-                        f"{emby_name} {library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}获取弹幕任务出错：{str(e)}")
+                        break
 
-                # 判断当前媒体库是否有其他任务在执行
-                self._library_task[library_id].remove(library_item_name)
-                if len(self._library_task[library_id]) == 0:
-                    # 关闭弹幕插件
-                    logger.info(
-                        f"{emby_name} {library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}获取弹幕任务完成，关闭弹幕插件")
-                    # 禁用媒体库的Danmu插件
-                    library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
-                    library_disabled_subtitle_fetchers.append("Danmu")
-                    library_options.update({
-                        "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
+                    context = dict(server_context, **{
+                        "library_id": library_id,
+                        "library_name": library_name,
+                        "library_options": library_options,
+                        "channel": event.event_data.get("channel"),
+                        "user": event.event_data.get("user"),
                     })
-                    update_flag = self.__update_library(library_id, library_options)
-                    if update_flag:
-                        logger.info(f"{emby_name} 已禁用媒体库：{library_name} Danmu插件")
+
+                    # 开启Danmu插件，媒体库设置为正在任务，不关闭弹幕插件
+                    command_token = f"command:{library_item_name}:{time.time()}"
+                    if not self.__acquire_library(context, command_token):
+                        return
+
+                    try:
+                        if batch:
+                            self.__start_batch(context, library_type, batch_titles, library_item_season)
+                        else:
+                            self.__danmu_item(context, library_type, library_item_name, library_item_season)
+                    except Exception as e:
+                        logger.error(
+                            f"{emby_name} {library_name} {library_item_name or ''} {f'第{library_item_season}季 ' if library_item_season else ''}获取弹幕任务出错：{str(e)}")
+
+                    # 弹幕下载在后台跟踪，全部完成后关闭弹幕插件
+                    self.__release_library(library_id, command_token)
+
+    def __danmu_item(self, context: dict, library_type: str, library_item_name: str,
+                     library_item_season: Optional[int]):
+        """
+        下载单个媒体的弹幕
+        """
+        emby_name = context.get("emby_name")
+        library_id = context.get("library_id")
+        library_name = context.get("library_name")
+        # 获取媒体库媒体列表
+        library_items = self.__get_items(library_id, nameStartsWith=library_item_name)
+        if not library_items:
+            logger.error(f"{emby_name} 获取媒体库：{library_name}的媒体列表失败")
+            self.post_message(channel=context.get("channel"),
+                              title=f"{emby_name} 获取媒体库：{library_name}的媒体列表失败",
+                              userid=context.get("user"))
+            return
+
+        found_item = False
+        # 遍历媒体列表，获取媒体的ID和名称
+        for item in library_items:
+            logger.debug(
+                f"服务器：{emby_name} 媒体库：{library_name} 媒体库类型：{library_type} 媒体：{item}")
+            if library_type == "tvshows":
+                if item.get("Name") == library_item_name:
+                    found_item = True
+                    logger.info(f"{emby_name} 找到媒体：{library_item_name}，ID：{item.get('Id')}")
+
+                    # 电视剧弹幕，指定季度则只获取指定季度的弹幕
+                    seasons = self.__get_items(item.get("Id"))
+                    if library_item_season:
+                        seasons = [season for season in seasons
+                                   if season.get("IndexNumber") == library_item_season]
+                        if not seasons:
+                            found_item = False
+                    for season in seasons:
+                        self.__danmu_season(context, library_item_name, season)
+            else:
+                # 电影弹幕
+                matches = re.findall(r'^(.*?)(?= ?\(\d{4}\)?|$)', item.get("Name"), re.MULTILINE)
+                if matches and str(matches[0]) == library_item_name:
+                    found_item = True
+                    self.__danmu_movie(context, item)
+        if not found_item:
+            logger.error(
+                f"{emby_name} 未找到媒体：{library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}")
+            self.post_message(channel=context.get("channel"),
+                              title=f"{emby_name} 未找到媒体：{library_name} {library_item_name} {f'第{library_item_season}季 ' if library_item_season else ''}",
+                              userid=context.get("user"))
+
+    def __danmu_season(self, context: dict, library_item_name: str, season: dict,
+                       on_done: Callable = None):
+        """
+        通知下载单季弹幕，并在后台跟踪下载结果
+        :param on_done: 结束回调on_done(是否成功)，弹幕已存在或通知失败时立即回调
+        """
+        emby_name = context.get("emby_name")
+        library_name = context.get("library_name")
+        title = f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季"
+        season_id = season.get("Id")
+        # 判断本地弹幕是否存在
+        season_items, item_info, parent_path = self.__get_danmu_dir(season_id)
+        if not season_items:
+            logger.error(f"{title} 获取剧集失败")
+            if on_done:
+                on_done(False)
+            return
+        danmu_cnt = len(list(parent_path.glob("*.xml"))) if parent_path.exists() else 0
+        if len(season_items) == danmu_cnt:
+            self.__notify(context, f"{title} 弹幕文件已全部存在：{danmu_cnt}/{len(season_items)}")
+            if on_done:
+                on_done(True)
+            return
+
+        def __done(status: str, danmu_cnt: int, season_item_cnt: int):
+            if danmu_cnt == 0:
+                self.__notify(context, f"{title} Emby已配置弹幕源全部匹配弹幕失败", error=True)
+            elif season_item_cnt == danmu_cnt:
+                self.__notify(context, f"{title} 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
+            else:
+                self.__notify(context, f"{title} 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}", error=True)
+            if on_done:
+                on_done(season_item_cnt == danmu_cnt)
+
+        # 通知Danmu插件获取弹幕，每集最多等待60秒
+        if self.__track_download(context=context, item_id=season_id, directory=parent_path, pattern="*.xml",
+                                 expected=len(season_items), item_name=item_info.get("SeriesName"),
+                                 item_year=item_info.get("ProductionYear"), callback=__done,
+                                 timeout=60 * len(season_items)):
+            logger.info(f"{emby_name} 已通知弹幕插件获取 {title} 的弹幕")
+            self.__notify(context,
+                          f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
+                          log=False)
+            return
+        self.__notify(context, f"{emby_name} 通知弹幕插件获取 {title} 的弹幕失败", error=True)
+        if on_done:
+            on_done(False)
+
+    def __danmu_movie(self, context: dict, item: dict, on_done: Callable = None):
+        """
+        通知下载电影弹幕，并在后台跟踪下载结果
+        :param on_done: 结束回调on_done(是否成功)，弹幕已存在或通知失败时立即回调
+        """
+        emby_name = context.get("emby_name")
+        library_name = context.get("library_name")
+        logger.info(f"{emby_name} 开始检查电影：{library_name} {item.get('Name')}")
+        movie_id = item.get("Id")
+        # 获取媒体详情
+        item_info = self.__get_item_info(movie_id)
+        item_path = item_info.get("Path")
+        if not item_path:
+            logger.error(f"{emby_name} 获取电影 {library_name} {item.get('Name')} 详情失败")
+            if on_done:
+                on_done(False)
+            return
+        parent_path = Path(self.__get_path(str(Path(item_path).parent)))
+        logger.info(f"{emby_name} 开始检查MoviePilot路径 {parent_path} 下是是否有弹幕文件")
+        # 检查是否有弹幕文件
+        danmu_path_pattern = Path(item_path).stem + "*.xml"
+        if len(list(parent_path.glob(danmu_path_pattern))) >= 1:
+            logger.info(f"{emby_name} {parent_path} 下已存在弹幕文件：{danmu_path_pattern}")
+            self.__notify(context, f"{emby_name} {library_name} {item.get('Name')} 弹幕已存在", log=False)
+            if on_done:
+                on_done(True)
+            return
+
+        def __done(status: str, danmu_cnt: int, _: int):
+            if danmu_cnt >= 1:
+                logger.info(f"{emby_name} {parent_path} 下已找到弹幕文件：{danmu_path_pattern}")
+                self.__notify(context, f"{emby_name} {library_name} {item.get('Name')} 下载弹幕文件成功", log=False)
+            else:
+                logger.error(f"{emby_name} {parent_path} 下未找到弹幕文件：{danmu_path_pattern}")
+                self.__notify(context, f"{emby_name} {library_name} {item.get('Name')} 已配置弹幕源全部匹配弹幕失败",
+                              log=False)
+            if on_done:
+                on_done(danmu_cnt >= 1)
+
+        # 通知Danmu插件获取弹幕，最多等待3分钟
+        if self.__track_download(context=context, item_id=movie_id, directory=parent_path,
+                                 pattern=danmu_path_pattern, expected=1, item_name=item_info.get("Name"),
+                                 item_year=item_info.get("ProductionYear"), callback=__done, timeout=180):
+            logger.info(f"{emby_name} 已通知弹幕插件获取 {library_name} {item.get('Name')} {movie_id} 的弹幕")
+            self.__notify(context,
+                          f"{emby_name} 开始通知Emby下载 {library_name} {item.get('Name')} 弹幕，异步执行，请耐心等候执行完成消息",
+                          log=False)
+            return
+        logger.error(f"{emby_name} 通知弹幕插件获取 {library_name} {item.get('Name')} {movie_id} 的弹幕失败")
+        self.__notify(context, f"{emby_name} 通知弹幕插件获取 {library_name} 电影 {item.get('Name')} {movie_id} 的弹幕失败",
+                      log=False)
+        if on_done:
+            on_done(False)
+
+    def __notify(self, context: dict, title: str, error: bool = False, log: bool = True):
+        """
+        记录日志并发送消息，批量任务只记录日志
+        """
+        if log:
+            if error:
+                logger.error(title)
+            else:
+                logger.info(title)
+        if context.get("batch_id"):
+            return
+        self.post_message(channel=context.get("channel"), title=title, userid=context.get("user"))
+
+    def __server_context(self, emby_name: str, emby_server: Any) -> dict:
+        """
+        切换到指定媒体服务器，返回服务器上下文
+        """
+        host = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+        context = {
+            "emby_name": emby_name,
+            "host": host,
+            "apikey": emby_server.config.config.get("apikey"),
+            "emby_user": emby_server.instance.get_user(),
+        }
+        self.__use_context(context)
+        self._danmu_source = self.__get_danmu_source()
+        context["sources"] = self._danmu_source
+        return context
+
+    def __use_context(self, context: dict):
+        """
+        切换到上下文中的媒体服务器，需持有_emby_lock
+        """
+        self._EMBY_HOST = context.get("host")
+        self._EMBY_APIKEY = context.get("apikey")
+        self._EMBY_USER = context.get("emby_user")
+        self._danmu_source = context.get("sources") or []
+
+    def __collect_jobs(self, context: dict, library_type: str, titles: Optional[List[str]],
+                       season_index: Optional[int]) -> List[dict]:
+        """
+        收集批量任务的下载项，电视剧按季拆分
+        """
+        emby_name = context.get("emby_name")
+        library_id = context.get("library_id")
+        library_name = context.get("library_name")
+        if titles:
+            items = []
+            for title in titles:
+                matched = []
+                for item in self.__get_items(library_id, nameStartsWith=title) or []:
+                    if library_type == "tvshows":
+                        if item.get("Name") == title:
+                            matched.append(item)
+                    else:
+                        matches = re.findall(r'^(.*?)(?= ?\(\d{4}\)?|$)', item.get("Name"), re.MULTILINE)
+                        if matches and str(matches[0]) == title:
+                            matched.append(item)
+                if not matched:
+                    logger.warn(f"{emby_name} 未找到媒体：{library_name} {title}")
+                items.extend(matched)
+        else:
+            items = self.__get_items(library_id) or []
+
+        jobs = {}
+        for item in items:
+            if library_type == "tvshows":
+                if item.get("Type") and item.get("Type") != "Series":
+                    continue
+                for season in self.__get_items(item.get("Id")) or []:
+                    if season_index and season.get("IndexNumber") != season_index:
+                        continue
+                    jobs[season.get("Id")] = {
+                        "key": season.get("Id"),
+                        "type": "Season",
+                        "name": item.get("Name"),
+                        "season": season.get("IndexNumber"),
+                    }
+            else:
+                if item.get("Type") and item.get("Type") != "Movie":
+                    continue
+                jobs[item.get("Id")] = {
+                    "key": item.get("Id"),
+                    "type": "Movie",
+                    "name": item.get("Name"),
+                }
+        return list(jobs.values())
+
+    def __start_batch(self, context: dict, library_type: str, titles: Optional[List[str]],
+                      season_index: Optional[int]):
+        """
+        创建批量弹幕下载任务，进度持久化，重启后继续执行
+        """
+        emby_name = context.get("emby_name")
+        library_name = context.get("library_name")
+        jobs = self.__collect_jobs(context, library_type, titles, season_index)
+        if not jobs:
+            logger.error(f"{emby_name} {library_name} 未找到需要下载弹幕的媒体")
+            self.post_message(channel=context.get("channel"),
+                              title=f"{emby_name} {library_name} 未找到需要下载弹幕的媒体",
+                              userid=context.get("user"))
+            return
+        record = {
+            "id": f"{emby_name}:{context.get('library_id')}:{int(time.time())}",
+            "server": emby_name,
+            "library_id": context.get("library_id"),
+            "library_name": library_name,
+            "channel": context.get("channel"),
+            "user": context.get("user"),
+            "create_time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+            "jobs": jobs,
+            "done": [],
+            "failed": [],
+        }
+        with self._batch_lock:
+            self.__save_batch(record)
+        logger.info(f"{emby_name} {library_name} 开始批量下载弹幕，共 {len(jobs)} 项，并发 {self._concurrency}")
+        self.post_message(channel=context.get("channel"),
+                          title=f"{emby_name} {library_name} 开始批量下载弹幕，共 {len(jobs)} 项，异步执行，请耐心等候执行完成消息",
+                          userid=context.get("user"))
+        self.__run_batch(record, context)
+
+    def __resume_batches(self):
+        """
+        恢复重启前未完成的批量任务
+        """
+        batches = self.get_data("batches") or {}
+        for record in list(batches.values()):
+            emby_servers = self.mediaserver_helper.get_services(name_filters=[record.get("server")],
+                                                                type_filter="emby")
+            emby_server = (emby_servers or {}).get(record.get("server"))
+            if not emby_server:
+                logger.error(f"批量弹幕任务 {record.get('id')} 的媒体服务器 {record.get('server')} 不可用，暂不恢复")
+                continue
+            with self._emby_lock:
+                context = self.__server_context(record.get("server"), emby_server)
+                library = next((library for library in self.__get_librarys() or []
+                                if library.get("Id") == record.get("library_id")), None)
+            if not library:
+                logger.error(f"批量弹幕任务 {record.get('id')} 的媒体库 {record.get('library_name')} 不存在，已删除任务")
+                with self._batch_lock:
+                    self.__remove_batch(record.get("id"))
+                continue
+            context.update({
+                "library_id": record.get("library_id"),
+                "library_name": record.get("library_name"),
+                "library_options": library.get("LibraryOptions"),
+                "channel": record.get("channel"),
+                "user": record.get("user"),
+            })
+            logger.info(f"恢复批量弹幕任务 {record.get('id')}，"
+                        f"剩余 {len(record.get('jobs')) - len(record.get('done')) - len(record.get('failed'))} 项")
+            self.__run_batch(record, context)
+
+    def __run_batch(self, record: dict, context: dict):
+        """
+        执行批量任务，整个批次只切换一次媒体库的Danmu插件
+        """
+        batch_context = dict(context, batch_id=record.get("id"))
+        if not self.__acquire_library(batch_context, record.get("id")):
+            return
+        finished = set(record.get("done")) | set(record.get("failed"))
+        with self._batch_lock:
+            self._batches[record.get("id")] = {
+                "record": record,
+                "context": batch_context,
+                "pending": [job for job in record.get("jobs") if job.get("key") not in finished],
+                "active": 0,
+                "scheduling": False,
+            }
+        self.__batch_next(record.get("id"))
+
+    def __batch_next(self, batch_id: str):
+        """
+        在并发上限内启动批次中的下载项，全部结束后汇总
+        """
+        with self._batch_lock:
+            batch = self._batches.get(batch_id)
+            # 已有线程在调度，由其继续处理
+            if not batch or batch.get("scheduling"):
+                return
+            batch["scheduling"] = True
+        context = batch.get("context")
+        while True:
+            with self._batch_lock:
+                # 插件已停止，进度已持久化
+                if self._batches.get(batch_id) is not batch:
+                    return
+                if not batch["pending"] and not batch["active"]:
+                    self._batches.pop(batch_id, None)
+                    break
+                if batch["active"] >= max(1, self._concurrency) or not batch["pending"]:
+                    batch["scheduling"] = False
+                    return
+                job = batch["pending"].pop(0)
+                batch["active"] += 1
+
+            def __done(ok: bool, job_key: str = job.get("key")):
+                self.__batch_job_done(batch_id, job_key, ok)
+
+            try:
+                with self._emby_lock:
+                    self.__use_context(context)
+                    if job.get("type") == "Season":
+                        self.__danmu_season(context, job.get("name"),
+                                            {"Id": job.get("key"), "IndexNumber": job.get("season")}, on_done=__done)
                     else:
-                        logger.error(f"{emby_name} 禁用媒体库：{library_name} Danmu插件失败")
+                        self.__danmu_movie(context, {"Id": job.get("key"), "Name": job.get("name")}, on_done=__done)
+            except Exception as e:
+                logger.error(f"{context.get('emby_name')} 批量获取 {job.get('name')} 弹幕出错：{str(e)}")
+                __done(False)
+
+        # 批次完成
+        record = batch.get("record")
+        self.__release_library(context.get("library_id"), batch_id)
+        with self._batch_lock:
+            self.__remove_batch(batch_id)
+        failed = set(record.get("failed"))
+        failed_names = [f"{job.get('name')} 第{job.get('season')}季" if job.get("type") == "Season" else job.get("name")
+                        for job in record.get("jobs") if job.get("key") in failed]
+        logger.info(f"{context.get('emby_name')} {context.get('library_name')} 批量下载弹幕完成，"
+                    f"共 {len(record.get('jobs'))} 项，成功 {len(record.get('done'))} 项，失败 {len(failed_names)} 项")
+        EmbyClient.report()
+        self.post_message(channel=context.get("channel"),
+                          title=f"{context.get('emby_name')} {context.get('library_name')} 批量下载弹幕完成",
+                          text=f"共 {len(record.get('jobs'))} 项，成功 {len(record.get('done'))} 项，"
+                               f"失败 {len(failed_names)} 项" +
+                               (f"\n失败：{'、'.join(failed_names[:20])}" if failed_names else ""),
+                          userid=context.get("user"))
+
+    def __batch_job_done(self, batch_id: str, job_key: str, ok: bool):
+        """
+        记录下载项结果并继续调度
+        """
+        with self._batch_lock:
+            batch = self._batches.get(batch_id)
+            if not batch:
+                return
+            batch["active"] -= 1
+            record = batch.get("record")
+            if ok:
+                record["done"].append(job_key)
+            else:
+                record["failed"].append(job_key)
+            self.__save_batch(record)
+        self.__batch_next(batch_id)
+
+    def __save_batch(self, record: dict):
+        """
+        保存批量任务进度，需持有_batch_lock
+        """
+        batches = self.get_data("batches") or {}
+        batches[record.get("id")] = record
+        self.save_data("batches", batches)
+
+    def __remove_batch(self, batch_id: str):
+        """
+        删除批量任务进度，需持有_batch_lock
+        """
+        batches = self.get_data("batches") or {}
+        if batches.pop(batch_id, None):
+            self.save_data("batches", batches)
+
+    def __track_download(self, context: dict, item_id: str, directory: Path, pattern: str, expected: int,
+                         item_name: str, item_year: Any, callback: Callable, timeout: int) -> bool:
+        """
+        注册弹幕跟踪任务并通知Danmu插件下载，任务结束后释放媒体库
+        """
+        library_id = context.get("library_id")
+        task_key = f"{context.get('emby_name')}:{item_id}"
+        if not self.__acquire_library(context, task_key):
+            return False
+
+        def __finish(status: str, danmu_cnt: int, expected_cnt: int):
+            try:
+                # 插件停止时只释放媒体库，不发送结果通知
+                if status != "cancelled":
+                    callback(status, danmu_cnt, expected_cnt)
+            finally:
+                self.__release_library(library_id, task_key)
+
+        self._tracker.track(key=task_key, directory=directory, pattern=pattern, expected=expected,
+                            item_name=item_name, item_year=item_year, sources=context.get("sources"),
+                            log_key=context.get("host"),
+                            log_url=f"{context.get('host')}System/Logs/embyserver.txt?api_key={context.get('apikey')}",
+                            callback=__finish, timeout=timeout)
+        if self.__download_danmu(item_id):
+            return True
+        self._tracker.cancel(task_key)
+        self.__release_library(library_id, task_key)
+        return False
+
+    def __acquire_library(self, context: dict, token: str) -> bool:
+        """
+        登记媒体库弹幕任务，首个任务启用媒体库的Danmu插件
+        """
+        library_id = context.get("library_id")
+        with self._library_lock:
+            tasks = self._library_task.get(library_id)
+            if tasks:
+                tasks.append(token)
+                return True
+            self._library_task[library_id] = [token]
+            self._library_context[library_id] = context
+
+        # 检查是否已经禁用了Danmu插件，如禁用则先启用
+        emby_name = context.get("emby_name")
+        library_name = context.get("library_name")
+        library_options = context.get("library_options")
+        library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
+        if "Danmu" not in library_disabled_subtitle_fetchers:
+            logger.info(f"{emby_name} 媒体库：{library_name}的Danmu插件已启用")
+            return True
+        library_disabled_subtitle_fetchers.remove("Danmu")
+        library_options.update({
+            "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
+        })
+        if self.__update_library(library_id, library_options, context.get("host"), context.get("apikey")):
+            logger.info(f"{emby_name} 已启用媒体库：{library_name}的Danmu插件")
+            return True
+
+        logger.error(f"{emby_name} 启用媒体库：{library_name}的Danmu插件失败")
+        self.post_message(channel=context.get("channel"),
+                          title=f"{emby_name} 启用媒体库：{library_name}的Danmu插件失败",
+                          userid=context.get("user"))
+        with self._library_lock:
+            self._library_task.pop(library_id, None)
+            self._library_context.pop(library_id, None)
+        return False
+
+    def __release_library(self, library_id: str, token: str):
+        """
+        结束媒体库弹幕任务，没有其他任务时关闭媒体库的Danmu插件
+        """
+        with self._library_lock:
+            tasks = self._library_task.get(library_id) or []
+            if token in tasks:
+                tasks.remove(token)
+            if tasks:
+                return
+            self._library_task.pop(library_id, None)
+            context = self._library_context.pop(library_id, None)
+        if not context:
+            return
+
+        # 禁用媒体库的Danmu插件
+        emby_name = context.get("emby_name")
+        library_name = context.get("library_name")
+        library_options = context.get("library_options")
+        logger.info(f"{emby_name} {library_name} 获取弹幕任务完成，关闭弹幕插件")
+        library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
+        library_disabled_subtitle_fetchers.append("Danmu")
+        library_options.update({
+            "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
+        })
+        if self.__update_library(library_id, library_options, context.get("host"), context.get("apikey")):
+            logger.info(f"{emby_name} 已禁用媒体库：{library_name} Danmu插件")
+        else:
+            logger.error(f"{emby_name} 禁用媒体库：{library_name} Danmu插件失败")
 
     def get_state(self) -> bool:
         return self._enabled
@@ -453,7 +1184,7 @@ class EmbyDanmu(_PluginBase):
         req_url = f"%semby/Library/VirtualFolders/Query?api_key=%s" % (
             self._EMBY_HOST, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.json().get("Items")
                 else:
@@ -474,20 +1205,20 @@ class EmbyDanmu(_PluginBase):
         # 未匹配到路径，返回原路径
         return file_path
 
-    def __update_library(self, library_id, library_options) -> bool:
+    @staticmethod
+    def __update_library(library_id, library_options, host: str, apikey: str) -> bool:
         """
-        获取媒体库信息
+        更新媒体库配置
         """
-        if not self._EMBY_HOST or not self._EMBY_APIKEY:
+        if not host or not apikey:
             return False
         headers = {
             'accept': '*/*',
             'Content-Type': 'application/json'
         }
-        req_url = f"%semby/Library/VirtualFolders/LibraryOptions?api_key=%s" % (
-            self._EMBY_HOST, self._EMBY_APIKEY)
-        res = RequestUtils(headers=headers).post(url=req_url,
-                                                 data=json.dumps({"Id": library_id, "LibraryOptions": library_options}))
+        req_url = f"%semby/Library/VirtualFolders/LibraryOptions?api_key=%s" % (host, apikey)
+        res = EmbyClient.post(req_url, data=json.dumps({"Id": library_id, "LibraryOptions": library_options}),
+                              headers=headers)
         if res and res.status_code == 204:
             return True
         return False
@@ -506,7 +1237,7 @@ class EmbyDanmu(_PluginBase):
                 self._EMBY_HOST, self._EMBY_USER, parent_id, self._EMBY_APIKEY)
         logger.debug(f"开始获取媒体列表：{req_url}")
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     if res.json().get("Items") and res.json().get("Items")[0].get("Type") == "Folder":
                         # emby 4.8.8版本api
@@ -534,7 +1265,7 @@ class EmbyDanmu(_PluginBase):
                 self._EMBY_HOST, parent_id, self._EMBY_APIKEY)
         logger.debug(f"开始获取媒体列表488：{req_url}")
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.json().get("Items")
                 else:
@@ -553,7 +1284,7 @@ class EmbyDanmu(_PluginBase):
         req_url = f"%sapi/danmu/%s?option=Refresh&api_key=%s" % (
             self._EMBY_HOST, item_id, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.text == "ok"
                 else:
@@ -571,51 +1302,25 @@ class EmbyDanmu(_PluginBase):
             return {}
         req_url = f"%semby/Users/%s/Items/%s?fields=ShareLevel&ExcludeFields=Chapters,Overview,People,MediaStreams,Subviews&api_key=%s" % (
             self._EMBY_HOST, self._EMBY_USER, item_id, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
+        with EmbyClient.get(req_url) as res:
             if res:
                 return res.json()
             else:
                 logger.info(f"获取媒体详情失败，无法连接Emby！")
                 return {}
 
-    def __check_danmu_exists(self, season_id: str, only_check: bool):
+    def __get_danmu_dir(self, season_id: str):
         """
-        检查媒体是否有弹幕
+        获取季的剧集列表、首集详情和弹幕目录
         """
         season_items = self.__get_items(season_id)
+        if not season_items:
+            return [], {}, None
         item_info = self.__get_item_info(season_items[0].get("Id"))
         item_path = item_info.get("Path")
         parent_path = Path(self.__get_path(str(Path(item_path).parent)))
         logger.info(f"开始检查路径 {parent_path} 下是是否有弹幕文件")
-        # 检查是否有弹幕文件
-        danmu_path_pattern = "*.xml"
-
-        if only_check:
-            return len(list(parent_path.glob(danmu_path_pattern))), len(season_items)
-        else:
-            retry_cnt = len(season_items)
-            _downloaded_danmu_files = []
-            while len(_downloaded_danmu_files) < len(season_items) and retry_cnt > 0:
-                # 解析日志判断是否全部失败
-                if self.__check_all_failed_by_log(item_name=item_info.get("SeriesName"),
-                                                  item_year=item_info.get("ProductionYear")):
-                    logger.error(f"解析日志判断已配置弹幕源全部匹配弹幕失败")
-                    retry_cnt = -1
-                else:
-                    danmu_files = list(parent_path.glob(danmu_path_pattern))
-                    for danmu_file in danmu_files:
-                        if danmu_file.name not in _downloaded_danmu_files:
-                            _downloaded_danmu_files.append(danmu_file.name)
-                            logger.info(f"已下载弹幕文件：{danmu_file.name}")
-                    # 判断是否完成任务
-                    if len(_downloaded_danmu_files) != len(season_items):
-                        retry_cnt -= 1
-                        logger.warn(
-                            f"{parent_path} 下弹幕文件：{danmu_path_pattern} 未下载完成，等待60秒后重试 ({retry_cnt}次)")
-                        time.sleep(60)
-
-            return len(_downloaded_danmu_files), len(season_items)
-
+        return season_items, item_info, parent_path
     def __get_plugins(self) -> list:
         """
         获取插件列表
@@ -624,7 +1329,7 @@ class EmbyDanmu(_PluginBase):
             return []
         req_url = f"%semby/web/configurationpages?PageType=PluginConfiguration&EnableInMainMenu=true&UserId=%s&api_key=%s" % (
             self._EMBY_HOST, self._EMBY_USER, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
+        with EmbyClient.get(req_url) as res:
             if res:
                 return res.json()
             else:
@@ -639,7 +1344,7 @@ class EmbyDanmu(_PluginBase):
             return {}
         req_url = f"%semby/Plugins/%s/Configuration?api_key=%s" % (
             self._EMBY_HOST, plugin_id, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
+        with EmbyClient.get(req_url) as res:
             if res:
                 return res.json()
             else:
@@ -677,47 +1382,6 @@ class EmbyDanmu(_PluginBase):
 
         return [scraper.get("Name") for scraper in scrapers if scraper.get("Enable") == True]
 
-    def __get_emby_log(self) -> str:
-        """
-        获取emby日志 最新200行
-        """
-        if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return ""
-        req_url = f"%sSystem/Logs/embyserver.txt?api_key=%s" % (
-            self._EMBY_HOST, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
-            if res:
-                emby_log = res.text.split("\n")
-                emby_log = emby_log[-200:]
-                return "\n".join(emby_log)
-            else:
-                logger.info(f"获取插件详情失败，无法连接Emby！")
-                return ""
-
-    def __check_all_failed_by_log(self, item_name, item_year) -> bool:
-        """
-        解析emby日志
-        """
-        emby_log = self.__get_emby_log()
-        if not emby_log:
-            return False
-
-        # 正则解析删除的媒体信息
-        all_matched = True
-        for source in self._danmu_source:
-            pattern = fr'\[{source}\]匹配失败：{item_name} \({item_year}\)'
-            matches = re.findall(pattern, emby_log)
-            if not matches:
-                all_matched = False
-                break
-
-            pattern = fr'\[{source}\]弹幕内容少于1KB，忽略处理：.{item_name}'
-            matches = re.findall(pattern, emby_log)
-            if not matches:
-                all_matched = False
-                break
-        return all_matched
-
     @staticmethod
     def get_command() -> List[Dict[str, Any]]:
         return [
@@ -761,6 +1425,23 @@ class EmbyDanmu(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '批量并发数',
+                                            'placeholder': '批量下载时同时下载弹幕的季/电影数量，默认2'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -826,7 +1507,8 @@ class EmbyDanmu(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '仅支持交互命令运行: /danmu 媒体库名 媒体名 (季)。 季可选，不填则获取全部季度。'
+                                            'text': '仅支持交互命令运行: /danmu 媒体库名 (媒体名) (季)。 季可选，不填则获取全部季度；'
+                                                    '不填媒体名则批量下载整个媒体库，多个媒体名用逗号分隔时批量下载，批量任务重启后继续执行。'
                                         }
                                     }
                                 ]
@@ -860,10 +1542,28 @@ class EmbyDanmu(_PluginBase):
             "enabled": False,
             "dirs": "",
             "mediaservers": [],
+            "concurrency": 2,
         }
 
     def get_page(self) -> List[dict]:
         pass
 
     def stop_service(self):
-        pass
+        """
+        退出插件
+        """
+        if self._tracker:
+            self._tracker.stop()
+            self._tracker = None
+        # 批量任务进度已持久化，重新启用后继续执行
+        with self._batch_lock:
+            self._batches = {}
+        # 释放剩余的媒体库任务，关闭已启用的Danmu插件
+        with self._library_lock:
+            library_tasks = {library_id: list(tokens) for library_id, tokens in self._library_task.items()}
+        for library_id, tokens in library_tasks.items():
+            for token in tokens:
+                try:
+                    self.__release_library(library_id, token)
+                except Exception as e:
+                    logger.error(f"关闭媒体库 {library_id} 的Danmu插件出错：{str(e)}")
@@ -1,8 +1,13 @@
 import datetime
+import re
 import threading
-from typing import List, Tuple, Dict, Any
+import time
+from typing import List, Tuple, Dict, Any, Optional
+from urllib.parse import urlparse
 
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -12,11 +17,213 @@ from app.log import logger
 from app.modules.emby import Emby
 from app.plugins import _PluginBase
 from app.schemas import NotificationType
-from app.utils.http import RequestUtils
 
 lock = threading.Lock()
 
 
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
 class EmbyExtendType(_PluginBase):
     # 插件名称
     plugin_name = "Emby视频类型检查"
@@ -25,7 +232,7 @@ class EmbyExtendType(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/extendtype.png"
     # 插件版本
-    plugin_version = "1.1"
+    plugin_version = "1.2.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -121,11 +328,7 @@ class EmbyExtendType(_PluginBase):
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
 
             # 获取媒体库信息
             librarys = emby_server.instance.get_librarys()
@@ -150,6 +353,7 @@ class EmbyExtendType(_PluginBase):
                 logger.info(f"{emby_name} 媒体库 {library_name} 中全部视频类型检查完毕")
 
             logger.info(f"{emby_name} 媒体库中全部视频类型检查完毕")
+            EmbyClient.report()
 
     def __get_extend_type(self, parent_id) -> list:
         """
@@ -160,7 +364,7 @@ class EmbyExtendType(_PluginBase):
         req_url = f"%semby/ExtendedVideoTypes?ParentId=%s&Recursive=true&IncludeItemTypes=Episode,Movie&Limit=10&api_key=%s" % (
             self._EMBY_HOST, parent_id, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.json().get("Items")
                 else:
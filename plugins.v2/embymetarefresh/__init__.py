@@ -1,17 +1,22 @@
 import base64
 import copy
+import hashlib
 import json
 import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, Future
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional, Any, List, Dict, Tuple
+from urllib.parse import urlparse
 
 import pytz
+import requests
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from dateutil.parser import isoparse
-from requests import RequestException
+from requests.adapters import HTTPAdapter
 from zhconv import zhconv
 
 from app import schemas
@@ -23,11 +28,595 @@ from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import EventType, MediaType
-from app.utils.common import retry
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class AdaptiveThrottle:
+    """
+    根据Emby响应耗时自适应调整请求间隔，响应变慢或失败时加大间隔，恢复后逐步缩小
+    """
+
+    def __init__(self, target_latency: float = 0.5, min_interval: float = 0.0, max_interval: float = 3.0):
+        self._target_latency = target_latency
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._interval = min_interval
+        self._latency = None
+        self._next_time = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        按当前间隔排队等待
+        """
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_time - now
+            self._next_time = max(now, self._next_time) + self._interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, latency: float, success: bool = True):
+        """
+        记录一次请求耗时，按指数加权平均调整间隔
+        """
+        with self._lock:
+            self._latency = latency if self._latency is None else self._latency * 0.8 + latency * 0.2
+            if not success or self._latency > self._target_latency:
+                self._interval = min(self._max_interval, max(self._interval * 2, 0.05))
+            else:
+                self._interval = max(self._min_interval, self._interval / 2)
+                if self._interval < 0.01:
+                    self._interval = self._min_interval
+
+    @property
+    def latency(self) -> float:
+        return self._latency or 0.0
+
+
+class RefreshPlanner:
+    """
+    媒体刷新计划
+    Emby刷新为递归的全量刷新，按剧集和季分组，只有一季中大部分集需要刷新时才合并为刷新季，
+    整部剧集已加入计划时其下的季和集不再单独刷新，避免重新刮削未变化的集
+    """
+    # 同一季需要刷新的集数占全季比例达到该值时合并为刷新季
+    SEASON_COLLAPSE_RATIO = 0.8
+    # 全季集数未知时，同一季达到该集数才合并为刷新季
+    SEASON_COLLAPSE_COUNT = 20
+    TYPE_NAMES = {"Series": "剧集", "Season": "季", "Episode": "集", "Item": "媒体"}
+
+    def __init__(self):
+        # 单独刷新的媒体：item_id -> 名称
+        self._items: Dict[str, str] = {}
+        # 剧集：series_id -> {"name", "whole", "seasons": {季号: {"id", "episodes": {item_id: 名称}}}}
+        self._series: Dict[str, dict] = {}
+        # 加入计划的媒体数
+        self.size = 0
+
+    def add_item(self, item_id: str, name: str):
+        """
+        单独刷新的媒体，如电影
+        """
+        self.size += 1
+        self._items[str(item_id)] = name
+
+    def add_series(self, series_id: str, name: str):
+        """
+        刷新整部剧集
+        """
+        self.size += 1
+        self.__series(series_id, name)["whole"] = True
+
+    def add_episode(self, series_id: str, series_name: str, season: Any, season_id: Optional[str],
+                    item_id: str, name: str, season_total: int = None):
+        """
+        刷新单集
+        :param season_total: 该季全部集数，未知时为空
+        """
+        self.size += 1
+        seasons = self.__series(series_id, series_name)["seasons"]
+        season_plan = seasons.setdefault(season, {"id": None, "total": None, "episodes": {}})
+        season_plan["id"] = season_plan.get("id") or season_id
+        season_plan["total"] = season_plan.get("total") or season_total
+        season_plan["episodes"][str(item_id)] = name
+
+    def targets(self) -> List[Tuple[str, str, str]]:
+        """
+        合并后的刷新目标：(类型, item_id, 描述)
+        """
+        targets = [("Item", item_id, name) for item_id, name in self._items.items()]
+        for series_id, series in self._series.items():
+            if series.get("whole"):
+                targets.append(("Series", series_id, series.get("name")))
+                continue
+            for season, season_plan in series.get("seasons").items():
+                episodes = season_plan.get("episodes")
+                if season_plan.get("id") and self.__collapse_season(len(episodes), season_plan.get("total")):
+                    targets.append(("Season", season_plan.get("id"), f"{series.get('name')} 第{season}季"))
+                else:
+                    targets.extend(("Episode", item_id, name) for item_id, name in episodes.items())
+        return targets
+
+    def __collapse_season(self, count: int, total: Optional[int]) -> bool:
+        """
+        是否合并为刷新季
+        """
+        if count < 2:
+            return False
+        if total:
+            return count / total >= self.SEASON_COLLAPSE_RATIO
+        return count >= self.SEASON_COLLAPSE_COUNT
+
+    def __series(self, series_id: str, name: str) -> dict:
+        return self._series.setdefault(str(series_id), {"name": name, "whole": False, "seasons": {}})
+
+
+class PersistentCache:
+    """
+    持久化缓存，条目按写入时间过期，未命中结果（空值）使用较短的有效期
+    """
+
+    def __init__(self, path: Path, ttl: int, miss_ttl: int = None):
+        """
+        :param ttl: 有效期（秒）
+        :param miss_ttl: 空值有效期（秒），默认同ttl
+        """
+        self._path = path
+        self._ttl = ttl
+        self._miss_ttl = miss_ttl or ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._data = self.__load()
+        self.hits = 0
+        self.misses = 0
+
+    def __load(self) -> dict:
+        try:
+            if self._path.exists():
+                return json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取缓存 {self._path.name} 失败：{str(e)}")
+        return {}
+
+    def __expired(self, entry: dict, now: float) -> bool:
+        return now - entry.get("t", 0) >= (self._ttl if entry.get("v") else self._miss_ttl)
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """
+        查询缓存，返回 (是否命中, 值)
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry and not self.__expired(entry, time.time()):
+                self.hits += 1
+                return True, entry.get("v")
+            self.misses += 1
+        return False, None
+
+    def values(self, prefix: str) -> List[Any]:
+        """
+        获取指定前缀的未过期条目值
+        """
+        with self._lock:
+            now = time.time()
+            return [entry.get("v") for key, entry in self._data.items()
+                    if key.startswith(prefix) and not self.__expired(entry, now)]
+
+    def stats(self, reset: bool = True) -> Tuple[int, int]:
+        """
+        命中和未命中次数
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            if reset:
+                self.hits = self.misses = 0
+        return hits, misses
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = {"v": value, "t": int(time.time())}
+            self._dirty = True
+
+    def save(self):
+        """
+        清理过期条目并写入文件
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            now = time.time()
+            self._data = {key: entry for key, entry in self._data.items() if not self.__expired(entry, now)}
+            try:
+                tmp_path = self._path.with_suffix(".tmp")
+                tmp_path.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+                tmp_path.replace(self._path)
+                self._dirty = False
+            except Exception as e:
+                logger.error(f"保存缓存 {self._path.name} 失败：{str(e)}")
+
+
+class ImagePipeline:
+    """
+    人物图片上传队列
+    后台线程池下载并上传图片，同一人物只处理一次，图片按内容哈希缓存到本地，Emby中图片未变化时跳过上传
+    """
+    # 排队中的最大任务数，超出时提交方等待
+    MAX_PENDING = 100
+    # 下载重试次数
+    RETRIES = 3
+
+    def __init__(self, cache_dir: Path, records: PersistentCache, workers: int = 4):
+        """
+        :param cache_dir: 图片缓存目录
+        :param records: 上传记录，人物 -> 图片地址及上传后的PrimaryImageTag；图片地址 -> 内容哈希
+        """
+        self._cache_dir = cache_dir
+        self._records = records
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="EmbyImage")
+        self._slots = threading.BoundedSemaphore(self.MAX_PENDING)
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+        # 下载中的图片地址，同一地址同时只下载一次
+        self._downloading: Dict[str, threading.Lock] = {}
+        self._stats = {"uploaded": 0, "skipped": 0, "failed": 0, "downloaded": 0}
+
+    def submit(self, server: str, emby: Any, person_id: str, image_url: str, image_tag: str = None):
+        """
+        提交人物图片
+        :param server: 服务器标识，与人物Id组成去重键
+        :param image_tag: Emby中人物当前的PrimaryImageTag
+        """
+        key = f"{server}{person_id}"
+        with self._lock:
+            if key in self._futures:
+                return
+            cached, record = self._records.get(f"person:{key}")
+            if cached and record.get("url") == image_url and image_tag and record.get("tag") == image_tag:
+                self._stats["skipped"] += 1
+                return
+            # 占位，避免重复提交
+            self._futures[key] = None
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self.__process, key, emby, person_id, image_url)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self._futures[key] = future
+
+    def wait(self) -> dict:
+        """
+        等待已提交的图片处理完成，返回统计并重置
+        """
+        with self._lock:
+            futures = [future for future in self._futures.values() if future]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"处理人物图片出错：{str(e)}")
+        with self._lock:
+            self._futures = {}
+            stats, self._stats = self._stats, {key: 0 for key in self._stats}
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def prune(self) -> int:
+        """
+        删除不再被图片地址记录引用的缓存图片，应在wait之后调用，返回删除数量
+        """
+        if not self._cache_dir.exists():
+            return 0
+        digests = {digest for digest in self._records.values("url:") if digest}
+        removed = 0
+        for sub_dir in self._cache_dir.iterdir():
+            if not sub_dir.is_dir():
+                # 中断遗留的临时文件
+                if sub_dir.name.endswith(".tmp"):
+                    sub_dir.unlink(missing_ok=True)
+                continue
+            for image_file in sub_dir.iterdir():
+                if image_file.name in digests:
+                    continue
+                try:
+                    image_file.unlink()
+                    removed += 1
+                except Exception as e:
+                    logger.debug(f"删除缓存图片 {image_file} 失败：{str(e)}")
+            if not any(sub_dir.iterdir()):
+                sub_dir.rmdir()
+        return removed
+
+    def __count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def __process(self, key: str, emby: Any, person_id: str, image_url: str):
+        with self._lock:
+            url_lock = self._downloading.setdefault(image_url, threading.Lock())
+        with url_lock:
+            image_file = self.__download(image_url)
+        with self._lock:
+            self._downloading.pop(image_url, None)
+        if not image_file:
+            self.__count("failed")
+            return
+        try:
+            res = emby.post_data(
+                url=f'[HOST]emby/Items/{person_id}/Images/Primary?api_key=[APIKEY]',
+                data=base64.b64encode(image_file.read_bytes()).decode(),
+                headers={
+                    "Content-Type": "image/png"
+                }
+            )
+            if res and res.status_code in [200, 204]:
+                self._records.set(f"person:{key}", {"url": image_url, "tag": self.__image_tag(emby, person_id)})
+                self.__count("uploaded")
+                return
+            logger.error(f"更新Emby媒体项图片失败，错误码：{res.status_code if res else None}")
+        except Exception as err:
+            logger.error(f"更新Emby媒体项图片失败：{str(err)}")
+        self.__count("failed")
+
+    @staticmethod
+    def __image_tag(emby: Any, person_id: str) -> Optional[str]:
+        """
+        上传后Emby中人物的PrimaryImageTag
+        """
+        try:
+            res = emby.get_data(url=f'[HOST]emby/Users/[USER]/Items/{person_id}?api_key=[APIKEY]')
+            if res:
+                return (res.json().get("ImageTags") or {}).get("Primary")
+        except Exception as err:
+            logger.debug(f"获取人物图片标签失败：{str(err)}")
+        return None
+
+    def __download(self, image_url: str) -> Optional[Path]:
+        """
+        下载图片到本地缓存，以内容哈希命名，同一地址只下载一次
+        """
+        cached, digest = self._records.get(f"url:{image_url}")
+        if cached and digest:
+            image_file = self._cache_dir / digest[:2] / digest
+            if image_file.exists():
+                return image_file
+        if "doubanio.com" in image_url:
+            headers, proxies = {"Referer": "https://movie.douban.com/", "User-Agent": settings.USER_AGENT}, None
+        else:
+            headers, proxies = {"User-Agent": settings.USER_AGENT}, settings.PROXY
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self._cache_dir / f".{threading.get_ident()}.tmp"
+        for retry_count in range(self.RETRIES):
+            try:
+                sha256 = hashlib.sha256()
+                with requests.get(image_url, headers=headers, proxies=proxies, stream=True, timeout=30) as res:
+                    res.raise_for_status()
+                    with open(tmp_file, "wb") as file:
+                        for chunk in res.iter_content(chunk_size=65536):
+                            sha256.update(chunk)
+                            file.write(chunk)
+                digest = sha256.hexdigest()
+                image_file = self._cache_dir / digest[:2] / digest
+                image_file.parent.mkdir(parents=True, exist_ok=True)
+                tmp_file.replace(image_file)
+                self._records.set(f"url:{image_url}", digest)
+                self.__count("downloaded")
+                return image_file
+            except Exception as err:
+                logger.warn(f"{image_url} 图片下载失败：{str(err)}，重试 {retry_count + 1} / {self.RETRIES}")
+                time.sleep(2 ** retry_count)
+        tmp_file.unlink(missing_ok=True)
+        return None
+
+
 class EmbyMetaRefresh(_PluginBase):
     # 插件名称
     plugin_name = "Emby元数据刷新"
@@ -36,7 +625,7 @@ class EmbyMetaRefresh(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/emby-icon.png"
     # 插件版本
-    plugin_version = "2.1.4"
+    plugin_version = "2.1.9"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -63,6 +652,14 @@ class EmbyMetaRefresh(_PluginBase):
     _actor_path = None
     _mediaservers = None
     _interval = None
+    _concurrency = 2
+    # 人物中文信息缓存，TMDB人物Id -> 中文名、简介、图片
+    _person_cache: Optional[PersistentCache] = None
+    # 豆瓣演员缓存，媒体 -> 豆瓣演职人员
+    _douban_cache: Optional[PersistentCache] = None
+    # 人物图片上传记录
+    _image_cache: Optional[PersistentCache] = None
+    _image_pipeline: Optional[ImagePipeline] = None
     mediaserver_helper = None
     _EMBY_HOST = None
     _EMBY_USER = None
@@ -74,6 +671,12 @@ class EmbyMetaRefresh(_PluginBase):
         self.stop_service()
         self.tmdbchain = TmdbChain()
         self.mediaserver_helper = MediaServerHelper()
+        self._person_cache = PersistentCache(self.get_data_path() / "person_cache.json",
+                                             ttl=30 * 86400, miss_ttl=3 * 86400)
+        self._douban_cache = PersistentCache(self.get_data_path() / "douban_cache.json",
+                                             ttl=7 * 86400, miss_ttl=86400)
+        self._image_cache = PersistentCache(self.get_data_path() / "image_cache.json", ttl=180 * 86400)
+        self._image_pipeline = ImagePipeline(self.get_data_path() / "images", self._image_cache)
 
         if config:
             self._enabled = config.get("enabled")
@@ -87,6 +690,9 @@ class EmbyMetaRefresh(_PluginBase):
             self._ReplaceAllImages = config.get("ReplaceAllImages") or "true"
             self._mediaservers = config.get("mediaservers") or []
             self._interval = config.get("interval") or 5
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 2
 
             # 加载模块
             if self._enabled or self._onlyonce:
@@ -140,6 +746,7 @@ class EmbyMetaRefresh(_PluginBase):
                 "actor_path": self._actor_path,
                 "mediaservers": self._mediaservers,
                 "interval": self._interval,
+                "concurrency": self._concurrency,
             }
         )
 
@@ -157,12 +764,9 @@ class EmbyMetaRefresh(_PluginBase):
             emby = emby_server.instance
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
 
+            planner = RefreshPlanner()
             if str(self._refresh_type) == "历史记录":
                 # 获取days内入库的媒体
                 current_date = datetime.now()
@@ -174,12 +778,16 @@ class EmbyMetaRefresh(_PluginBase):
                     return
 
                 logger.info(f"开始刷新媒体库元数据，最近 {self._num} 天内入库媒体：{len(transferhistorys)}个")
-                # 刷新媒体库
-                for transferinfo in transferhistorys:
-                    self.__refresh_emby(transferinfo, emby)
-                    if self._interval:
-                        logger.info(f"等待 {self._interval} 秒后继续刷新")
-                        time.sleep(int(self._interval))
+                # 生成刷新计划并刷新媒体库
+                actor_medias = self.__plan_history(planner, transferhistorys, emby)
+                self.__dispatch(planner)
+
+                # 刮演员中文
+                if self._actor_chi:
+                    for actor_media in actor_medias:
+                        if self._event.is_set():
+                            break
+                        self.__update_people_chi(**actor_media)
             else:
                 latest = self.__get_latest_media()
                 if not latest:
@@ -188,25 +796,27 @@ class EmbyMetaRefresh(_PluginBase):
 
                 logger.info(f"开始刷新媒体库元数据，{self._num} 天内最新媒体：{len(latest)} 个")
 
-                # 已处理的媒体
-                handle_items = {}
-
-                # 刷新媒体库
+                # 信息不全的媒体加入刷新计划
                 for item in latest:
-                    # 信息不全再刷新
+                    title = f"{'电视剧' if str(item.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item.get('SeriesName'), item.get('ParentIndexNumber'), item.get('IndexNumber'), item.get('Name')) if str(item.get('Type')) == 'Episode' else item.get('Name')} {item.get('Id')}"
                     if (str(item.get('Type')) == 'Episode' and str(
                             item.get("Name")) == f"第 {item.get('IndexNumber')} 集") or not item.get(
                         "Overview") or not item.get("ImageTags"):
-                        logger.info(
-                            f"开始刷新媒体库元数据，最新媒体：{'电视剧' if str(item.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item.get('SeriesName'), item.get('ParentIndexNumber'), item.get('IndexNumber'), item.get('Name')) if str(item.get('Type')) == 'Episode' else item.get('Name')} {item.get('Id')}")
-                        self.__refresh_emby_library_by_id(item.get("Id"))
-                        if self._interval:
-                            logger.info(f"等待 {self._interval} 秒后继续刷新")
-                            time.sleep(int(self._interval))
+                        logger.info(f"最新媒体：{title} 元数据不完整，加入刷新计划")
+                        if str(item.get('Type')) == 'Episode' and item.get("SeriesId"):
+                            planner.add_episode(series_id=item.get("SeriesId"), series_name=item.get("SeriesName"),
+                                                season=item.get("ParentIndexNumber"), season_id=item.get("SeasonId"),
+                                                item_id=item.get("Id"), name=title)
+                        else:
+                            planner.add_item(item_id=item.get("Id"), name=title)
                     else:
-                        logger.info(
-                            f"最新媒体：{'电视剧' if str(item.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item.get('SeriesName'), item.get('ParentIndexNumber'), item.get('IndexNumber'), item.get('Name')) if str(item.get('Type')) == 'Episode' else item.get('Name')} {item.get('Id')} 元数据完整，跳过处理")
+                        logger.info(f"最新媒体：{title} 元数据完整，跳过处理")
+                self.__dispatch(planner)
+
+                # 已处理的媒体
+                handle_items = {}
 
+                for item in latest:
                     # 刮演员中文
                     if self._actor_chi:
                         logger.info(
@@ -251,7 +861,27 @@ class EmbyMetaRefresh(_PluginBase):
                             logger.info(
                                 f"最新媒体：{'电视剧' if str(item_info.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item_info.get('SeriesName'), item_info.get('ParentIndexNumber'), item_info.get('IndexNumber'), item_info.get('Name')) if str(item_info.get('Type')) == 'Episode' else item_info.get('Name')} {item_info.get('Id')} 演员信息完成 {flag}")
 
+            # 等待人物图片上传完成
+            image_stats = self._image_pipeline.wait()
+            if any(image_stats.values()):
+                logger.info(f"{emby_name} 人物图片上传 {image_stats.get('uploaded')} 张，"
+                            f"未变化跳过 {image_stats.get('skipped')} 张，失败 {image_stats.get('failed')} 张，"
+                            f"新下载 {image_stats.get('downloaded')} 张")
             logger.info(f"刷新 {emby_name} 媒体库元数据完成")
+            EmbyClient.report()
+
+        if self._actor_chi:
+            person_hits, person_misses = self._person_cache.stats()
+            douban_hits, douban_misses = self._douban_cache.stats()
+            logger.info(f"人物缓存命中 {person_hits} 次，未命中 {person_misses} 次；"
+                        f"豆瓣演员缓存命中 {douban_hits} 次，未命中 {douban_misses} 次")
+        self._person_cache.save()
+        self._douban_cache.save()
+        self._image_cache.save()
+        # 清理过期记录不再引用的缓存图片
+        removed = self._image_pipeline.prune()
+        if removed:
+            logger.info(f"清理过期人物图片缓存 {removed} 张")
 
     def __get_latest_media(self) -> List[dict]:
         """
@@ -403,6 +1033,15 @@ class EmbyMetaRefresh(_PluginBase):
         ret_people = copy.deepcopy(people)
 
         try:
+            # 已知TMDB和豆瓣都没有中文信息的人物，无需查询媒体库人物详情
+            people_key = f"emby:{self._EMBY_HOST}{people.get('Id')}"
+            if not self.__match_douban_actor(people, douban_actors):
+                cached, provider_ids = self._person_cache.get(people_key)
+                if cached and (not provider_ids.get("tmdb")
+                               or not any(self.__get_tmdb_person(provider_ids.get("tmdb")).values())):
+                    logger.debug(f"人物 {people.get('Name')} 未找到中文数据（缓存）")
+                    return None
+
             # 查询媒体库人物详情
             personinfo = __get_emby_iteminfo()
             if not personinfo:
@@ -416,16 +1055,16 @@ class EmbyMetaRefresh(_PluginBase):
             profile_path = None
 
             # 从TMDB信息中更新人物信息
-            person_tmdbid, person_imdbid = __get_peopleid(personinfo)
+            person_tmdbid, _ = __get_peopleid(personinfo)
+            self._person_cache.set(people_key, {"tmdb": person_tmdbid})
             if person_tmdbid:
-                person_detail = self.tmdbchain.person_detail(int(person_tmdbid))
-                if person_detail:
-                    cn_name = self.__get_chinese_name(person_detail)
+                person = self.__get_tmdb_person(person_tmdbid)
+                if person:
+                    cn_name = person.get("name")
                     # 图片优先从TMDB获取
-                    profile_path = person_detail.profile_path
+                    profile_path = person.get("profile")
                     if profile_path:
                         logger.debug(f"{people.get('Name')} 从TMDB获取到图片：{profile_path}")
-                        profile_path = f"https://{settings.TMDB_IMAGE_DOMAIN}/t/p/original{profile_path}"
                     if cn_name:
                         # 更新中文名
                         logger.debug(f"{people.get('Name')} 从TMDB获取到中文名：{cn_name}")
@@ -433,8 +1072,8 @@ class EmbyMetaRefresh(_PluginBase):
                         ret_people["Name"] = cn_name
                         updated_name = True
                         # 更新中文描述
-                        biography = person_detail.biography
-                        if biography and StringUtils.is_chinese(biography):
+                        biography = person.get("biography")
+                        if biography:
                             logger.debug(f"{people.get('Name')} 从TMDB获取到中文描述")
                             personinfo["Overview"] = biography
                             updated_overview = True
@@ -467,49 +1106,48 @@ class EmbyMetaRefresh(_PluginBase):
                                   or not updated_overview
                                   or not update_character):
                 # 从豆瓣演员中匹配中文名称、角色和简介
-                for douban_actor in douban_actors:
-                    if douban_actor.get("latin_name") == people.get("Name") \
-                            or douban_actor.get("name") == people.get("Name"):
-                        # 名称
-                        if not updated_name:
-                            logger.info(f"{people.get('Name')} 从豆瓣中获取到中文名：{douban_actor.get('name')}")
-                            personinfo["Name"] = douban_actor.get("name")
-                            ret_people["Name"] = douban_actor.get("name")
-                            updated_name = True
-                        # 描述
-                        if not updated_overview:
-                            if douban_actor.get("title"):
-                                logger.info(f"{people.get('Name')} 从豆瓣中获取到中文描述：{douban_actor.get('title')}")
-                                personinfo["Overview"] = douban_actor.get("title")
-                                updated_overview = True
-                        # 饰演角色
-                        if not update_character:
-                            if douban_actor.get("character"):
-                                # "饰 詹姆斯·邦德 James Bond 007"
-                                character = re.sub(r"饰\s+", "",
-                                                   douban_actor.get("character"))
-                                character = re.sub("演员", "",
-                                                   character)
-                                character = re.sub("voice", "配音",
-                                                   character)
-                                character = re.sub("Director", "导演",
-                                                   character)
-                                if character:
-                                    logger.debug(f"{people.get('Name')} 从豆瓣中获取到饰演角色：{character}")
-                                    ret_people["Role"] = character
-                                    update_character = True
-                        # 图片
-                        if not profile_path:
-                            avatar = douban_actor.get("avatar") or {}
-                            if avatar.get("large"):
-                                logger.info(f"{people.get('Name')} 从豆瓣中获取到图片：{avatar.get('large')}")
-                                profile_path = avatar.get("large")
-                        break
+                douban_actor = self.__match_douban_actor(people, douban_actors)
+                if douban_actor:
+                    # 名称
+                    if not updated_name:
+                        logger.info(f"{people.get('Name')} 从豆瓣中获取到中文名：{douban_actor.get('name')}")
+                        personinfo["Name"] = douban_actor.get("name")
+                        ret_people["Name"] = douban_actor.get("name")
+                        updated_name = True
+                    # 描述
+                    if not updated_overview:
+                        if douban_actor.get("title"):
+                            logger.info(f"{people.get('Name')} 从豆瓣中获取到中文描述：{douban_actor.get('title')}")
+                            personinfo["Overview"] = douban_actor.get("title")
+                            updated_overview = True
+                    # 饰演角色
+                    if not update_character:
+                        if douban_actor.get("character"):
+                            # "饰 詹姆斯·邦德 James Bond 007"
+                            character = re.sub(r"饰\s+", "",
+                                               douban_actor.get("character"))
+                            character = re.sub("演员", "",
+                                               character)
+                            character = re.sub("voice", "配音",
+                                               character)
+                            character = re.sub("Director", "导演",
+                                               character)
+                            if character:
+                                logger.debug(f"{people.get('Name')} 从豆瓣中获取到饰演角色：{character}")
+                                ret_people["Role"] = character
+                                update_character = True
+                    # 图片
+                    if not profile_path:
+                        avatar = douban_actor.get("avatar") or {}
+                        if avatar.get("large"):
+                            logger.info(f"{people.get('Name')} 从豆瓣中获取到图片：{avatar.get('large')}")
+                            profile_path = avatar.get("large")
 
             # 更新人物图片
             if profile_path:
                 logger.debug(f"更新人物 {people.get('Name')} 的图片：{profile_path}")
-                self.set_item_image(itemid=people.get("Id"), imageurl=profile_path, emby=emby)
+                self._image_pipeline.submit(server=self._EMBY_HOST, emby=emby, person_id=people.get("Id"),
+                                            image_url=profile_path, image_tag=people.get("PrimaryImageTag"))
 
             # 锁定人物信息
             if updated_name:
@@ -561,61 +1199,6 @@ class EmbyMetaRefresh(_PluginBase):
 
         return __set_emby_iteminfo()
 
-    @staticmethod
-    @retry(RequestException, logger=logger)
-    def set_item_image(itemid: str, imageurl: str, emby):
-        """
-        更新媒体项图片
-        """
-
-        def __download_image():
-            """
-            下载图片
-            """
-            try:
-                if "doubanio.com" in imageurl:
-                    r = RequestUtils(headers={
-                        'Referer': "https://movie.douban.com/"
-                    }, ua=settings.USER_AGENT).get_res(url=imageurl, raise_exception=True)
-                else:
-                    r = RequestUtils(proxies=settings.PROXY).get_res(url=imageurl, raise_exception=True)
-                if r:
-                    return base64.b64encode(r.content).decode()
-                else:
-                    logger.warn(f"{imageurl} 图片下载失败，请检查网络连通性")
-            except Exception as err:
-                logger.error(f"下载图片失败：{str(err)}")
-            return None
-
-        def __set_emby_item_image(_base64: str):
-            """
-            更新Emby媒体项图片
-            """
-            try:
-                url = f'[HOST]emby/Items/{itemid}/Images/Primary?api_key=[APIKEY]'
-                res = emby.post_data(
-                    url=url,
-                    data=_base64,
-                    headers={
-                        "Content-Type": "image/png"
-                    }
-                )
-                if res and res.status_code in [200, 204]:
-                    return True
-                else:
-                    logger.error(f"更新Emby媒体项图片失败，错误码：{res.status_code}")
-                    return False
-            except Exception as result:
-                logger.error(f"更新Emby媒体项图片失败：{result}")
-            return False
-
-        # 下载图片获取base64
-        image_base64 = __download_image()
-        if image_base64:
-            return __set_emby_item_image(image_base64)
-
-        return None
-
     @staticmethod
     def __get_chinese_name(personinfo: schemas.MediaPerson) -> str:
         """
@@ -632,10 +1215,49 @@ class EmbyMetaRefresh(_PluginBase):
             logger.error(f"获取人物中文名失败：{err}")
         return ""
 
+    def __get_tmdb_person(self, tmdbid: str) -> dict:
+        """
+        获取TMDB人物的中文名、中文简介和图片，优先读取缓存
+        """
+        cached, person = self._person_cache.get(f"tmdb:{tmdbid}")
+        if cached:
+            return person
+        person = {}
+        person_detail = self.tmdbchain.person_detail(int(tmdbid))
+        if person_detail:
+            cn_name = self.__get_chinese_name(person_detail)
+            biography = person_detail.biography
+            person = {
+                "name": cn_name,
+                "biography": biography if cn_name and biography and StringUtils.is_chinese(biography) else "",
+                "profile": f"https://{settings.TMDB_IMAGE_DOMAIN}/t/p/original{person_detail.profile_path}"
+                if person_detail.profile_path else "",
+            }
+            if not any(person.values()):
+                person = {}
+        self._person_cache.set(f"tmdb:{tmdbid}", person)
+        return person
+
+    @staticmethod
+    def __match_douban_actor(people: dict, douban_actors: Optional[list]) -> Optional[dict]:
+        """
+        按名称匹配豆瓣演职人员
+        """
+        for douban_actor in douban_actors or []:
+            if douban_actor.get("latin_name") == people.get("Name") \
+                    or douban_actor.get("name") == people.get("Name"):
+                return douban_actor
+        return None
+
     def __get_douban_actors(self, title, imdb_id, type, year, season: int = None) -> List[dict]:
         """
-        获取豆瓣演员信息
+        获取豆瓣演员信息，优先读取缓存，未命中时才限速查询豆瓣
         """
+        cache_key = f"{type.value if isinstance(type, MediaType) else type}:{imdb_id or title}:{year}:{season or ''}"
+        cached, actors = self._douban_cache.get(cache_key)
+        if cached:
+            logger.debug(f"从缓存获取豆瓣演员信息：{title} {year}")
+            return actors
         # 随机休眠 3-10 秒
         sleep_time = 3 + int(time.time()) % 7
         logger.debug(f"随机休眠 {sleep_time}秒 ...")
@@ -647,12 +1269,14 @@ class EmbyMetaRefresh(_PluginBase):
                                                  year=year,
                                                  season=season)
         # 豆瓣演员
+        actors = []
         if doubaninfo:
             doubanitem = self.chain.douban_info(doubaninfo.get("id")) or {}
-            return (doubanitem.get("actors") or []) + (doubanitem.get("directors") or [])
+            actors = (doubanitem.get("actors") or []) + (doubanitem.get("directors") or [])
         else:
             logger.info(f"未找到豆瓣信息：{title} {year}")
-        return []
+        self._douban_cache.set(cache_key, actors)
+        return actors
 
     @staticmethod
     def __need_trans_actor(item):
@@ -667,7 +1291,7 @@ class EmbyMetaRefresh(_PluginBase):
         return False
 
     def __get_item_info(self, item_id):
-        res = RequestUtils().get_res(
+        res = EmbyClient.get(
             f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items/{item_id}?api_key={self._EMBY_APIKEY}")
         if res and res.status_code == 200:
             return res.json()
@@ -690,104 +1314,158 @@ class EmbyMetaRefresh(_PluginBase):
             self.post_message(channel=event.event_data.get("channel"),
                               title="刷新Emby元数据完成！", userid=event.event_data.get("user"))
 
-    def __refresh_emby(self, transferinfo, emby):
+    def __plan_history(self, planner: RefreshPlanner, transferhistorys: list, emby) -> List[dict]:
         """
-        刷新emby
+        入库记录加入刷新计划，同一媒体、同一季只查询一次Emby，返回需要刮削演员中文名的媒体
         """
-        try:
-            if transferinfo.type == "电影":
-                movies = emby.get_movies(title=transferinfo.title, year=transferinfo.year)
-                if not movies:
-                    logger.error(f"Emby中没有找到{transferinfo.title} ({transferinfo.year})")
-                    return
-                for movie in movies:
-                    self.__refresh_emby_library_by_id(item_id=movie.item_id)
-                    logger.info(f"已通知刷新Emby电影：{movie.title} ({movie.year}) item_id:{movie.item_id}")
-                    if self._actor_chi:
-                        self.__update_people_chi(item_id=movie.item_id, title=movie.title, type=MediaType.MOVIE)
-            else:
-                item_id = self.__get_emby_series_id_by_name(name=transferinfo.title, year=transferinfo.year)
-                if not item_id or item_id is None:
-                    logger.error(f"Emby中没有找到{transferinfo.title} ({transferinfo.year})")
-                    return
-
-                # 验证tmdbid是否相同
-                item_info = emby.get_iteminfo(item_id)
-                if item_info:
-                    if transferinfo.tmdbid and item_info.tmdbid:
-                        if str(transferinfo.tmdbid) != str(item_info.tmdbid):
-                            logger.error(f"Emby中{transferinfo.title} ({transferinfo.year})的tmdbId与入库记录不一致")
-                            return
-
-                # 查询集的item_id
+        movies = set()
+        series_ids = {}
+        season_episodes = {}
+        actor_medias = {}
+        for transferinfo in transferhistorys:
+            try:
+                media_key = (transferinfo.type, transferinfo.title, transferinfo.year)
+                if transferinfo.type == "电影":
+                    if media_key in movies:
+                        continue
+                    movies.add(media_key)
+                    emby_movies = emby.get_movies(title=transferinfo.title, year=transferinfo.year)
+                    if not emby_movies:
+                        logger.error(f"Emby中没有找到{transferinfo.title} ({transferinfo.year})")
+                        continue
+                    for movie in emby_movies:
+                        planner.add_item(item_id=movie.item_id, name=f"{movie.title} ({movie.year})")
+                        actor_medias[movie.item_id] = {"item_id": movie.item_id, "title": movie.title,
+                                                       "type": MediaType.MOVIE, "emby": emby}
+                    continue
+
+                if media_key not in series_ids:
+                    series_ids[media_key] = self.__match_series(transferinfo, emby)
+                item_id = series_ids[media_key]
+                if not item_id:
+                    continue
+
+                # 一次获取整季的集信息
                 season = int(transferinfo.seasons.replace("S", ""))
-                episode = int(transferinfo.episodes.replace("E", "")) if "-" not in transferinfo.episodes else int(
-                    transferinfo.episodes.replace("E", "").split("-")[0])
-                episode_item_id = self.__get_emby_episode_item_id(item_id=item_id, season=season, episode=episode)
-                if not episode_item_id or episode_item_id is None:
-                    logger.error(
-                        f"Emby中没有找到{transferinfo.title} ({transferinfo.year}) {transferinfo.seasons}{transferinfo.episodes}")
-                    return
+                if (item_id, season) not in season_episodes:
+                    season_episodes[(item_id, season)] = {
+                        episode_item.get("IndexNumber"): episode_item
+                        for episode_item in self.__get_emby_episodes(item_id=item_id, season=season)
+                        if episode_item.get("ParentIndexNumber") == season and episode_item.get("IndexNumber")
+                    }
+                episode_items = season_episodes[(item_id, season)]
+                episodes = self.__parse_episodes(transferinfo.episodes) or list(episode_items.keys())
+                for episode in episodes:
+                    episode_item = episode_items.get(episode)
+                    if not episode_item:
+                        logger.error(
+                            f"Emby中没有找到{transferinfo.title} ({transferinfo.year}) {transferinfo.seasons}E{episode:02d}")
+                        continue
+                    planner.add_episode(series_id=item_id, series_name=f"{transferinfo.title} ({transferinfo.year})",
+                                        season=season, season_id=episode_item.get("SeasonId"),
+                                        item_id=episode_item.get("Id"),
+                                        name=f"{transferinfo.title} ({transferinfo.year}) S{season:02d}E{episode:02d}",
+                                        season_total=len(episode_items))
+                    actor_medias[f"{item_id}-{season}"] = {"item_id": item_id, "title": transferinfo.title,
+                                                           "type": MediaType.TV, "season": season, "emby": emby}
+            except Exception as e:
+                logger.error(f"处理入库记录 {transferinfo.title} 出错：{e}")
+        return list(actor_medias.values())
+
+    def __match_series(self, transferinfo, emby) -> Optional[str]:
+        """
+        查询入库记录对应的Emby剧集Id，并验证tmdbid
+        """
+        item_id = self.__get_emby_series_id_by_name(name=transferinfo.title, year=transferinfo.year)
+        if not item_id:
+            logger.error(f"Emby中没有找到{transferinfo.title} ({transferinfo.year})")
+            return None
+        # 验证tmdbid是否相同
+        item_info = emby.get_iteminfo(item_id)
+        if item_info and transferinfo.tmdbid and item_info.tmdbid \
+                and str(transferinfo.tmdbid) != str(item_info.tmdbid):
+            logger.error(f"Emby中{transferinfo.title} ({transferinfo.year})的tmdbId与入库记录不一致")
+            return None
+        return item_id
 
-                self.__refresh_emby_library_by_id(item_id=episode_item_id)
-                logger.info(
-                    f"已通知刷新Emby电视剧：{transferinfo.title} ({transferinfo.year}) {transferinfo.seasons}{transferinfo.episodes} item_id:{episode_item_id}")
-                if self._actor_chi:
-                    self.__update_people_chi(item_id=item_id, title=transferinfo.title, type=MediaType.TV,
-                                             season=season)
-        except Exception as e:
-            logger.error(f"刷新Emby出错：{e}")
+    @staticmethod
+    def __parse_episodes(episodes: str) -> List[int]:
+        """
+        解析入库记录中的集数，如 E01、E01-E03
+        """
+        parts = [int(part) for part in str(episodes or "").replace("E", "").split("-") if part.strip().isdigit()]
+        if not parts:
+            return []
+        return list(range(parts[0], parts[-1] + 1))
 
-    def __get_emby_episode_item_id(self, item_id: str, season: int, episode: int) -> Optional[str]:
+    def __dispatch(self, planner: RefreshPlanner):
         """
-        根据剧集信息查询Emby中集的item_id
+        并发执行刷新计划，Emby繁忙（429/5xx）时自适应加大请求间隔
+        """
+        targets = planner.targets()
+        counts = {}
+        for target_type, _, _ in targets:
+            counts[target_type] = counts.get(target_type, 0) + 1
+        logger.info(f"刷新计划：{planner.size} 个媒体合并为 {len(targets)} 个刷新目标"
+                    + (f"（{'，'.join(f'{RefreshPlanner.TYPE_NAMES.get(k)} {v} 个' for k, v in counts.items())}）"
+                       if counts else ""))
+        if not targets:
+            return
+        # Emby刷新接口入队后立即返回，响应耗时不反映负载，只在Emby繁忙或无法连接时加大间隔，最大不超过设置的刷新间隔
+        throttle = AdaptiveThrottle(max_interval=max(float(self._interval or 0), 1.0))
+
+        def __refresh(target: Tuple[str, str, str]) -> bool:
+            if self._event.is_set():
+                return False
+            target_type, item_id, name = target
+            throttle.wait()
+            status_code = self.__refresh_emby_library_by_id(item_id=item_id)
+            throttle.record(0, success=bool(status_code) and status_code != 429 and status_code < 500)
+            flag = bool(status_code) and status_code < 400
+            logger.info(f"已通知刷新Emby{RefreshPlanner.TYPE_NAMES.get(target_type)}：{name} item_id:{item_id} {flag}")
+            return flag
+
+        with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+            results = list(executor.map(__refresh, targets))
+        logger.info(f"刷新计划执行完成，成功 {sum(results)} 个，失败 {len(results) - sum(results)} 个")
+
+    def __get_emby_episodes(self, item_id: str, season: int) -> List[dict]:
+        """
+        查询Emby中剧集一季的全部集
         """
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return None
+            return []
         req_url = "%semby/Shows/%s/Episodes?Season=%s&IsMissing=false&api_key=%s" % (
             self._EMBY_HOST, item_id, season, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res_json:
+            with EmbyClient.get(req_url) as res_json:
                 if res_json:
-                    tv_item = res_json.json()
-                    res_items = tv_item.get("Items")
-                    for res_item in res_items:
-                        season_index = res_item.get("ParentIndexNumber")
-                        if not season_index:
-                            continue
-                        if season and season != season_index:
-                            continue
-                        episode_index = res_item.get("IndexNumber")
-                        if not episode_index:
-                            continue
-                        if episode and episode != episode_index:
-                            continue
-                        episode_item_id = res_item.get("Id")
-                        return episode_item_id
+                    return res_json.json().get("Items") or []
         except Exception as e:
             logger.error(f"连接Shows/Id/Episodes出错：" + str(e))
-            return None
-        return None
+        return []
 
-    def __refresh_emby_library_by_id(self, item_id: str) -> bool:
+    def __refresh_emby_library_by_id(self, item_id: str) -> Optional[int]:
         """
-        通知Emby刷新一个项目的媒体库
+        通知Emby刷新一个项目的媒体库，返回响应状态码，无法连接时返回None
         """
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return False
+            return None
         req_url = "%semby/Items/%s/Refresh?Recursive=true&MetadataRefreshMode=FullRefresh" \
                   "&ImageRefreshMode=FullRefresh&ReplaceAllMetadata=%s&ReplaceAllImages=%s&api_key=%s" % (
                       self._EMBY_HOST, item_id, self._ReplaceAllMetadata, self._ReplaceAllImages, self._EMBY_APIKEY)
         try:
-            with RequestUtils().post_res(req_url) as res:
-                if res:
-                    return True
-                else:
-                    logger.info(f"刷新媒体库对象 {item_id} 失败，无法连接Emby！")
+            res = EmbyClient.post(req_url)
+            if res is None:
+                logger.info(f"刷新媒体库对象 {item_id} 失败，无法连接Emby！")
+                return None
+            with res:
+                if not res:
+                    logger.info(f"刷新媒体库对象 {item_id} 失败，错误码：{res.status_code}")
+                return res.status_code
         except Exception as e:
             logger.error(f"连接Items/Id/Refresh出错：" + str(e))
-            return False
-        return False
+            return None
 
     def __get_latest(self, limit) -> list:
         """
@@ -798,7 +1476,7 @@ class EmbyMetaRefresh(_PluginBase):
         req_url = "%semby/Users/%s/Items?Limit=%s&api_key=%s&SortBy=DateCreated,SortName&SortOrder=Descending&IncludeItemTypes=Episode,Movie&Recursive=true&Fields=DateCreated,Overview" % (
             self._EMBY_HOST, self._EMBY_USER, limit, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     return res.json().get("Items")
                 else:
@@ -828,7 +1506,7 @@ class EmbyMetaRefresh(_PluginBase):
                    "&api_key=%s") % (
                       self._EMBY_HOST, name, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res:
                     res_items = res.json().get("Items")
                     if res_items:
@@ -1051,8 +1729,25 @@ class EmbyMetaRefresh(_PluginBase):
                                         'component': 'VTextField',
                                         'props': {
                                             'model': 'interval',
-                                            'label': '刷新间隔(秒)',
-                                            'placeholder': '留空默认0秒'
+                                            'label': '最大刷新间隔(秒)',
+                                            'placeholder': '按响应耗时自动调整，留空默认5秒'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '并发数',
+                                            'placeholder': '留空默认2'
                                         }
                                     }
                                 ]
@@ -1095,7 +1790,7 @@ class EmbyMetaRefresh(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '周期请求媒体服务器元数据刷新接口。注：只支持Emby。'
+                                            'text': '周期请求媒体服务器元数据刷新接口，同一季多集、同一剧集多季合并为一次刷新。注：只支持Emby。'
                                         }
                                     }
                                 ]
@@ -1116,6 +1811,7 @@ class EmbyMetaRefresh(_PluginBase):
             "mediaservers": [],
             "num": 5,
             "interval": 0,
+            "concurrency": 2,
         }
 
     def get_page(self) -> List[dict]:
@@ -1125,6 +1821,11 @@ class EmbyMetaRefresh(_PluginBase):
         """
         退出插件
         """
+        if self._image_pipeline:
+            self._image_pipeline.shutdown()
+        for cache in (self._person_cache, self._douban_cache, self._image_cache):
+            if cache:
+                cache.save()
         try:
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
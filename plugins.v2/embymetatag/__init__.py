@@ -1,7 +1,16 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional, Any, List, Dict, Tuple
+from urllib.parse import urlencode, urlparse
 
 import pytz
+import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -12,7 +21,327 @@ from app.log import logger
 from app.plugins import _PluginBase
 from app.modules.emby import Emby
 from app.schemas.types import EventType
-from app.utils.http import RequestUtils
+
+
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class LibrarySnapshot:
+    """
+    媒体库快照，记录媒体Etag及上次运行游标，增量获取上次运行后变化的媒体
+    """
+    # 超过该天数强制全量比对，兜底服务端未更新保存时间的变化
+    FULL_SCAN_DAYS = 7
+    # 游标回退时间，兼容服务器时间偏差，重复部分由Etag过滤
+    CURSOR_OVERLAP = timedelta(minutes=10)
+    PAGE_SIZE = 500
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._data = self.__load()
+
+    def __load(self) -> dict:
+        try:
+            if self._path.exists():
+                return json.loads(self._path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.error(f"读取媒体库快照失败：{str(e)}")
+        return {}
+
+    def __save(self):
+        tmp_path = self._path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self._data, ensure_ascii=False), encoding="utf-8")
+        tmp_path.replace(self._path)
+
+    def changed_items(self, host: str, user: str, apikey: str, scope: str, parent_id,
+                      params: dict = None, signature: str = None) -> Tuple[Optional[list], dict]:
+        """
+        获取上次提交后变化的媒体，返回 (变化媒体列表, 待提交快照)，获取失败时返回 (None, {})
+        :param scope: 快照范围，如 服务器:媒体库Id
+        :param params: 额外的Items查询参数，如 IncludeItemTypes、Fields
+        :param signature: 插件配置签名，变化时视为全部媒体有变化
+        """
+        with self._lock:
+            state = self._data.get(scope) or {}
+        etags = state.get("etags") or {}
+        now = datetime.utcnow()
+        full_scan_time = state.get("full_scan_time")
+        signature_changed = state.get("signature") != signature
+        full_scan = (not state.get("cursor")
+                     or signature_changed
+                     or not full_scan_time
+                     or now - datetime.strptime(full_scan_time, "%Y-%m-%dT%H:%M:%SZ")
+                     > timedelta(days=self.FULL_SCAN_DAYS))
+
+        query = {
+            "ParentId": parent_id,
+            "Recursive": "true",
+        }
+        query.update(params or {})
+        query["Fields"] = ",".join(filter(None, ["Etag", "DateModified", query.get("Fields")]))
+        if not full_scan:
+            query["MinDateLastSaved"] = state.get("cursor")
+
+        items = self.__list_items(host, user, apikey, query)
+        if items is None:
+            return None, {}
+
+        changed = []
+        new_etags = {} if full_scan else dict(etags)
+        for item in items:
+            etag = item.get("Etag") or item.get("DateModified") or ""
+            new_etags[item.get("Id")] = etag
+            if signature_changed or etags.get(item.get("Id")) != etag:
+                changed.append(item)
+        logger.info(f"媒体库快照 {scope} {'全量' if full_scan else '增量'}获取 {len(items)} 个媒体，"
+                    f"变化 {len(changed)} 个")
+        return changed, {
+            "scope": scope,
+            "cursor": (now - self.CURSOR_OVERLAP).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "full_scan_time": now.strftime("%Y-%m-%dT%H:%M:%SZ") if full_scan else full_scan_time,
+            "signature": signature,
+            "etags": new_etags,
+        }
+
+    def commit(self, pending: dict):
+        """
+        处理完成后提交快照，下次运行从此处增量获取
+        """
+        if not pending:
+            return
+        pending = dict(pending)
+        scope = pending.pop("scope")
+        with self._lock:
+            self._data[scope] = pending
+            try:
+                self.__save()
+            except Exception as e:
+                logger.error(f"保存媒体库快照失败：{str(e)}")
+
+    def __list_items(self, host: str, user: str, apikey: str, query: dict) -> Optional[list]:
+        """
+        分页获取媒体列表
+        """
+        items = []
+        start_index = 0
+        while True:
+            page_query = dict(query, StartIndex=start_index, Limit=self.PAGE_SIZE, api_key=apikey)
+            req_url = f"{host}emby/Users/{user}/Items?{urlencode(page_query)}"
+            try:
+                with EmbyClient.get(req_url) as res:
+                    if not res or res.status_code != 200:
+                        logger.error(f"获取媒体库快照失败，无法连接Emby！")
+                        return None
+                    result = res.json()
+            except Exception as e:
+                logger.error(f"连接媒体库Items出错：" + str(e))
+                return None
+            page_items = result.get("Items") or []
+            items.extend(page_items)
+            start_index += len(page_items)
+            if not page_items or start_index >= (result.get("TotalRecordCount") or 0):
+                return items
 
 
 class EmbyMetaTag(_PluginBase):
@@ -23,7 +352,7 @@ class EmbyMetaTag(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/tag.png"
     # 插件版本
-    plugin_version = "1.3"
+    plugin_version = "1.6.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -42,12 +371,14 @@ class EmbyMetaTag(_PluginBase):
     _tag_confs = None
     _name_tag_confs = None
     _mediaservers = None
+    _concurrency = 4
 
     mediaserver_helper = None
     _EMBY_HOST = None
     _EMBY_USER = None
     _EMBY_APIKEY = None
     _scheduler: Optional[BackgroundScheduler] = None
+    _snapshot: Optional[LibrarySnapshot] = None
 
     _tags = {}
     _media_tags = {}
@@ -57,6 +388,7 @@ class EmbyMetaTag(_PluginBase):
         # 停止现有任务
         self.stop_service()
         self.mediaserver_helper = MediaServerHelper()
+        self._snapshot = LibrarySnapshot(self.get_data_path() / "library_snapshot.json")
 
         if config:
             self._enabled = config.get("enabled")
@@ -65,6 +397,9 @@ class EmbyMetaTag(_PluginBase):
             self._tag_confs = config.get("tag_confs")
             self._name_tag_confs = config.get("name_tag_confs")
             self._mediaservers = config.get("mediaservers") or []
+            concurrency = str(config.get("concurrency") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._concurrency = int(concurrency) if concurrency.isdigit() and int(concurrency) > 0 else 4
 
             _tags = {}
             if self._tag_confs:
@@ -138,6 +473,7 @@ class EmbyMetaTag(_PluginBase):
                 "tag_confs": self._tag_confs,
                 "name_tag_confs": self._name_tag_confs,
                 "mediaservers": self._mediaservers,
+                "concurrency": self._concurrency,
             }
         )
 
@@ -159,11 +495,8 @@ class EmbyMetaTag(_PluginBase):
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
+            EmbyClient.of(self._EMBY_HOST).set_concurrency(self._concurrency)
 
             # 媒体库标签
             if self._tags and len(self._tags.keys()) > 0:
@@ -180,61 +513,53 @@ class EmbyMetaTag(_PluginBase):
                     if not library_tags:
                         continue
 
-                    # 获取媒体库媒体
-                    library_items = emby_server.instance.get_items(library.id)
-                    if not library_items:
+                    # 获取媒体库媒体及标签，只处理上次运行后有变化的媒体，标签配置变化时全部处理
+                    start_time = time.time()
+                    library_items, pending_snapshot = self._snapshot.changed_items(
+                        host=self._EMBY_HOST, user=self._EMBY_USER, apikey=self._EMBY_APIKEY,
+                        scope=f"{emby_name}:{library.id}", parent_id=library.id,
+                        params={"IncludeItemTypes": "Movie,Series", "Fields": "TagItems"},
+                        signature=",".join(library_tags))
+                    if library_items is None:
                         continue
+                    fetch_time = time.time() - start_time
+
+                    # 本地计算缺少的标签
+                    add_items = self.__missing_tags(library_items, library_tags)
+                    success_cnt = self.__add_tags(add_items, library.name)
+                    logger.info(f"{library.name} 媒体标签处理完成：扫描 {len(library_items)} 个，"
+                                f"跳过 {len(library_items) - len(add_items)} 个，添加成功 {success_cnt} 个，"
+                                f"失败 {len(add_items) - success_cnt} 个，获取耗时 {round(fetch_time, 2)} 秒，"
+                                f"添加耗时 {round(time.time() - start_time - fetch_time, 2)} 秒")
 
-                    for library_item in library_items:
-                        if not library_item:
-                            continue
-                        # 获取item的tag
-                        item_tags = self.__get_item_tags(library_item.item_id) or []
-
-                        # 获取缺少的tag
-                        add_tags = []
-                        for library_tag in library_tags:
-                            if not item_tags or library_tag not in item_tags:
-                                add_tags.append(library_tag)
-
-                        # 添加标签
-                        if add_tags:
-                            tags = [{"Name": str(add_tag)} for add_tag in add_tags]
-                            tags = {"Tags": tags}
-                            add_flag = self.__add_tag(library_item.item_id, tags)
-                            logger.info(f"{library.name} 添加标签成功：{library_item.title} {tags} {add_flag}")
+                    # 有添加失败的媒体时不推进快照，下次重新处理
+                    if success_cnt == len(add_items):
+                        self._snapshot.commit(pending_snapshot)
 
             # 特殊媒体名标签
             if self._media_tags and len(self._media_tags.keys()) > 0:
+                start_time = time.time()
+                scanned = 0
+                add_items = []
                 for media_name, media_tags in self._media_tags.items():
 
                     match_medias = []
                     # 根据Series/Movie搜索媒体
                     for media_type in self._media_type.get(media_name):
-                        match_medias += self.__get_medias_by_name(media_name, media_type)
+                        match_medias += self.__get_medias_by_name(media_name, media_type) or []
 
                     # 遍历媒体 补充缺失tag
-                    for media in match_medias:
-                        if not media:
-                            continue
-
-                        # 获取item的tag
-                        item_tags = self.__get_item_tags(media.get("Id")) or []
-
-                        # 获取缺少的tag
-                        add_tags = []
-                        for media_tag in media_tags:
-                            if not item_tags or media_tag not in item_tags:
-                                add_tags.append(media_tag)
-
-                        # 添加标签
-                        if add_tags:
-                            tags = [{"Name": str(add_tag)} for add_tag in add_tags]
-                            tags = {"Tags": tags}
-                            add_flag = self.__add_tag(media.get("Id"), tags)
-                            logger.info(f"特殊媒体添加标签成功：{media.get('Name')} {tags} {add_flag}")
+                    match_medias = [media for media in match_medias if media]
+                    scanned += len(match_medias)
+                    add_items += self.__missing_tags(match_medias, media_tags)
+
+                success_cnt = self.__add_tags(add_items, "特殊媒体")
+                logger.info(f"特殊媒体标签处理完成：扫描 {scanned} 个，跳过 {scanned - len(add_items)} 个，"
+                            f"添加成功 {success_cnt} 个，失败 {len(add_items) - success_cnt} 个，"
+                            f"耗时 {round(time.time() - start_time, 2)} 秒")
 
             logger.info(f"{emby_name} 媒体标签任务完成")
+            EmbyClient.report()
 
     @eventmanager.register(EventType.PluginAction)
     def remote_sync(self, event: Event):
@@ -253,34 +578,46 @@ class EmbyMetaTag(_PluginBase):
             self.post_message(channel=event.event_data.get("channel"),
                               title="添加媒体标签完成！", userid=event.event_data.get("user"))
 
+    @staticmethod
+    def __missing_tags(items: List[dict], tags: List[str]) -> List[Tuple[dict, List[str]]]:
+        """
+        根据媒体已有标签计算缺少的标签
+        """
+        add_items = []
+        for item in items:
+            item_tags = {tag.get("Name") for tag in item.get("TagItems") or []}
+            add_tags = [tag for tag in tags if tag not in item_tags]
+            if add_tags:
+                add_items.append((item, add_tags))
+        return add_items
+
+    def __add_tags(self, add_items: List[Tuple[dict, List[str]]], source: str) -> int:
+        """
+        并发添加标签，返回成功数量
+        """
+        if not add_items:
+            return 0
+
+        def add(item: dict, add_tags: List[str]) -> bool:
+            tags = {"Tags": [{"Name": str(add_tag)} for add_tag in add_tags]}
+            add_flag = self.__add_tag(item.get("Id"), tags)
+            logger.info(f"{source} 添加标签{'成功' if add_flag else '失败'}：{item.get('Name')} {tags}")
+            return add_flag
+
+        with ThreadPoolExecutor(max_workers=max(1, self._concurrency)) as executor:
+            results = executor.map(lambda add_item: add(*add_item), add_items)
+            return sum(1 for result in results if result)
+
     def __add_tag(self, itemid: str, tags: dict):
         req_url = "%semby/Items/%s/Tags/Add?api_key=%s" % (self._EMBY_HOST, itemid, self._EMBY_APIKEY)
         try:
-            with RequestUtils(content_type="application/json").post_res(url=req_url, json=tags) as res:
+            with EmbyClient.post(req_url, json=tags) as res:
                 if res and res.status_code == 204:
                     return True
         except Exception as e:
             logger.error(f"连接Items/Id/Tags/Add出错：" + str(e))
         return False
 
-    def __get_item_tags(self, itemid: str):
-        """
-        获取单个项目详情
-        """
-        if not itemid:
-            return None
-        if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return None
-        req_url = "%semby/Users/%s/Items/%s?api_key=%s" % (self._EMBY_HOST, self._EMBY_USER, itemid, self._EMBY_APIKEY)
-        try:
-            with RequestUtils().get_res(req_url) as res:
-                if res and res.status_code == 200:
-                    item = res.json()
-                    return [tag.get('Name') for tag in item.get("TagItems")]
-        except Exception as e:
-            logger.error(f"连接Items/Id出错：" + str(e))
-        return []
-
     def __get_medias_by_name(self, media_name: str, media_type: str):
         """
         搜索媒体名
@@ -289,10 +626,10 @@ class EmbyMetaTag(_PluginBase):
             return None
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
             return None
-        req_url = ("%semby/Users/%s/Items?IncludeItemTypes=%s&Recursive=true&SearchTerm=%s&api_key=%s") % (
+        req_url = ("%semby/Users/%s/Items?IncludeItemTypes=%s&Recursive=true&SearchTerm=%s&Fields=TagItems&api_key=%s") % (
             self._EMBY_HOST, self._EMBY_USER, media_type, media_name, self._EMBY_APIKEY)
         try:
-            with RequestUtils().get_res(req_url) as res:
+            with EmbyClient.get(req_url) as res:
                 if res and res.status_code == 200:
                     item = res.json()
                     return item.get("Items")
@@ -367,6 +704,7 @@ class EmbyMetaTag(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
+                                    'md': 6
                                 },
                                 'content': [
                                     {
@@ -378,6 +716,23 @@ class EmbyMetaTag(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'concurrency',
+                                            'label': '并发数',
+                                            'placeholder': '同时添加标签的媒体数量，默认4'
+                                        }
+                                    }
+                                ]
                             }
                         ],
                     },
@@ -481,6 +836,7 @@ class EmbyMetaTag(_PluginBase):
             "tag_confs": "",
             "name_tag_confs": "",
             "mediaservers": [],
+            "concurrency": 4,
         }
 
     def get_page(self) -> List[dict]:
@@ -1,4 +1,9 @@
 import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
 
 from app.core.config import settings
 from app.helper.mediaserver import MediaServerHelper
@@ -10,8 +15,11 @@ from apscheduler.triggers.cron import CronTrigger
 
 from app.schemas import NotificationType
 from pathlib import Path
+from urllib.parse import urlparse
 
 import random
+import requests
+from requests.adapters import HTTPAdapter
 from io import BytesIO
 from PIL import Image
 from PIL import ImageFont
@@ -20,12 +28,366 @@ import pytz
 from cacheout import Cache
 from datetime import datetime, timedelta
 
-from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 cache = Cache()
 
 
+class EmbyClient:
+    """
+    Emby请求客户端
+    每个服务器复用一个保持连接的会话，限制同时请求数，网络错误和网关错误时退避重试，并按接口统计耗时和错误数
+    """
+    # 默认同时请求数
+    CONCURRENCY = 8
+    # 最大重试次数
+    RETRIES = 3
+    # 重试退避基数（秒）
+    BACKOFF = 0.5
+    # 请求超时（秒）
+    TIMEOUT = 20
+    # 需要重试的状态码
+    RETRY_STATUS = (429, 502, 503, 504)
+
+    _clients: Dict[str, "EmbyClient"] = {}
+    _clients_lock = threading.Lock()
+
+    def __init__(self, origin: str):
+        self.origin = origin
+        self._session = requests.Session()
+        # 与RequestUtils一致，不校验证书，兼容自签名证书的服务器
+        self._session.verify = False
+        self._session.headers.update({"User-Agent": settings.USER_AGENT})
+        self._pool_size = 0
+        self._limit = self.CONCURRENCY
+        self._active = 0
+        self._cond = threading.Condition()
+        self._metrics: Dict[str, dict] = {}
+        self._metrics_lock = threading.Lock()
+        self.__mount(self.CONCURRENCY)
+
+    @staticmethod
+    def normalize_host(host: str) -> str:
+        """
+        规范服务器地址，补全协议和结尾的/
+        """
+        if not host.endswith("/"):
+            host += "/"
+        if not host.startswith("http"):
+            host = "http://" + host
+        return host
+
+    @classmethod
+    def of(cls, host: str, concurrency: int = None) -> "EmbyClient":
+        """
+        获取服务器对应的客户端，host可以是服务器地址或完整请求地址
+        """
+        parsed = urlparse(cls.normalize_host(host))
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with cls._clients_lock:
+            client = cls._clients.get(origin)
+            if not client:
+                client = cls(origin)
+                cls._clients[origin] = client
+        if concurrency:
+            client.set_concurrency(concurrency)
+        return client
+
+    @classmethod
+    def get(cls, url: str, params: dict = None, headers: dict = None,
+            raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        GET请求，失败返回None
+        """
+        return cls.of(url).request("GET", url, params=params, headers=headers, raise_exception=raise_exception)
+
+    @classmethod
+    def post(cls, url: str, data: Any = None, json: Any = None, params: dict = None, headers: dict = None,
+             raise_exception: bool = False) -> Optional[requests.Response]:
+        """
+        POST请求，失败返回None
+        """
+        return cls.of(url).request("POST", url, data=data, json=json, params=params, headers=headers,
+                                   raise_exception=raise_exception)
+
+    @classmethod
+    def report(cls, reset: bool = True, top: int = 10):
+        """
+        输出各服务器的接口请求统计
+        """
+        with cls._clients_lock:
+            clients = list(cls._clients.values())
+        for client in clients:
+            metrics = client.metrics(reset=reset)
+            if not metrics:
+                continue
+            count = sum(metric.get("count") for metric in metrics)
+            errors = sum(metric.get("errors") for metric in metrics)
+            logger.info(f"Emby {client.origin} 共请求 {count} 次，失败 {errors} 次，耗时最多的接口：")
+            for metric in metrics[:top]:
+                logger.info(f"  {metric.get('endpoint')} 次数 {metric.get('count')} 失败 {metric.get('errors')} "
+                            f"重试 {metric.get('retries')} 平均 {metric.get('avg_ms')}ms 最大 {metric.get('max_ms')}ms")
+
+    def set_concurrency(self, concurrency: int):
+        """
+        设置同时请求数
+        """
+        concurrency = max(1, int(concurrency))
+        with self._cond:
+            self._limit = concurrency
+            if concurrency > self._pool_size:
+                self.__mount(concurrency)
+            self._cond.notify_all()
+
+    def request(self, method: str, url: str, raise_exception: bool = False,
+                **kwargs) -> Optional[requests.Response]:
+        """
+        发送请求，连接失败和网关错误按指数退避重试
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        endpoint = self.__endpoint(method, url)
+        start_time = time.monotonic()
+        retries = 0
+        while True:
+            self.__acquire()
+            try:
+                try:
+                    res = self._session.request(method, url, **kwargs)
+                    if res.status_code not in self.RETRY_STATUS or retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=res.status_code >= 400)
+                        return res
+                    delay = self.__retry_after(res) or self.BACKOFF * 2 ** retries
+                    res.close()
+                except requests.RequestException as e:
+                    if retries >= self.RETRIES:
+                        self.__record(endpoint, start_time, retries, error=True)
+                        if raise_exception:
+                            raise
+                        error = re.sub(r"api_key=\w+", "api_key=***", str(e))
+                        logger.error(f"请求Emby接口 {endpoint} 失败：{error}")
+                        return None
+                    delay = self.BACKOFF * 2 ** retries
+            finally:
+                self.__release()
+            retries += 1
+            # 退避等待期间不占用请求名额
+            time.sleep(delay)
+
+    def metrics(self, reset: bool = False) -> List[dict]:
+        """
+        接口请求统计，按总耗时倒序
+        """
+        with self._metrics_lock:
+            metrics = self._metrics
+            if reset:
+                self._metrics = {}
+        return sorted([{
+            "endpoint": endpoint,
+            "count": metric.get("count"),
+            "errors": metric.get("errors"),
+            "retries": metric.get("retries"),
+            "avg_ms": round(metric.get("total") * 1000 / metric.get("count")),
+            "max_ms": round(metric.get("max") * 1000),
+        } for endpoint, metric in metrics.items()], key=lambda x: x.get("avg_ms") * x.get("count"), reverse=True)
+
+    def __acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def __release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def __mount(self, pool_size: int):
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pool_size = pool_size
+
+    def __record(self, endpoint: str, start_time: float, retries: int, error: bool):
+        elapsed = time.monotonic() - start_time
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint, {"count": 0, "errors": 0, "retries": 0,
+                                                         "total": 0.0, "max": 0.0})
+            metric["count"] += 1
+            metric["retries"] += retries
+            metric["total"] += elapsed
+            metric["max"] = max(metric["max"], elapsed)
+            if error:
+                metric["errors"] += 1
+
+    @staticmethod
+    def __endpoint(method: str, url: str) -> str:
+        """
+        接口名称，路径中的媒体Id等替换为{id}，不含查询参数
+        """
+        path = re.sub(r"/+", "/", urlparse(url).path)
+        path = re.sub(r"/(\d+|[0-9a-fA-F]{32})(?=/|$)", "/{id}", path)
+        return f"{method} {path}"
+
+    @staticmethod
+    def __retry_after(res: requests.Response) -> Optional[float]:
+        retry_after = res.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+        return None
+
+
+class PlaybackRollup:
+    """
+    观影记录本地汇总库，按天、用户、媒体汇总Playback Reporting数据
+    """
+
+    def __init__(self, db_path: Path):
+        self._db_path = db_path
+        self._lock = threading.Lock()
+        with self._lock, closing(self.__connect()) as conn, conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS playback_daily (
+                    server TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    item_type TEXT NOT NULL,
+                    name TEXT,
+                    play_count INTEGER NOT NULL DEFAULT 0,
+                    duration INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (server, day, user_id, item_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_playback_daily_type_day
+                    ON playback_daily (server, item_type, day);
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    server TEXT PRIMARY KEY,
+                    synced_from TEXT NOT NULL,
+                    synced_to TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS item_library (
+                    server TEXT NOT NULL,
+                    item_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    library_id TEXT,
+                    PRIMARY KEY (server, item_type, name)
+                );
+                CREATE TABLE IF NOT EXISTS item_library_miss (
+                    server TEXT NOT NULL,
+                    item_type TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    checked_at INTEGER NOT NULL,
+                    PRIMARY KEY (server, item_type, name)
+                );
+            """)
+
+    def __connect(self):
+        return sqlite3.connect(self._db_path, timeout=30)
+
+    def get_state(self, server: str) -> Optional[Tuple[str, str]]:
+        """
+        获取已同步的日期范围 (synced_from, synced_to)
+        """
+        with self._lock, closing(self.__connect()) as conn:
+            return conn.execute("SELECT synced_from, synced_to FROM sync_state WHERE server = ?",
+                                (server,)).fetchone()
+
+    def replace_days(self, server: str, start_day: str, end_day: Optional[str], rows: List[list]):
+        """
+        覆盖写入[start_day, end_day)区间的每日汇总，end_day为空时覆盖至今
+        """
+        with self._lock, closing(self.__connect()) as conn, conn:
+            if end_day:
+                conn.execute("DELETE FROM playback_daily WHERE server = ? AND day >= ? AND day < ?",
+                             (server, start_day, end_day))
+            else:
+                conn.execute("DELETE FROM playback_daily WHERE server = ? AND day >= ?",
+                             (server, start_day))
+            conn.executemany("INSERT OR REPLACE INTO playback_daily "
+                             "(server, day, user_id, item_id, item_type, name, play_count, duration) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             [(server, *row) for row in rows])
+
+    def save_state(self, server: str, synced_from: str, synced_to: str):
+        with self._lock, closing(self.__connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO sync_state (server, synced_from, synced_to) VALUES (?, ?, ?)",
+                         (server, synced_from, synced_to))
+
+    def get_library(self, server: str, item_type: str, name: str) -> Tuple[bool, Optional[str]]:
+        """
+        获取媒体所属媒体库，返回 (是否已缓存, 媒体库Id)
+        """
+        with self._lock, closing(self.__connect()) as conn:
+            row = conn.execute("SELECT library_id FROM item_library WHERE server = ? AND item_type = ? AND name = ?",
+                               (server, item_type, name)).fetchone()
+        return (True, row[0]) if row else (False, None)
+
+    def set_library(self, server: str, item_type: str, name: str, library_id: Optional[str]):
+        with self._lock, closing(self.__connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO item_library (server, item_type, name, library_id) "
+                         "VALUES (?, ?, ?, ?)",
+                         (server, item_type, name, library_id))
+
+    def set_libraries(self, server: str, rows: List[Tuple[str, str, Optional[str]]]):
+        """
+        批量记录媒体所属媒体库 (item_type, name, library_id)
+        """
+        with self._lock, closing(self.__connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO item_library (server, item_type, name, library_id) "
+                             "VALUES (?, ?, ?, ?)",
+                             [(server, *row) for row in rows])
+
+    def set_misses(self, server: str, rows: List[Tuple[str, str]]):
+        """
+        记录无法获取所属媒体库的媒体 (item_type, name)，有效期内不再查询
+        """
+        with self._lock, closing(self.__connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO item_library_miss (server, item_type, name, checked_at) "
+                             "VALUES (?, ?, ?, ?)",
+                             [(server, *row, int(time.time())) for row in rows])
+
+    def unresolved_items(self, server: str, miss_ttl: int) -> List[list]:
+        """
+        获取尚未记录所属媒体库的媒体，同名媒体取最近一次观看的记录，跳过有效期内查询失败的媒体
+        :param miss_ttl: 查询失败记录的有效期（秒）
+        """
+        sql = ("SELECT d.user_id, d.item_id, d.item_type, d.name, MAX(d.day) "
+               "FROM playback_daily d "
+               "LEFT JOIN item_library l "
+               "ON l.server = d.server AND l.item_type = d.item_type AND l.name = d.name "
+               "LEFT JOIN item_library_miss m "
+               "ON m.server = d.server AND m.item_type = d.item_type AND m.name = d.name AND m.checked_at > ? "
+               "WHERE d.server = ? AND l.name IS NULL AND m.name IS NULL "
+               "GROUP BY d.item_type, d.name")
+        with self._lock, closing(self.__connect()) as conn:
+            return [list(row[:4]) for row in conn.execute(sql, (int(time.time()) - miss_ttl, server)).fetchall()]
+
+    def top(self, server: str, item_type: str, start_day: str, end_day: str, limit: int = 10,
+            user_id: str = None, library_id: str = None, exclude_libraries: List[str] = None) -> List[list]:
+        """
+        按观看时长统计区间内排行，同名媒体合并，媒体Id取最近一次观看的记录
+        """
+        sql = ("SELECT d.user_id, d.item_id, d.item_type, d.name, "
+               "SUM(d.play_count) AS play_count, SUM(d.duration) AS total_duration, MAX(d.day) "
+               "FROM playback_daily d "
+               "LEFT JOIN item_library l "
+               "ON l.server = d.server AND l.item_type = d.item_type AND l.name = d.name "
+               "WHERE d.server = ? AND d.item_type = ? AND d.day >= ? AND d.day <= ? ")
+        params = [server, item_type, start_day, end_day]
+        if user_id:
+            sql += "AND d.user_id = ? "
+            params.append(user_id)
+        if library_id:
+            sql += "AND l.library_id = ? "
+            params.append(library_id)
+        if exclude_libraries:
+            sql += f"AND (l.library_id IS NULL OR l.library_id NOT IN ({','.join('?' * len(exclude_libraries))})) "
+            params.extend(exclude_libraries)
+        sql += "GROUP BY d.name ORDER BY total_duration DESC LIMIT ?"
+        params.append(int(limit))
+        with self._lock, closing(self.__connect()) as conn:
+            return [list(row[:6]) for row in conn.execute(sql, params).fetchall()]
+
+
 class EmbyReporter(_PluginBase):
     # 插件名称
     plugin_name = "Emby观影报告"
@@ -34,7 +396,7 @@ class EmbyReporter(_PluginBase):
     # 插件图标
     plugin_icon = "Pydiocells_A.png"
     # 插件版本
-    plugin_version = "2.1.1"
+    plugin_version = "2.3.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -65,6 +427,14 @@ class EmbyReporter(_PluginBase):
     mediaserver_helper = None
     PLAYBACK_REPORTING_TYPE_MOVIE = "ItemName"
     PLAYBACK_REPORTING_TYPE_TVSHOWS = "substr(ItemName,0, instr(ItemName, ' - '))"
+    # 单次增量同步拉取的天数
+    PLAYBACK_SYNC_CHUNK_DAYS = 7
+    # 批量获取媒体信息时每次请求的媒体数
+    ITEMS_BATCH_SIZE = 100
+    # 无法获取所属媒体库（如已删除）的媒体再次查询的间隔（秒）
+    LIBRARY_MISS_TTL = 7 * 86400
+    _rollup: Optional[PlaybackRollup] = None
+    _EMBY_NAME = None
     _EMBY_HOST = None
     _EMBY_APIKEY = None
     _EMBY_USER = None
@@ -73,6 +443,7 @@ class EmbyReporter(_PluginBase):
         # 停止现有任务
         self.stop_service()
         self.mediaserver_helper = MediaServerHelper()
+        self._rollup = PlaybackRollup(self.get_data_path() / "playback.db")
 
         if config:
             self._enabled = config.get("enabled")
@@ -140,17 +511,17 @@ class EmbyReporter(_PluginBase):
 
         for emby_name, emby_server in emby_servers.items():
             logger.info(f"开始处理媒体服务器 {emby_name}")
-            self._EMBY_HOST = emby_server.config.config.get("host")
+            self._EMBY_NAME = emby_name
+            self._EMBY_HOST = EmbyClient.normalize_host(emby_server.config.config.get("host"))
             self._EMBY_USER = emby_server.instance.get_user()
             self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            if not self._EMBY_HOST.endswith("/"):
-                self._EMBY_HOST += "/"
-            if not self._EMBY_HOST.startswith("http"):
-                self._EMBY_HOST = "http://" + self._EMBY_HOST
 
             # 获取当前时间并格式化
             current_time = datetime.now().strftime("%Y%m%d%H%M%S")
 
+            # 增量同步观影记录到本地
+            self.sync_playback(days=int(self._days))
+
             # 获取数据
             success, movies = self.get_report(types=self.PLAYBACK_REPORTING_TYPE_MOVIE, days=int(self._days),
                                               limit=int(self._cnt))
@@ -191,6 +562,7 @@ class EmbyReporter(_PluginBase):
                     mtype=mtype,
                     image=report_url)
                 logger.info(f"{emby_name} 观影记录推送成功 {report_url}")
+            EmbyClient.report()
 
     @staticmethod
     def __split_image_by_height(image_path, output_path_prefix, heights):
@@ -641,13 +1013,10 @@ class EmbyReporter(_PluginBase):
 
                 # 过滤电影
                 if self._black_library:
-                    success, info = self.items(user_id, item_id)
-                    if success and info:
-                        success, parent_info = self.items(user_id, info["ParentId"])
-                        if (success and parent_info
-                                and str(parent_info["ParentId"]) in str(self._black_library).split(",")):
-                            logger.info(f"电影 {name} 已在媒体库黑名单 {self._black_library} 中，已过滤")
-                            continue
+                    library_id = self.__get_library_id(user_id, item_id, item_type, name)
+                    if library_id and library_id in str(self._black_library).split(","):
+                        logger.info(f"电影 {name} 已在媒体库黑名单 {self._black_library} 中，已过滤")
+                        continue
                 exists_movies.append(i)
             except Exception as e:
                 logger.error(str(e))
@@ -675,8 +1044,8 @@ class EmbyReporter(_PluginBase):
                 item_id = data["SeriesId"]
                 # 过滤电视剧
                 if self._black_library:
-                    success, parent_info = self.items(user_id, item_id)
-                    if success and parent_info and str(parent_info["ParentId"]) in str(self._black_library).split(","):
+                    library_id = self.__get_library_id(user_id, item_id, item_type, name)
+                    if library_id and library_id in str(self._black_library).split(","):
                         logger.info(f"电视剧 {name} 已在媒体库黑名单 {self._black_library} 中，已过滤")
                         continue
                 # 封面图像获取
@@ -796,7 +1165,7 @@ class EmbyReporter(_PluginBase):
             url = self._EMBY_HOST + f"/emby/Items/{item_id}/Images/Primary?maxHeight={height}&maxWidth={width}&quality={quality}"
             if ret_url:
                 return url
-            resp = RequestUtils().get_res(url=url)
+            resp = EmbyClient.get(url=url)
 
             if resp.status_code != 204 and resp.status_code != 200:
                 return False, "🤕Emby 服务器连接失败!"
@@ -810,7 +1179,7 @@ class EmbyReporter(_PluginBase):
             url = self._EMBY_HOST + f"/emby/Items/{item_id}/Images/Backdrop/0?&maxWidth={width}&quality={quality}"
             if ret_url:
                 return url
-            resp = RequestUtils().get_res(url=url)
+            resp = EmbyClient.get(url=url)
 
             if resp.status_code != 204 and resp.status_code != 200:
                 return False, "🤕Emby 服务器连接失败!"
@@ -823,7 +1192,7 @@ class EmbyReporter(_PluginBase):
         url = self._EMBY_HOST + f"/emby/Items/{item_id}/Images/Logo?quality={quality}"
         if ret_url:
             return url
-        resp = RequestUtils().get_res(url=url)
+        resp = EmbyClient.get(url=url)
 
         if resp.status_code != 204 and resp.status_code != 200:
             return False, "🤕Emby 服务器连接失败!"
@@ -833,7 +1202,7 @@ class EmbyReporter(_PluginBase):
     def items(self, user_id, item_id):
         try:
             url = f"{self._EMBY_HOST}/emby/Users/{user_id}/Items/{item_id}?api_key={self._EMBY_APIKEY}"
-            resp = RequestUtils().get_res(url=url)
+            resp = EmbyClient.get(url=url)
 
             if resp.status_code != 204 and resp.status_code != 200:
                 return False, "🤕Emby 服务器连接失败!"
@@ -841,37 +1210,192 @@ class EmbyReporter(_PluginBase):
         except Exception:
             return False, "🤕Emby 服务器连接失败!"
 
-    def get_report(self, days, types=None, user_id=None, end_date=datetime.now(pytz.timezone("Asia/Shanghai")),
-                   limit=10):
-        if not types:
-            types = self.PLAYBACK_REPORTING_TYPE_MOVIE
-        sub_date = end_date - timedelta(days=int(days))
-        start_time = sub_date.strftime("%Y-%m-%d 00:00:00")
-        end_time = end_date.strftime("%Y-%m-%d 23:59:59")
-        sql = "SELECT UserId, ItemId, ItemType, "
-        sql += types + " AS name, "
-        sql += "COUNT(1) AS play_count, "
-        sql += "SUM(PlayDuration - PauseDuration) AS total_duration "
-        sql += "FROM PlaybackActivity "
-        sql += f"WHERE ItemType = '{'Movie' if types == self.PLAYBACK_REPORTING_TYPE_MOVIE else 'Episode'}' "
-        sql += f"AND DateCreated >= '{start_time}' AND DateCreated <= '{end_time}' "
-        sql += "AND UserId not IN (select UserId from UserList) "
-        if user_id:
-            sql += f"AND UserId = '{user_id}' "
-        sql += "GROUP BY name "
-        sql += "ORDER BY total_duration DESC "
-        sql += "LIMIT " + str(limit)
-
+    def __get_library_id(self, user_id, item_id, item_type, name) -> Optional[str]:
+        """
+        获取媒体所属媒体库Id，优先读取本地缓存
+        电影传入电影Id，电视剧传入剧集Id
+        """
+        cached, library_id = self._rollup.get_library(self._EMBY_NAME, item_type, name)
+        if cached:
+            return library_id
+        success, info = self.items(user_id, item_id)
+        if not success or not info:
+            return None
+        if item_type == "Movie":
+            # 电影上级为文件夹，再上一级为媒体库
+            success, info = self.items(user_id, info["ParentId"])
+            if not success or not info:
+                return None
+        library_id = str(info["ParentId"]) if info.get("ParentId") else None
+        self._rollup.set_library(self._EMBY_NAME, item_type, name, library_id)
+        return library_id
+
+    def __submit_custom_query(self, sql: str) -> Tuple[bool, Any]:
+        """
+        向Playback Reporting提交自定义查询
+        """
         url = f"{self._EMBY_HOST}/emby/user_usage_stats/submit_custom_query?api_key={self._EMBY_APIKEY}"
-
         data = {
             "CustomQueryString": sql,
             "ReplaceUserId": False
         }
-        resp = RequestUtils().post_res(url=url, data=data)
-        if resp.status_code != 204 and resp.status_code != 200:
+        resp = EmbyClient.post(url=url, data=data)
+        if not resp or (resp.status_code != 204 and resp.status_code != 200):
             return False, "🤕Emby 服务器连接失败!"
         ret = resp.json()
         if len(ret["colums"]) == 0:
+            # 查询无结果时同样不返回列信息
+            if not ret.get("message"):
+                return True, []
             return False, ret["message"]
         return True, ret["results"]
+
+    def __pull_playback(self, start_day: str, end_day: Optional[str]) -> Tuple[bool, List[list]]:
+        """
+        拉取[start_day, end_day)区间按天、用户、媒体汇总的观影记录
+        """
+        sql = "SELECT substr(DateCreated, 1, 10) AS day, UserId, ItemId, ItemType, "
+        sql += (f"CASE WHEN ItemType = 'Movie' THEN {self.PLAYBACK_REPORTING_TYPE_MOVIE} "
+                f"ELSE {self.PLAYBACK_REPORTING_TYPE_TVSHOWS} END AS name, ")
+        sql += "COUNT(1) AS play_count, "
+        sql += "SUM(PlayDuration - PauseDuration) AS total_duration "
+        sql += "FROM PlaybackActivity "
+        sql += "WHERE ItemType IN ('Movie', 'Episode') "
+        sql += f"AND DateCreated >= '{start_day} 00:00:00' "
+        if end_day:
+            sql += f"AND DateCreated < '{end_day} 00:00:00' "
+        sql += "AND UserId not IN (select UserId from UserList) "
+        sql += "GROUP BY day, UserId, ItemId"
+        success, results = self.__submit_custom_query(sql)
+        if not success:
+            logger.error(f"拉取观影记录失败：{results}")
+            return False, []
+        return True, [[day, user_id, item_id, item_type, name, int(count or 0), int(duration or 0)]
+                      for day, user_id, item_id, item_type, name, count, duration in results]
+
+    def sync_playback(self, days: int, end_date: datetime = None) -> bool:
+        """
+        增量同步观影记录到本地汇总库
+        每次重新拉取上次同步日期的前一天至今，覆盖写入，兼容跨天延迟写入的记录；
+        报告天数超出已同步范围时向前补齐
+        """
+        end_date = end_date or datetime.now(pytz.timezone(settings.TZ))
+        start_day = (end_date - timedelta(days=int(days))).strftime("%Y-%m-%d")
+        today = datetime.now(pytz.timezone(settings.TZ)).strftime("%Y-%m-%d")
+
+        state = self._rollup.get_state(self._EMBY_NAME)
+        if state:
+            synced_from, synced_to = state
+            refresh_from = (datetime.strptime(synced_to, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+            ranges = [(refresh_from, None)]
+            if start_day < synced_from:
+                ranges.insert(0, (start_day, synced_from))
+            else:
+                start_day = synced_from
+        else:
+            ranges = [(start_day, None)]
+
+        for range_start, range_end in ranges:
+            chunk_start = datetime.strptime(range_start, "%Y-%m-%d")
+            stop = datetime.strptime(range_end or today, "%Y-%m-%d")
+            while True:
+                chunk_end = chunk_start + timedelta(days=self.PLAYBACK_SYNC_CHUNK_DAYS)
+                # 最后一段不设上限，包含今天
+                last_chunk = chunk_end >= stop
+                chunk_end_day = (range_end if last_chunk else chunk_end.strftime("%Y-%m-%d"))
+                success, rows = self.__pull_playback(chunk_start.strftime("%Y-%m-%d"), chunk_end_day)
+                if not success:
+                    logger.error(f"{self._EMBY_NAME} 同步观影记录失败，使用本地已同步数据")
+                    return False
+                self._rollup.replace_days(self._EMBY_NAME, chunk_start.strftime("%Y-%m-%d"), chunk_end_day, rows)
+                logger.info(f"{self._EMBY_NAME} 同步观影记录 {chunk_start.strftime('%Y-%m-%d')} ~ "
+                            f"{chunk_end_day or today}，共 {len(rows)} 条")
+                if last_chunk:
+                    break
+                chunk_start = chunk_end
+
+        self._rollup.save_state(self._EMBY_NAME, start_day, today)
+        self.__resolve_libraries()
+        return True
+
+    def __resolve_libraries(self):
+        """
+        补全新观看媒体的所属媒体库，按媒体库统计排行时依赖该记录
+        批量获取媒体信息：电影取所在文件夹的上级，剧集取所属剧集的上级，无法获取的媒体一段时间内不再查询
+        """
+        items = self._rollup.unresolved_items(self._EMBY_NAME, self.LIBRARY_MISS_TTL)
+        if not items:
+            return
+        infos = self.__get_items_info([item_id for _, item_id, _, _ in items])
+        if infos is None:
+            return
+        # 电影的上级文件夹、剧集的所属剧集
+        parent_ids = {}
+        for _, item_id, item_type, _ in items:
+            info = infos.get(str(item_id)) or {}
+            parent_id = info.get("ParentId") if item_type == "Movie" else info.get("SeriesId")
+            if parent_id:
+                parent_ids[str(item_id)] = str(parent_id)
+        parents = self.__get_items_info(list(set(parent_ids.values())))
+        if parents is None:
+            return
+        libraries = []
+        misses = []
+        for _, item_id, item_type, name in items:
+            parent = parents.get(parent_ids.get(str(item_id))) or {}
+            if parent.get("ParentId"):
+                libraries.append((item_type, name, str(parent.get("ParentId"))))
+            else:
+                misses.append((item_type, name))
+        if libraries:
+            self._rollup.set_libraries(self._EMBY_NAME, libraries)
+        if misses:
+            self._rollup.set_misses(self._EMBY_NAME, misses)
+        logger.info(f"{self._EMBY_NAME} 补全媒体所属媒体库 {len(libraries)}/{len(items)} 条，"
+                    f"未找到 {len(misses)} 条")
+
+    def __get_items_info(self, item_ids: List[str]) -> Optional[Dict[str, dict]]:
+        """
+        按Id批量获取媒体信息，返回 Id -> 媒体信息，请求失败时返回None
+        """
+        infos = {}
+        for i in range(0, len(item_ids), self.ITEMS_BATCH_SIZE):
+            params = {
+                "Ids": ",".join(str(item_id) for item_id in item_ids[i:i + self.ITEMS_BATCH_SIZE]),
+                "Fields": "ParentId",
+                "api_key": self._EMBY_APIKEY,
+            }
+            try:
+                res = EmbyClient.get(f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items", params=params)
+                if not res or res.status_code != 200:
+                    logger.error(f"{self._EMBY_NAME} 批量获取媒体信息失败")
+                    return None
+                for info in res.json().get("Items") or []:
+                    infos[str(info.get("Id"))] = info
+            except Exception as e:
+                logger.error(f"{self._EMBY_NAME} 批量获取媒体信息出错：{str(e)}")
+                return None
+        return infos
+
+    def get_report(self, days, types=None, user_id=None, end_date=None, limit=10, library_id=None):
+        """
+        从本地汇总库统计观影排行，需先调用 sync_playback 同步
+        """
+        if not types:
+            types = self.PLAYBACK_REPORTING_TYPE_MOVIE
+        end_date = end_date or datetime.now(pytz.timezone(settings.TZ))
+        sub_date = end_date - timedelta(days=int(days))
+        exclude_libraries = str(self._black_library).split(",") if self._black_library else None
+        try:
+            results = self._rollup.top(server=self._EMBY_NAME,
+                                       item_type='Movie' if types == self.PLAYBACK_REPORTING_TYPE_MOVIE else 'Episode',
+                                       start_day=sub_date.strftime("%Y-%m-%d"),
+                                       end_day=end_date.strftime("%Y-%m-%d"),
+                                       limit=limit,
+                                       user_id=user_id,
+                                       library_id=library_id,
+                                       exclude_libraries=exclude_libraries)
+        except Exception as e:
+            logger.error(f"统计观影记录失败：{str(e)}")
+            return False, str(e)
+        return True, results
@@ -1,17 +1,93 @@
+import threading
+import time
 from pathlib import Path
 
+from sqlalchemy import func
+
 from app.chain.dashboard import DashboardChain
 from app.core.config import settings
-from app.db.subscribe_oper import SubscribeOper
+from app.db import SessionFactory
+from app.db.models.subscribe import Subscribe
 from app.helper.directory import DirectoryHelper
+from app.log import logger
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Callable
 from app.schemas import NotificationType
 from app import schemas
 from app.utils.string import StringUtils
 from app.utils.system import SystemUtils
 
 
+class MetricCache:
+    """
+    统计指标缓存，每个指标单独设置有效期，过期后先返回旧值并在后台刷新
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, dict] = {}
+
+    def register(self, name: str, loader: Callable[[], Any], ttl: int):
+        """
+        注册指标
+        :param loader: 计算指标的方法
+        :param ttl: 有效期（秒）
+        """
+        self._metrics[name] = {
+            "loader": loader,
+            "ttl": ttl,
+            "value": None,
+            "time": None,
+            "refreshing": False,
+            "load_lock": threading.Lock(),
+        }
+
+    def get(self, name: str) -> Any:
+        """
+        获取指标，从未计算过时同步计算
+        """
+        metric = self._metrics[name]
+        if metric["time"] is None:
+            # 多个请求同时到达时只计算一次
+            with metric["load_lock"]:
+                if metric["time"] is None:
+                    self.__load(name)
+            return metric["value"]
+        if time.monotonic() - metric["time"] >= metric["ttl"]:
+            self.refresh(name)
+        return metric["value"]
+
+    def refresh(self, name: str = None):
+        """
+        后台刷新指标，不指定时刷新全部
+        """
+        for metric_name in [name] if name else list(self._metrics.keys()):
+            with self._lock:
+                metric = self._metrics[metric_name]
+                if metric["refreshing"]:
+                    continue
+                metric["refreshing"] = True
+            threading.Thread(target=self.__refresh, args=(metric_name,), daemon=True).start()
+
+    def __refresh(self, name: str):
+        metric = self._metrics[name]
+        try:
+            with metric["load_lock"]:
+                self.__load(name)
+        finally:
+            with self._lock:
+                metric["refreshing"] = False
+
+    def __load(self, name: str):
+        metric = self._metrics[name]
+        try:
+            metric["value"] = metric["loader"]()
+        except Exception as e:
+            # 计算失败时保留旧值，到期后再重试
+            logger.error(f"HomePage统计 {name} 出错：{str(e)}")
+        metric["time"] = time.monotonic()
+
+
 class HomePage(_PluginBase):
     # 插件名称
     plugin_name = "HomePage"
@@ -20,7 +96,7 @@ class HomePage(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/homepage.png"
     # 插件版本
-    plugin_version = "1.3"
+    plugin_version = "1.4"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -34,11 +110,24 @@ class HomePage(_PluginBase):
 
     # 任务执行间隔
     _enabled = False
+    # 各统计项有效期（秒）
+    _media_ttl = 300
+    _storage_ttl = 60
+    _subscribe_ttl = 30
+    _cache: Optional[MetricCache] = None
 
     def init_plugin(self, config: dict = None):
         if config:
             self._enabled = config.get("enabled")
 
+        self._cache = MetricCache()
+        self._cache.register("media", self.__media_statistic, self._media_ttl)
+        self._cache.register("storage", self.__storage_statistic, self._storage_ttl)
+        self._cache.register("subscribe", self.__subscribe_statistic, self._subscribe_ttl)
+        if self._enabled:
+            # 预先计算，首次请求直接返回
+            self._cache.refresh()
+
     def get_state(self) -> bool:
         return self._enabled
 
@@ -49,7 +138,26 @@ class HomePage(_PluginBase):
         if apikey != settings.API_TOKEN:
             return schemas.Response(success=False, message="API密钥错误")
 
-        # 媒体统计
+        media = self._cache.get("media") or {}
+        total_storage, free_storage = self._cache.get("storage") or (0, 0)
+        subscribe = self._cache.get("subscribe") or {}
+        return {
+            'movie_count': media.get('movie_count', 0),
+            'tv_count': media.get('tv_count', 0),
+            'episode_count': media.get('episode_count', 0),
+            'user_count': media.get('user_count', 0),
+            'total_storage': StringUtils.str_filesize(total_storage),
+            'free_storage': StringUtils.str_filesize(free_storage),
+            'used_storage': StringUtils.str_filesize(total_storage - free_storage),
+            'movie_subscribes': subscribe.get('movie_subscribes', 0),
+            'tv_subscribes': subscribe.get('tv_subscribes', 0),
+        }
+
+    @staticmethod
+    def __media_statistic() -> dict:
+        """
+        媒体统计
+        """
         movie_count = 0
         tv_count = 0
         episode_count = 0
@@ -62,28 +170,36 @@ class HomePage(_PluginBase):
                 tv_count += media_statistic.tv_count
                 episode_count += media_statistic.episode_count
                 user_count += media_statistic.user_count
+        return {
+            'movie_count': movie_count,
+            'tv_count': tv_count,
+            'episode_count': episode_count,
+            'user_count': user_count,
+        }
 
-        # 磁盘统计
+    @staticmethod
+    def __storage_statistic() -> Tuple[int, int]:
+        """
+        磁盘统计
+        """
         library_dirs = DirectoryHelper().get_download_dirs()
-        total_storage, free_storage = SystemUtils.space_usage([Path(d.download_path) for d in library_dirs if d.download_path])
+        return SystemUtils.space_usage([Path(d.download_path) for d in library_dirs if d.download_path])
 
-        # 订阅统计
+    @staticmethod
+    def __subscribe_statistic() -> dict:
+        """
+        订阅统计，按类型聚合计数
+        """
         movie_subscribes = 0
         tv_subscribes = 0
-        subscribes = SubscribeOper().list()
-        for subscribe in subscribes:
-            if str(subscribe.type) == '电影':
-                movie_subscribes += 1
+        with SessionFactory() as db:
+            rows = db.query(Subscribe.type, func.count(Subscribe.id)).group_by(Subscribe.type).all()
+        for subscribe_type, count in rows:
+            if str(subscribe_type) == '电影':
+                movie_subscribes += count
             else:
-                tv_subscribes += 1
+                tv_subscribes += count
         return {
-            'movie_count': movie_count,
-            'tv_count': tv_count,
-            'episode_count': episode_count,
-            'user_count': user_count,
-            'total_storage': StringUtils.str_filesize(total_storage),
-            'free_storage': StringUtils.str_filesize(free_storage),
-            'used_storage': StringUtils.str_filesize(total_storage - free_storage),
             'movie_subscribes': movie_subscribes,
             'tv_subscribes': tv_subscribes,
         }
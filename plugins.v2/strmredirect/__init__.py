@@ -1,13 +1,179 @@
 import os
-import re
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, Iterator, Callable
 
 from app.log import logger
 from app.plugins import _PluginBase
 
 
+class StrmBatch:
+    """
+    Strm批量处理基类
+    scandir遍历只处理.strm文件，不跟随符号链接，分批提交到线程池并发处理，修改的文件原子写入
+    """
+    # 每批提交到线程池的文件数
+    BATCH_SIZE = 1000
+
+    def __init__(self, workers: int = 8):
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+
+    def process_all(self, path: str, on_batch: Callable[[], None] = None):
+        """
+        并发处理路径下全部strm文件，每批处理完成后回调on_batch
+        """
+        files = self.walk(path)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while True:
+                batch = list(islice(files, self.BATCH_SIZE))
+                if not batch:
+                    break
+                for result in executor.map(self._process, batch):
+                    with self._lock:
+                        self._count(result)
+                if on_batch:
+                    on_batch()
+
+    @staticmethod
+    def walk(path: str) -> Iterator[str]:
+        """
+        scandir遍历目录，只返回.strm文件，path为文件时直接返回
+        """
+        if os.path.isfile(path):
+            if path[-5:].lower() == ".strm":
+                yield path
+            return
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            # 与os.walk一致不跟随目录链接，避免链接成环或遍历整个挂载目录
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.name[-5:].lower() == ".strm" and entry.is_file(follow_symlinks=False):
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.error(f"遍历目录出错：{str(e)}")
+
+    @staticmethod
+    def write(file_path: str, content: str):
+        """
+        写入临时文件后替换，避免中断时留下不完整的文件
+        """
+        tmp_path = os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _process(self, file_path: str) -> Optional[bool]:
+        """
+        处理单个strm文件，返回是否修改，出错返回None
+        """
+        raise NotImplementedError
+
+    def _count(self, result: Optional[bool]):
+        """
+        累计单个文件的处理结果，调用时已持有_lock
+        """
+        raise NotImplementedError
+
+
+class StrmRewriter(StrmBatch):
+    """
+    Strm批量重写
+    先按前缀判断是否需要修改，每个文件最多原子写入一次
+    """
+    # 试运行报告最多记录的文件数
+    REPORT_LIMIT = 10000
+
+    def __init__(self, target_from: Optional[str], target_to: Optional[str], unquote: bool,
+                 workers: int = 8, dry_run: bool = False):
+        super().__init__(workers=workers)
+        self._target_from = target_from if target_from and target_to else None
+        self._target_to = target_to
+        self._unquote = unquote
+        self._dry_run = dry_run
+        self.report: List[Tuple[str, str, str]] = []
+        self.stats = {"scanned": 0, "changed": 0, "failed": 0, "seconds": 0.0}
+
+    def run(self, directory: str) -> dict:
+        """
+        处理目录下全部strm文件，返回统计信息
+        """
+        start_time = time.monotonic()
+        self.process_all(directory)
+        self.stats["seconds"] = round(time.monotonic() - start_time, 3)
+        return self.stats
+
+    def rewrite(self, content: str) -> str:
+        """
+        计算新的strm内容
+        """
+        new_content = urllib.parse.unquote(content) if self._unquote else content
+        if not self._target_from:
+            return new_content
+        # 原内容即以源路径开头时保留其后部分的编码
+        if content.startswith(self._target_from):
+            tail = content[len(self._target_from):]
+        elif "%" in content:
+            decoded = urllib.parse.unquote(content)
+            if not decoded.startswith(self._target_from):
+                return new_content
+            tail = decoded[len(self._target_from):]
+        else:
+            return new_content
+        new_content = self._target_to + tail
+        # 如果不是url，不进行编码
+        if self._unquote or not new_content.startswith("http"):
+            new_content = urllib.parse.unquote(new_content)
+        return new_content
+
+    def _process(self, file_path: str) -> Optional[bool]:
+        """
+        处理单个strm文件，返回是否修改，出错返回None
+        """
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                content = file.read()
+            if not content:
+                return False
+            new_content = self.rewrite(content)
+            if new_content == content:
+                return False
+            if self._dry_run:
+                with self._lock:
+                    if len(self.report) < self.REPORT_LIMIT:
+                        self.report.append((file_path, content, new_content))
+                return True
+            self.write(file_path, new_content)
+            logger.debug(f"Updated Strm: {content} -> {new_content} success")
+            return True
+        except Exception as e:
+            logger.error(f"处理Strm文件 {file_path} 出错：{str(e)}")
+            return None
+
+    def _count(self, result: Optional[bool]):
+        self.stats["scanned"] += 1
+        if result is None:
+            self.stats["failed"] += 1
+        elif result:
+            self.stats["changed"] += 1
+
+
 class StrmRedirect(_PluginBase):
     # 插件名称
     plugin_name = "Strm重定向"
@@ -16,7 +182,7 @@ class StrmRedirect(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/softlinkredirect.png"
     # 插件版本
-    plugin_version = "1.2"
+    plugin_version = "1.3"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -34,6 +200,8 @@ class StrmRedirect(_PluginBase):
     _strm_path = None
     _origin_path = None
     _redirect_path = None
+    _dry_run = False
+    _workers = 8
 
     def init_plugin(self, config: dict = None):
         # 读取配置
@@ -43,6 +211,10 @@ class StrmRedirect(_PluginBase):
             self._strm_path = config.get("strm_path")
             self._origin_path = config.get("origin_path")
             self._redirect_path = config.get("redirect_path")
+            self._dry_run = config.get("dry_run")
+            workers = str(config.get("workers") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._workers = int(workers) if workers.isdigit() and int(workers) > 0 else 8
 
             if self._onlyonce and self._strm_path and ((self._origin_path and self._redirect_path) or self._unquote):
                 logger.info(f"{self._strm_path} Strm重定向开始 {self._origin_path} - {self._redirect_path}")
@@ -54,67 +226,39 @@ class StrmRedirect(_PluginBase):
                     "unquote": self._unquote,
                     "strm_path": self._strm_path,
                     "origin_path": self._origin_path,
-                    "redirect_path": self._redirect_path
+                    "redirect_path": self._redirect_path,
+                    "dry_run": self._dry_run,
+                    "workers": self._workers,
                 })
 
     def update_strm(self, target_from, target_to, directory):
-        for root, dirs, files in os.walk(directory):
-            for name in dirs + files:
-                file_path = os.path.join(root, name)
-                if Path(str(file_path)).is_dir():
-                    continue
-                if Path(str(file_path)).is_file():
-                    if Path(str(file_path)).suffix.lower() != ".strm":
-                        continue
-                    with open(str(file_path), 'r', encoding='utf-8') as file:
-                        strm_content = file.read()
-                    if not strm_content:
-                        continue
-                    unencoded = self.find_unencoded_parts(strm_content)
-                    # 解码url
-                    unercoded_strm_content = urllib.parse.unquote(strm_content)
-                    if self._unquote:
-                        with open(str(file_path), 'w', encoding='utf-8') as file:
-                            file.write(unercoded_strm_content)
-                            logger.info(f"Unquote Strm: {strm_content} -> {unercoded_strm_content} success")
-                    if target_from and target_to:
-                        if str(unercoded_strm_content).startswith(target_from):
-                            strm_content = unercoded_strm_content.replace(target_from, target_to)
-                            no_encoded = unencoded[0]
-                            encoded = strm_content.replace(no_encoded, "")
-                            # encoded = urllib.parse.quote(encoded)
-                            strm_content = no_encoded + encoded
+        rewriter = StrmRewriter(target_from=target_from, target_to=target_to, unquote=self._unquote,
+                                workers=self._workers, dry_run=self._dry_run)
+        stats = rewriter.run(directory)
+        speed = round(stats.get("scanned") / stats.get("seconds")) if stats.get("seconds") else stats.get("scanned")
+        logger.info(f"{directory} Strm{'试运行' if self._dry_run else '重定向'}：扫描 {stats.get('scanned')} 个，"
+                    f"{'需修改' if self._dry_run else '已修改'} {stats.get('changed')} 个，失败 {stats.get('failed')} 个，"
+                    f"耗时 {stats.get('seconds')} 秒，{speed} 个/秒")
+        if self._dry_run:
+            self.__save_report(rewriter.report, stats)
+        return stats
 
-                            # 如果不是url，不进行编码
-                            if not str(strm_content).startswith("http"):
-                                strm_content = urllib.parse.unquote(strm_content)
-                            with open(str(file_path), 'w', encoding='utf-8') as file:
-                                file.write(strm_content)
-                            logger.info(
-                                f"Updated Strm: {unercoded_strm_content} -> {strm_content} success")
-
-    @staticmethod
-    def find_unencoded_parts(input_string: str):
-        # 匹配URL编码的部分
-        url_encoded_pattern = re.compile(r'%[0-9A-Fa-f]{2}')
-
-        # 用于存储未编码的部分
-        unencoded_parts = []
-
-        # 找到所有的URL编码部分
-        last_index = 0
-        for match in url_encoded_pattern.finditer(input_string):
-            # 提取未编码的部分
-            start_index = match.start()
-            if start_index > last_index:
-                unencoded_parts.append(input_string[last_index:start_index])
-            last_index = match.end()
-
-        # 提取最后一部分，可能未被编码
-        if last_index < len(input_string):
-            unencoded_parts.append(input_string[last_index:])
-
-        return unencoded_parts
+    def __save_report(self, report: List[Tuple[str, str, str]], stats: dict):
+        """
+        保存试运行差异报告
+        """
+        report_file = self.get_data_path() / "dry_run_report.txt"
+        try:
+            with open(report_file, "w", encoding="utf-8") as file:
+                file.write(f"# 扫描 {stats.get('scanned')} 个，需修改 {stats.get('changed')} 个，"
+                           f"失败 {stats.get('failed')} 个，耗时 {stats.get('seconds')} 秒\n")
+                if stats.get("changed") > len(report):
+                    file.write(f"# 仅记录前 {len(report)} 个\n")
+                for file_path, content, new_content in report:
+                    file.write(f"{file_path}\n- {content}\n+ {new_content}\n")
+            logger.info(f"Strm试运行差异报告已保存：{report_file}")
+        except Exception as e:
+            logger.error(f"保存Strm试运行差异报告出错：{str(e)}")
 
     @staticmethod
     def get_command() -> List[Dict[str, Any]]:
@@ -182,6 +326,39 @@ class StrmRedirect(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'dry_run',
+                                            'label': '试运行',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '并发数',
+                                            'placeholder': '默认8'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -281,6 +458,7 @@ class StrmRedirect(_PluginBase):
                                             'type': 'info',
                                             'variant': 'tonal',
                                             'text': '如想解码Strm中的url路径，仅需勾选解码URL和填写strm路径即可。'
+                                                    '开启试运行只统计需修改的文件，差异报告保存在插件数据目录dry_run_report.txt。'
                                         }
                                     }
                                 ]
@@ -295,6 +473,8 @@ class StrmRedirect(_PluginBase):
             "strm_path": "",
             "origin_path": "",
             "redirect_path": "",
+            "dry_run": False,
+            "workers": 8,
         }
 
     def get_page(self) -> List[dict]:
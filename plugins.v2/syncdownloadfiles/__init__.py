@@ -1,18 +1,121 @@
+import json
+import os
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Set
 
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import or_
 
 from app.core.config import settings
+from app.db import SessionFactory
+from app.db.models.downloadhistory import DownloadHistory, DownloadFiles
+from app.db.models.transferhistory import TransferHistory
 from app.db.downloadhistory_oper import DownloadHistoryOper
-from app.db.transferhistory_oper import TransferHistoryOper
 from app.helper.downloader import DownloaderHelper
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas import ServiceInfo
 
+# 批量查询数据库时每批数量
+QUERY_CHUNK = 500
+# 按hash查询下载器种子的最大数量，超过时获取全部种子后过滤
+IDS_LIMIT = 200
+
+
+class FileRecordWriter:
+    """
+    下载文件记录批量写入
+    跨种子累积文件记录，达到批量大小时在一个事务中批量登记文件，并按源路径批量补充整理记录的download_hash
+    """
+    # 每批写入的文件记录数
+    BATCH_SIZE = 1000
+
+    def __init__(self, history: bool = False, batch_size: int = None):
+        self._history = history
+        self._batch_size = batch_size or self.BATCH_SIZE
+        # 待写入：(种子hash, 文件记录)
+        self._pending: List[Tuple[str, List[dict]]] = []
+        self._pending_rows = 0
+        # 已写入和写入失败的种子hash
+        self.committed: List[str] = []
+        self.failed: List[str] = []
+        self._files = 0
+        self._histories = 0
+        self._elapsed = 0.0
+
+    def add(self, download_hash: str, download_files: List[dict]):
+        """
+        添加一个种子的文件记录，累积达到批量大小时写入
+        """
+        self._pending.append((download_hash, download_files))
+        self._pending_rows += len(download_files)
+        if self._pending_rows >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        写入累积的文件记录
+        """
+        if not self._pending:
+            return
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        hashes = [download_hash for download_hash, _ in pending]
+        rows = [file for _, files in pending for file in files]
+        start_time = time.monotonic()
+        try:
+            with SessionFactory() as db:
+                updates = self.__match_histories(db, rows) if self._history else []
+                if rows:
+                    db.bulk_insert_mappings(DownloadFiles, rows)
+                if updates:
+                    db.bulk_update_mappings(TransferHistory, updates)
+                db.commit()
+        except Exception as e:
+            logger.error(f"批量登记 {len(hashes)} 个种子的文件记录失败，下次同步时重试：{str(e)}")
+            self.failed.extend(hashes)
+            return
+        self._elapsed += time.monotonic() - start_time
+        self._files += len(rows)
+        self._histories += len(updates)
+        self.committed.extend(hashes)
+        logger.info(f"已登记 {len(self.committed)} 个种子，文件记录 {self._files} 条，补充整理记录 {self._histories} 条")
+
+    def close(self) -> dict:
+        """
+        写入剩余记录，返回写入统计
+        """
+        self.flush()
+        rows = self._files + self._histories
+        return {
+            "torrents": len(self.committed),
+            "failed": len(self.failed),
+            "files": self._files,
+            "histories": self._histories,
+            "elapsed": round(self._elapsed, 2),
+            "rate": round(rows / self._elapsed) if self._elapsed else rows,
+        }
+
+    @staticmethod
+    def __match_histories(db: Any, rows: List[dict]) -> List[dict]:
+        """
+        按源路径批量查询缺少download_hash的整理记录，返回需要更新的记录
+        """
+        path_hashes = {}
+        for row in rows:
+            path_hashes.setdefault(row.get("fullpath"), row.get("download_hash"))
+        paths = list(path_hashes.keys())
+        updates = {}
+        for i in range(0, len(paths), QUERY_CHUNK):
+            chunk = paths[i:i + QUERY_CHUNK]
+            histories = db.query(TransferHistory.id, TransferHistory.src) \
+                .filter(TransferHistory.src.in_(chunk)) \
+                .filter(or_(TransferHistory.download_hash.is_(None), TransferHistory.download_hash == "")).all()
+            for historyid, src in histories:
+                updates.setdefault(historyid, {"id": historyid, "download_hash": path_hashes.get(src)})
+        return list(updates.values())
+
 
 class SyncDownloadFiles(_PluginBase):
     # 插件名称
@@ -22,7 +125,7 @@ class SyncDownloadFiles(_PluginBase):
     # 插件图标
     plugin_icon = "Youtube-dl_A.png"
     # 插件版本
-    plugin_version = "1.1.6"
+    plugin_version = "1.2.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -44,7 +147,6 @@ class SyncDownloadFiles(_PluginBase):
     _downloaders = []
     _dirs = None
     downloadhis = None
-    transferhis = None
 
     downloader_helper = None
 
@@ -56,7 +158,6 @@ class SyncDownloadFiles(_PluginBase):
         self.stop_service()
         self.downloader_helper = DownloaderHelper()
         self.downloadhis = DownloadHistoryOper()
-        self.transferhis = TransferHistoryOper()
 
         if config:
             self._enabled = config.get('enabled')
@@ -74,6 +175,8 @@ class SyncDownloadFiles(_PluginBase):
             for downloader in self._downloaders:
                 # 获取最后同步时间
                 self.del_data(f"last_sync_time_{downloader}")
+                # 清理增量同步状态
+                self.__clear_state(downloader)
             # 关闭clear
             self._clear = False
             self.__update_config()
@@ -99,115 +202,265 @@ class SyncDownloadFiles(_PluginBase):
 
         # 遍历下载器同步记录
         for downloader in self._downloaders:
-            # 获取最后同步时间
-            last_sync_time = self.get_data(f"last_sync_time_{downloader}")
-
             logger.info(f"开始扫描下载器 {downloader} ...")
             downloader_obj = self.__get_downloader(downloader)
-            # 获取下载器中已完成的种子
-            torrents = downloader_obj.get_completed_torrents()
+            downloader_config = self.__get_downloader_config(downloader)
+            dl_type = downloader_config.type
+            # 上次同步状态
+            state = self.__load_state(downloader)
+
+            # 获取下载器中未同步过的已完成种子
+            torrents = self.__get_new_torrents(downloader_obj, dl_type, state)
             if torrents:
-                logger.info(f"下载器 {downloader} 已完成种子数：{len(torrents)}")
+                logger.info(f"下载器 {downloader} 新增已完成种子数：{len(torrents)}")
             else:
-                logger.info(f"下载器 {downloader} 没有已完成种子")
+                logger.info(f"下载器 {downloader} 没有新增已完成种子")
+                self.__save_state(downloader, state)
                 continue
 
-            # 把种子按照名称和种子大小分组，获取添加时间最早的一个，认定为是源种子，其余为辅种
-            downloader_config = self.__get_downloader_config(downloader)
-            torrents = self.__get_origin_torrents(torrents, downloader_config.type)
-            logger.info(f"下载器 {downloader} 去除辅种，获取到源种子数：{len(torrents)}")
+            # 旧版本按最后同步时间同步，首次增量同步时之前的种子视为已同步
+            last_sync_time = self.get_data(f"last_sync_time_{downloader}")
+            if last_sync_time:
+                synced = [torrent for torrent in torrents
+                          if not self.__compare_time(torrent, dl_type, last_sync_time)]
+                for torrent in synced:
+                    state["hashes"].add(self.__get_hash(torrent, dl_type))
+                    state["groups"].add(self.__get_group_key(torrent, dl_type))
+                torrents = [torrent for torrent in torrents
+                            if self.__get_hash(torrent, dl_type) not in state["hashes"]]
+                logger.info(f"下载器 {downloader} 最后同步时间 {last_sync_time} 之前的 {len(synced)} 个种子已同步")
 
+            # 把种子按照名称和种子大小分组，获取添加时间最早的一个，认定为是源种子，其余为辅种
+            origin_torrents = []
+            for torrent in self.__get_origin_torrents(torrents, dl_type):
+                # 同组的源种子已同步过的，新增的为辅种
+                if self.__get_group_key(torrent, dl_type) in state["groups"]:
+                    continue
+                origin_torrents.append(torrent)
+            origin_hashes = {self.__get_hash(torrent, dl_type) for torrent in origin_torrents}
+            # 辅种直接标记为已同步
             for torrent in torrents:
-                # 返回false，标识后续种子已被同步
-                sync_flag = self.__compare_time(torrent, downloader_config.type, last_sync_time)
-
-                if not sync_flag:
-                    logger.info(f"最后同步时间{last_sync_time}, 之前种子已被同步，结束当前下载器 {downloader} 任务")
-                    break
-
+                hash_str = self.__get_hash(torrent, dl_type)
+                if hash_str not in origin_hashes:
+                    state["hashes"].add(hash_str)
+            logger.info(f"下载器 {downloader} 去除辅种，获取到新增源种子数：{len(origin_torrents)}")
+
+            # 批量查询MoviePilot下载的种子
+            mp_hashes = self.__get_mp_hashes(list(origin_hashes))
+
+            # 批量登记文件记录和补充整理记录
+            writer = FileRecordWriter(history=self._history)
+            torrent_map = {}
+            for torrent in origin_torrents:
                 # 获取种子hash
-                hash_str = self.__get_hash(torrent, downloader_config.type)
+                hash_str = self.__get_hash(torrent, dl_type)
 
                 # 判断是否是mp下载，判断download_hash是否在downloadhistory表中，是则不处理
-                downloadhis = self.downloadhis.get_by_hash(hash_str)
-                if downloadhis:
-                    downlod_files = self.downloadhis.get_files_by_hash(hash_str)
-                    if downlod_files:
-                        logger.info(f"种子 {hash_str} 通过MoviePilot下载，跳过处理")
-                        continue
-
-                # 获取种子download_dir
-                download_dir = self.__get_download_dir(torrent, downloader_config.type)
-
-                # 处理路径映射
-                if self._dirs:
-                    paths = self._dirs.split("\n")
-                    for path in paths:
-                        sub_paths = path.split(":")
-                        download_dir = download_dir.replace(sub_paths[0], sub_paths[1]).replace('\\', '/')
-
-                # 获取种子name
-                torrent_name = self.__get_torrent_name(torrent, downloader_config.type)
-                # 种子保存目录
-                save_path = Path(download_dir).joinpath(torrent_name)
-                # 获取种子文件
-                torrent_files = self.__get_torrent_files(torrent, downloader_config.type, downloader_obj)
-                logger.info(f"开始同步种子 {hash_str}, 文件数 {len(torrent_files)}")
-
-                download_files = []
-                for file in torrent_files:
-                    # 过滤掉没下载的文件
-                    if not self.__is_download(file, downloader_config.type):
-                        continue
-                    # 种子文件路径
-                    file_path_str = self.__get_file_path(file, downloader_config.type)
-                    file_path = Path(file_path_str)
-                    # 只处理视频格式
-                    if not file_path.suffix \
-                            or file_path.suffix not in settings.RMT_MEDIAEXT:
-                        continue
-                    # 种子文件根路程
-                    root_path = file_path.parts[0]
-                    # 不含种子名称的种子文件相对路径
-                    if root_path == torrent_name:
-                        rel_path = str(file_path.relative_to(root_path))
-                    else:
-                        rel_path = str(file_path)
-                    # 完整路径
-                    full_path = save_path.joinpath(rel_path)
-                    if self._history:
-                        transferhis = self.transferhis.get_by_src(str(full_path))
-                        if transferhis and not transferhis.download_hash:
-                            logger.info(f"开始补充转移记录：{transferhis.id} download_hash {hash_str}")
-                            self.transferhis.update_download_hash(historyid=transferhis.id,
-                                                                  download_hash=hash_str)
-
-                    # 种子文件记录
-                    download_files.append(
-                        {
-                            "download_hash": hash_str,
-                            "downloader": downloader,
-                            "fullpath": str(full_path),
-                            "savepath": str(save_path),
-                            "filepath": rel_path,
-                            "torrentname": torrent_name,
-                            "state": 1
-                        }
-                    )
-
-                if download_files:
-                    # 登记下载文件
-                    self.downloadhis.add_files(download_files)
-                logger.info(f"种子 {hash_str} 同步完成")
-
-            logger.info(f"下载器种子文件同步完成！")
-            self.save_data(f"last_sync_time_{downloader}",
-                           time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time())))
-
-            # 计算耗时
-            end_time = datetime.now()
-
-            logger.info(f"下载器任务文件记录已同步完成。总耗时 {(end_time - start_time).seconds} 秒")
+                if hash_str in mp_hashes:
+                    logger.info(f"种子 {hash_str} 通过MoviePilot下载，跳过处理")
+                    self.__mark_synced(state, torrent, dl_type)
+                    continue
+
+                try:
+                    download_files = self.__get_download_files(torrent, dl_type, downloader, downloader_obj)
+                except Exception as e:
+                    logger.error(f"获取种子 {hash_str} 文件失败，下次同步时重试：{str(e)}")
+                    state["pending"].add(hash_str)
+                    continue
+                logger.debug(f"种子 {hash_str} 待登记文件数 {len(download_files)}")
+                torrent_map[hash_str] = torrent
+                writer.add(hash_str, download_files)
+
+            stats = writer.close()
+            for hash_str in writer.committed:
+                self.__mark_synced(state, torrent_map.get(hash_str), dl_type)
+            state["pending"].update(writer.failed)
+            logger.info(f"下载器 {downloader} 登记种子 {stats.get('torrents')} 个，失败 {stats.get('failed')} 个，"
+                        f"文件记录 {stats.get('files')} 条，补充整理记录 {stats.get('histories')} 条，"
+                        f"写入耗时 {stats.get('elapsed')} 秒，{stats.get('rate')} 条/秒")
+
+            self.__save_state(downloader, state)
+            if last_sync_time:
+                self.del_data(f"last_sync_time_{downloader}")
+            logger.info(f"下载器 {downloader} 种子文件同步完成！")
+
+        # 计算耗时
+        end_time = datetime.now()
+
+        logger.info(f"下载器任务文件记录已同步完成。总耗时 {(end_time - start_time).seconds} 秒")
+
+    def __get_new_torrents(self, downloader_obj: Any, dl_type: str, state: dict) -> list:
+        """
+        获取未同步过的已完成种子
+        qbittorrent使用sync/maindata的rid只获取上次同步后有变化的种子，其它下载器按已同步hash过滤
+        """
+        seen = state["hashes"]
+        qbc = getattr(downloader_obj, "qbc", None) if dl_type == "qbittorrent" else None
+        if qbc:
+            try:
+                maindata = qbc.sync_maindata(rid=state.get("rid") or 0)
+            except Exception as e:
+                logger.warning(f"获取qbittorrent增量数据失败，改为全量对比：{str(e)}")
+                maindata = None
+            if maindata is not None:
+                state["rid"] = maindata.get("rid")
+                changed = maindata.get("torrents") or {}
+                removed = set(maindata.get("torrents_removed") or [])
+                seen -= removed
+                state["pending"] -= removed
+                if maindata.get("full_update"):
+                    # 全量数据时清理已删除种子的记录
+                    seen &= set(changed.keys())
+                    state["groups"] &= {f"{torrent.get('size')}:{torrent.get('name')}"
+                                        for torrent in changed.values()}
+                candidates = (set(changed.keys()) | state["pending"]) - seen
+                state["pending"] = set()
+                if not candidates:
+                    return []
+                # 种子较少时按hash查询，避免拉取全部种子
+                if len(candidates) <= IDS_LIMIT:
+                    torrents = downloader_obj.get_completed_torrents(ids=list(candidates))
+                else:
+                    torrents = downloader_obj.get_completed_torrents()
+                if torrents is None:
+                    # 查询失败，下次同步时重试
+                    state["pending"] = candidates
+                    return []
+                return [torrent for torrent in torrents if self.__get_hash(torrent, dl_type) in candidates]
+
+        torrents = downloader_obj.get_completed_torrents() or []
+        current = {self.__get_hash(torrent, dl_type) for torrent in torrents}
+        # 清理已删除种子的记录
+        seen &= current
+        state["groups"] &= {self.__get_group_key(torrent, dl_type) for torrent in torrents}
+        state["pending"] = set()
+        return [torrent for torrent in torrents if self.__get_hash(torrent, dl_type) not in seen]
+
+    def __get_download_files(self, torrent: Any, dl_type: str, downloader: str, downloader_obj: Any) -> List[dict]:
+        """
+        获取种子中需要登记的视频文件
+        """
+        # 获取种子hash
+        hash_str = self.__get_hash(torrent, dl_type)
+        # 获取种子download_dir
+        download_dir = self.__get_download_dir(torrent, dl_type)
+
+        # 处理路径映射
+        if self._dirs:
+            paths = self._dirs.split("\n")
+            for path in paths:
+                sub_paths = path.split(":")
+                download_dir = download_dir.replace(sub_paths[0], sub_paths[1]).replace('\\', '/')
+
+        # 获取种子name
+        torrent_name = self.__get_torrent_name(torrent, dl_type)
+        # 种子保存目录
+        save_path = Path(download_dir).joinpath(torrent_name)
+        # 获取种子文件
+        torrent_files = self.__get_torrent_files(torrent, dl_type, downloader_obj)
+
+        download_files = []
+        for file in torrent_files:
+            # 过滤掉没下载的文件
+            if not self.__is_download(file, dl_type):
+                continue
+            # 种子文件路径
+            file_path_str = self.__get_file_path(file, dl_type)
+            file_path = Path(file_path_str)
+            # 只处理视频格式
+            if not file_path.suffix \
+                    or file_path.suffix not in settings.RMT_MEDIAEXT:
+                continue
+            # 种子文件根路程
+            root_path = file_path.parts[0]
+            # 不含种子名称的种子文件相对路径
+            if root_path == torrent_name:
+                rel_path = str(file_path.relative_to(root_path))
+            else:
+                rel_path = str(file_path)
+            # 完整路径
+            full_path = save_path.joinpath(rel_path)
+
+            # 种子文件记录
+            download_files.append(
+                {
+                    "download_hash": hash_str,
+                    "downloader": downloader,
+                    "fullpath": str(full_path),
+                    "savepath": str(save_path),
+                    "filepath": rel_path,
+                    "torrentname": torrent_name,
+                    "state": 1
+                }
+            )
+        return download_files
+
+    @staticmethod
+    def __get_mp_hashes(hashes: List[str]) -> Set[str]:
+        """
+        批量查询通过MoviePilot下载且已登记文件的种子hash
+        """
+        mp_hashes = set()
+        with SessionFactory() as db:
+            for i in range(0, len(hashes), QUERY_CHUNK):
+                chunk = hashes[i:i + QUERY_CHUNK]
+                history_hashes = {row[0] for row in db.query(DownloadHistory.download_hash)
+                                  .filter(DownloadHistory.download_hash.in_(chunk)).all()}
+                if not history_hashes:
+                    continue
+                mp_hashes |= {row[0] for row in db.query(DownloadFiles.download_hash)
+                              .filter(DownloadFiles.download_hash.in_(history_hashes)).distinct().all()}
+        return mp_hashes
+
+    def __mark_synced(self, state: dict, torrent: Any, dl_type: str):
+        """
+        标记种子已同步
+        """
+        state["hashes"].add(self.__get_hash(torrent, dl_type))
+        state["groups"].add(self.__get_group_key(torrent, dl_type))
+
+    def __state_file(self, downloader: str) -> Path:
+        return self.get_data_path() / f"sync_state_{downloader}.json"
+
+    def __load_state(self, downloader: str) -> dict:
+        """
+        读取下载器同步状态：qbittorrent增量rid、已同步种子hash、已同步源种子分组、待重试种子hash
+        """
+        state = {}
+        state_file = self.__state_file(downloader)
+        if state_file.exists():
+            try:
+                state = json.loads(state_file.read_text(encoding="utf-8"))
+            except Exception as e:
+                logger.error(f"读取下载器 {downloader} 同步状态失败，将重新全量同步：{str(e)}")
+        return {
+            "rid": state.get("rid") or 0,
+            "hashes": set(state.get("hashes") or []),
+            "groups": set(state.get("groups") or []),
+            "pending": set(state.get("pending") or []),
+        }
+
+    def __save_state(self, downloader: str, state: dict):
+        """
+        保存下载器同步状态
+        """
+        state_file = self.__state_file(downloader)
+        tmp_file = state_file.with_suffix(".tmp")
+        try:
+            tmp_file.write_text(json.dumps({
+                "rid": state.get("rid") or 0,
+                "hashes": sorted(state.get("hashes")),
+                "groups": sorted(state.get("groups")),
+                "pending": sorted(state.get("pending")),
+            }, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_file, state_file)
+        except Exception as e:
+            logger.error(f"保存下载器 {downloader} 同步状态失败：{str(e)}")
+
+    def __clear_state(self, downloader: str):
+        state_file = self.__state_file(downloader)
+        if state_file.exists():
+            state_file.unlink()
 
     def __update_config(self):
         self.update_config({
@@ -334,6 +587,19 @@ class SyncDownloadFiles(_PluginBase):
             print(str(e))
             return ""
 
+    @staticmethod
+    def __get_group_key(torrent: Any, dl_type: str):
+        """
+        获取种子分组，名称和大小相同的为同一组
+        """
+        try:
+            if dl_type == "qbittorrent":
+                return f"{torrent.get('size')}:{torrent.get('name')}"
+            return f"{torrent.total_size}:{torrent.name}"
+        except Exception as e:
+            print(str(e))
+            return ""
+
     @staticmethod
     def __get_hash(torrent: Any, dl_type: str):
         """
@@ -569,7 +835,7 @@ class SyncDownloadFiles(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '适用于非MoviePilot下载的任务；下载器种子数据较多时，同步时间将会较长，请耐心等候，可查看实时日志了解同步进度；时间间隔建议最少每6小时执行一次，防止上次任务没处理完。'
+                                            'text': '适用于非MoviePilot下载的任务；每次只同步新增的已完成种子，qbittorrent使用增量接口获取变化的种子；首次同步种子数据较多时，同步时间将会较长，请耐心等候，可查看实时日志了解同步进度；清理数据将重新全量同步。'
                                         }
                                     }
                                 ]
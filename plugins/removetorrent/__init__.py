@@ -1,9 +1,14 @@
+from collections import Counter, defaultdict
+
 from app.modules.qbittorrent import Qbittorrent
 from app.modules.transmission import Transmission
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple
+from typing import Any, List, Dict, Tuple, Optional
 from app.log import logger
 
+# 每次删除的种子数
+DELETE_BATCH = 100
+
 
 class RemoveTorrent(_PluginBase):
     # 插件名称
@@ -13,7 +18,7 @@ class RemoveTorrent(_PluginBase):
     # 插件图标
     plugin_icon = "delete.png"
     # 插件版本
-    plugin_version = "1.2"
+    plugin_version = "1.3"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -57,66 +62,92 @@ class RemoveTorrent(_PluginBase):
                     "onlyonce": False
                 })
 
-                for tracker in str(self._trackers).split("\n"):
-                    logger.info(f"下载器 {self._downloader} 开始处理站点tracker {tracker}")
-                    self.__check_feed(tracker)
-                    logger.info(f"下载器 {self._downloader} 处理站点tracker {tracker} 完成")
+                # 一次遍历下载器种子，所有tracker共用索引
+                torrent_index = self.__build_index()
+                if torrent_index:
+                    delete_hashes = []
+                    for tracker in str(self._trackers).split("\n"):
+                        logger.info(f"下载器 {self._downloader} 开始处理站点tracker {tracker}")
+                        delete_hashes.extend(self.__check_feed(tracker, torrent_index))
+                        logger.info(f"下载器 {self._downloader} 处理站点tracker {tracker} 完成")
+                    self.__delete_torrents(delete_hashes)
 
-    def __check_feed(self, tracker: str):
+    def __build_index(self) -> Optional[dict]:
         """
-        检查tracker辅种情况
+        遍历下载器已完成种子，生成 种子名称和大小 -> 种子数量 的辅种计数，以及 tracker域名 -> 种子 的索引
         """
         downloader_obj = self.__get_downloader(self._downloader)
         # 获取下载器中已完成的种子
         torrents = downloader_obj.get_completed_torrents()
         if not torrents:
             logger.info(f"下载器 {self._downloader} 未获取到已完成种子")
-            return
+            return None
         logger.info(f"下载器 {self._downloader} 获取到已完成种子 {len(torrents)} 个")
 
-        all_torrents = []
-        tracker_torrents = []
-        key_torrents = {}
-        # 遍历种子，以种子名称和种子大小为key，查询辅种数量
+        key_counts = Counter()
+        tracker_torrents = defaultdict(list)
+        # 遍历种子，以种子名称和种子大小为key，统计辅种数量
         for torrent in torrents:
             torrent_size = self.__get_torrent_size(torrent, self._downloader)
             torrent_name = self.__get_torrent_name(torrent, self._downloader)
             torrent_key = "%s-%s" % (torrent_name, torrent_size)
-            all_torrents.append(torrent_key)
+            key_counts[torrent_key] += 1
 
             torrent_trackers = self.__get_torrent_trackers(torrent, self._downloader)
             if str(self._downloader) == "qb":
-                # 命中tracker的种子
-                if str(tracker) in torrent_trackers:
-                    tracker_torrents.append(torrent_key)
-                    key_torrents[torrent_key] = torrent
+                announces = [torrent_trackers] if torrent_trackers else []
             else:
-                for torrent_tracker in torrent_trackers:
-                    # 命中tracker的种子
-                    if str(tracker) in torrent_tracker.get('announce'):
-                        tracker_torrents.append(torrent_key)
-                        key_torrents[torrent_key] = torrent
+                announces = [torrent_tracker.get('announce') for torrent_tracker in torrent_trackers or []]
+            for announce in set(announces):
+                if announce:
+                    tracker_torrents[announce].append((torrent_key, torrent))
 
-        if not tracker_torrents:
+        return {
+            "counts": key_counts,
+            "trackers": tracker_torrents,
+            # 同一次运行中已计划删除的种子
+            "deleted": set(),
+        }
+
+    def __check_feed(self, tracker: str, torrent_index: dict) -> List[str]:
+        """
+        检查tracker辅种情况
+        :return: 需要删除的种子hash
+        """
+        key_counts: Counter = torrent_index.get("counts")
+        deleted: set = torrent_index.get("deleted")
+
+        key_torrents = {}
+        # 命中tracker的种子
+        for announce, torrents in torrent_index.get("trackers").items():
+            if str(tracker) not in announce:
+                continue
+            for torrent_key, torrent in torrents:
+                key_torrents[torrent_key] = torrent
+
+        if not key_torrents:
             logger.error(f"下载器 {self._downloader} 未获取到命中tracker {tracker} 的种子")
-            return
+            return []
 
-        logger.info(f"下载器 {self._downloader} 获取到命中tracker {tracker} 已完成种子 {len(tracker_torrents)} 个")
+        logger.info(f"下载器 {self._downloader} 获取到命中tracker {tracker} 已完成种子 {len(key_torrents)} 个")
 
+        delete_hashes = []
         # 查询tracker种子是否有其他辅种
-        for tracker_torrent in tracker_torrents:
-            torrent = key_torrents.get(tracker_torrent)
+        for tracker_torrent, torrent in key_torrents.items():
             torrent_name = self.__get_torrent_name(torrent, self._downloader)
             torrent_hash = self.__get_torrent_hash(torrent, self._downloader)
+            if torrent_hash in deleted:
+                continue
 
             if self._delete_type:
                 # 有辅种
-                if all_torrents.count(tracker_torrent) > 1:
+                if key_counts[tracker_torrent] > 1:
                     # 删除逻辑
                     if self._delete_torrent:
-                        downloader_obj.delete_torrents(delete_file=self._delete_file,
-                                                       ids=torrent_hash)
-                        logger.info(f"种子 {torrent_name} {torrent_hash} 有其他辅种，已删除")
+                        delete_hashes.append(torrent_hash)
+                        deleted.add(torrent_hash)
+                        key_counts[tracker_torrent] -= 1
+                        logger.info(f"种子 {torrent_name} {torrent_hash} 有其他辅种，将删除")
                     else:
                         logger.info(f"种子 {torrent_name} {torrent_hash} 有其他辅种，可删除")
                 else:
@@ -124,16 +155,34 @@ class RemoveTorrent(_PluginBase):
                     logger.warn(f"种子 {torrent_name} {torrent_hash} 在其他站无辅种，如需删除请手动处理")
             else:
                 # 无辅种
-                if all_torrents.count(tracker_torrent) == 1:
+                if key_counts[tracker_torrent] == 1:
                     # 删除逻辑
                     if self._delete_torrent:
-                        downloader_obj.delete_torrents(delete_file=self._delete_file,
-                                                       ids=torrent_hash)
-                        logger.info(f"种子 {torrent_name} {torrent_hash} 无其他辅种，已删除")
+                        delete_hashes.append(torrent_hash)
+                        deleted.add(torrent_hash)
+                        key_counts[tracker_torrent] -= 1
+                        logger.info(f"种子 {torrent_name} {torrent_hash} 无其他辅种，将删除")
                     else:
                         logger.info(f"种子 {torrent_name} {torrent_hash} 无其他辅种，可删除")
                 else:
                     logger.warn(f"种子 {torrent_name} {torrent_hash} 在其他站有辅种，如需删除请手动处理")
+        return delete_hashes
+
+    def __delete_torrents(self, delete_hashes: List[str]):
+        """
+        分批删除种子
+        """
+        if not delete_hashes:
+            return
+        downloader_obj = self.__get_downloader(self._downloader)
+        deleted = 0
+        for i in range(0, len(delete_hashes), DELETE_BATCH):
+            batch = delete_hashes[i:i + DELETE_BATCH]
+            if downloader_obj.delete_torrents(delete_file=self._delete_file, ids=batch):
+                deleted += len(batch)
+            else:
+                logger.error(f"下载器 {self._downloader} 删除 {len(batch)} 个种子失败")
+        logger.info(f"下载器 {self._downloader} 已删除种子 {deleted}/{len(delete_hashes)} 个")
 
     def __get_downloader(self, dtype: str):
         """
@@ -1,13 +1,16 @@
+import asyncio
 import re
 import time
 import warnings
 from datetime import datetime, timedelta
-from multiprocessing.dummy import Pool as ThreadPool
-from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, BoundedSemaphore, Event
 from typing import Optional, Any, List, Dict, Tuple
+from urllib.parse import urlparse
 
 import pytz
 import requests
+from requests.adapters import HTTPAdapter
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from ruamel.yaml import CommentedMap
@@ -28,6 +31,109 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 
 lock = Lock()
 
+# 同一域名同时刷新的站点数
+HOST_CONCURRENCY = 1
+# 连续多少次没有未读消息时刷新间隔翻倍
+SCHEDULE_MISS_STEP = 6
+# 最大刷新间隔（次）
+SCHEDULE_MAX_INTERVAL = 8
+
+
+class SiteSessionPool:
+    """
+    站点会话池
+    每个站点复用一个保持连接的会话，页面按ETag/Last-Modified条件请求，站点返回304时使用缓存的页面
+    """
+
+    def __init__(self):
+        # 站点地址 -> (会话参数, 会话)
+        self._sessions: Dict[str, Tuple[tuple, requests.Session]] = {}
+        # 页面地址 -> {"etag", "modified", "text"}
+        self._pages: Dict[str, dict] = {}
+        self._lock = Lock()
+        self.requests = 0
+        self.not_modified = 0
+
+    def session(self, site_url: str, cookie: str, ua: str, proxy: bool) -> requests.Session:
+        """
+        获取站点会话，cookie、ua或代理变化时重建
+        """
+        key = (cookie, ua, proxy)
+        with self._lock:
+            cached = self._sessions.get(site_url)
+            if cached and cached[0] == key:
+                return cached[1]
+            if cached:
+                cached[1].close()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._sessions[site_url] = (key, session)
+            # 会话变化后缓存页面不再可用
+            for page_url in [page_url for page_url in self._pages if page_url.startswith(site_url)]:
+                self._pages.pop(page_url, None)
+            return session
+
+    def get_page(self, session: requests.Session, url: str, cookie: str, ua: str,
+                 proxies: dict = None) -> Tuple[Optional[int], Optional[str]]:
+        """
+        条件请求页面，返回状态码和页面内容，页面未变化时返回缓存内容
+        """
+        headers = {"User-Agent": ua or settings.USER_AGENT}
+        with self._lock:
+            cached = self._pages.get(url)
+            self.requests += 1
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached.get("etag")
+            if cached.get("modified"):
+                headers["If-Modified-Since"] = cached.get("modified")
+        res = RequestUtils(headers=headers,
+                           cookies=cookie,
+                           session=session,
+                           proxies=proxies
+                           ).get_res(url=url)
+        if res is None:
+            return None, None
+        if res.status_code == 304 and cached:
+            with self._lock:
+                self.not_modified += 1
+            return 200, cached.get("text")
+        if res.status_code != 200:
+            return res.status_code, None
+        if re.search(r"charset=\"?utf-8\"?", res.text, re.IGNORECASE):
+            res.encoding = "utf-8"
+        else:
+            res.encoding = res.apparent_encoding
+        html_text = res.text
+        etag = res.headers.get("ETag")
+        modified = res.headers.get("Last-Modified")
+        with self._lock:
+            if etag or modified:
+                self._pages[url] = {"etag": etag, "modified": modified, "text": html_text}
+            else:
+                self._pages.pop(url, None)
+        return 200, html_text
+
+    def stats(self, reset: bool = True) -> Tuple[int, int]:
+        """
+        请求次数和未变化页面次数
+        """
+        with self._lock:
+            stats = (self.requests, self.not_modified)
+            if reset:
+                self.requests = 0
+                self.not_modified = 0
+        return stats
+
+    def close(self):
+        with self._lock:
+            for _, session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+            self._pages = {}
+
 
 class SiteUnreadMsg(_PluginBase):
     # 插件名称
@@ -37,7 +143,7 @@ class SiteUnreadMsg(_PluginBase):
     # 插件图标
     plugin_icon = "Synomail_A.png"
     # 插件版本
-    plugin_version = "1.9"
+    plugin_version = "2.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -56,6 +162,12 @@ class SiteUnreadMsg(_PluginBase):
     _history = []
     _exits_key = []
     _site_schema: List[ISiteUserInfo] = None
+    # 站点会话池
+    _session_pool: SiteSessionPool = SiteSessionPool()
+    # 站点识别记录：站点地址 -> {"schema": 站点类型, "index": 真实首页地址}
+    _site_profiles: Dict[str, dict] = {}
+    # 站点域名 -> 同时请求名额，由刷新线程结束时释放，跨多次刷新共用
+    _host_slots: Dict[str, BoundedSemaphore] = {}
 
     # 配置属性
     _enabled: bool = False
@@ -63,6 +175,9 @@ class SiteUnreadMsg(_PluginBase):
     _cron: str = ""
     _notify: bool = False
     _queue_cnt: int = 5
+    _render_cnt: int = 2
+    _timeout: int = 120
+    _adaptive: bool = False
     _history_days: int = 30
     _unread_sites: list = []
 
@@ -78,8 +193,12 @@ class SiteUnreadMsg(_PluginBase):
             self._onlyonce = config.get("onlyonce")
             self._cron = config.get("cron")
             self._notify = config.get("notify")
-            self._queue_cnt = config.get("queue_cnt")
-            self._history_days = config.get("history_days") or 30
+            # 非数字或小于1时使用默认值
+            self._queue_cnt = self.__to_int(config.get("queue_cnt"), 5)
+            self._render_cnt = self.__to_int(config.get("render_cnt"), 2)
+            self._timeout = self.__to_int(config.get("timeout"), 120)
+            self._adaptive = config.get("adaptive")
+            self._history_days = self.__to_int(config.get("history_days"), 30)
             self._unread_sites = config.get("unread_sites") or []
 
             # 过滤掉已删除的站点
@@ -104,6 +223,7 @@ class SiteUnreadMsg(_PluginBase):
                 self._scheduler.add_job(self.refresh_all_site_unread_msg, 'date',
                                         run_date=datetime.now(
                                             tz=pytz.timezone(settings.TZ)) + timedelta(seconds=3),
+                                        kwargs={"force": True},
                                         name="站点未读消息")
                 # 关闭一次性开关
                 self._onlyonce = False
@@ -273,6 +393,59 @@ class SiteUnreadMsg(_PluginBase):
                             },
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'render_cnt',
+                                            'label': '仿真队列数量'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'timeout',
+                                            'label': '单站点超时（秒）'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'adaptive',
+                                            'label': '按未读频率调度',
+                                        }
+                                    }
+                                ]
+                            },
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -307,7 +480,7 @@ class SiteUnreadMsg(_PluginBase):
                                         'props': {
                                             'type': 'info',
                                             'variant': 'tonal',
-                                            'text': '依赖于[站点数据统计]插件，解析邮件失败请去[站点数据统计]插件仓库提交issue。'
+                                            'text': '依赖于[站点数据统计]插件，解析邮件失败请去[站点数据统计]插件仓库提交issue。开启按未读频率调度后，长期没有未读消息的站点将逐渐降低刷新频率，最多每8次执行刷新一次，收到未读消息后恢复每次刷新。'
                                         }
                                     }
                                 ]
@@ -322,6 +495,9 @@ class SiteUnreadMsg(_PluginBase):
             "notify": True,
             "cron": "5 1 * * *",
             "queue_cnt": 5,
+            "render_cnt": 2,
+            "timeout": 120,
+            "adaptive": False,
             "history_days": 30,
             "unread_sites": []
         }
@@ -450,6 +626,7 @@ class SiteUnreadMsg(_PluginBase):
                 if self._scheduler.running:
                     self._scheduler.shutdown()
                 self._scheduler = None
+            self._session_pool.close()
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
 
@@ -462,6 +639,21 @@ class SiteUnreadMsg(_PluginBase):
                 logger.error(f"站点匹配失败 {e}")
         return None
 
+    def __get_schema(self, site_url: str, html_text: str) -> Any:
+        """
+        获取站点类型，优先使用上次识别的结果，识别后记录
+        """
+        profile = self._site_profiles.setdefault(site_url, {})
+        schema_name = profile.get("schema")
+        if schema_name:
+            for site_schema in self._site_schema:
+                if site_schema.__name__ == schema_name:
+                    return site_schema
+        site_schema = self.__build_class(html_text)
+        if site_schema:
+            profile["schema"] = site_schema.__name__
+        return site_schema
+
     def build(self, site_info: CommentedMap) -> Optional[ISiteUserInfo]:
         """
         构建站点信息
@@ -475,106 +667,86 @@ class SiteUnreadMsg(_PluginBase):
         url = site_info.get("url")
         proxy = site_info.get("proxy")
         ua = site_info.get("ua")
-        # 会话管理
-        with requests.Session() as session:
-            proxies = settings.PROXY if proxy else None
-            proxy_server = settings.PROXY_SERVER if proxy else None
-            render = site_info.get("render")
-
-            logger.debug(f"站点 {site_name} url={url} site_cookie={site_cookie} ua={ua}")
-            if render:
-                # 演染模式
-                html_text = PlaywrightHelper().get_page_source(url=url,
-                                                               cookies=site_cookie,
-                                                               ua=ua,
-                                                               proxies=proxy_server)
-            else:
-                # 普通模式
-                res = RequestUtils(cookies=site_cookie,
-                                   session=session,
-                                   ua=ua,
-                                   proxies=proxies
-                                   ).get_res(url=url)
-                if res and res.status_code == 200:
-                    if re.search(r"charset=\"?utf-8\"?", res.text, re.IGNORECASE):
-                        res.encoding = "utf-8"
-                    else:
-                        res.encoding = res.apparent_encoding
-                    html_text = res.text
-                    # 第一次登录反爬
-                    if html_text.find("title") == -1:
-                        i = html_text.find("window.location")
-                        if i == -1:
+        # 会话管理，同一站点复用会话
+        session = self._session_pool.session(url, site_cookie, ua, bool(proxy))
+        proxies = settings.PROXY if proxy else None
+        proxy_server = settings.PROXY_SERVER if proxy else None
+        render = site_info.get("render")
+        profile = self._site_profiles.setdefault(url, {})
+
+        logger.debug(f"站点 {site_name} url={url} site_cookie={site_cookie} ua={ua}")
+        if render:
+            # 演染模式
+            html_text = PlaywrightHelper().get_page_source(url=url,
+                                                           cookies=site_cookie,
+                                                           ua=ua,
+                                                           proxies=proxy_server)
+        else:
+            # 普通模式，上次识别为假首页的站点直接请求真实首页
+            index_url = profile.get("index") or url
+            status_code, html_text = self._session_pool.get_page(session, index_url, site_cookie, ua, proxies)
+            if status_code == 200 and html_text is not None:
+                # 第一次登录反爬
+                if html_text.find("title") == -1:
+                    i = html_text.find("window.location")
+                    if i == -1:
+                        return None
+                    tmp_url = url + html_text[i:html_text.find(";")] \
+                        .replace("\"", "") \
+                        .replace("+", "") \
+                        .replace(" ", "") \
+                        .replace("window.location=", "")
+                    status_code, html_text = self._session_pool.get_page(session, tmp_url, site_cookie, ua, proxies)
+                    if status_code is None:
+                        logger.error("站点 %s 无法访问：%s" % (site_name, url))
+                        return None
+                    if status_code != 200:
+                        logger.error("站点 %s 被反爬限制：%s, 状态码：%s" % (site_name, url, status_code))
+                        return None
+                    if not html_text:
+                        return None
+
+                # 兼容假首页情况，假首页通常没有 <link rel="search" 属性
+                if index_url == url and '"search"' not in html_text and '"csrf-token"' not in html_text:
+                    index_url = url + "/index.php"
+                    status_code, index_text = self._session_pool.get_page(session, index_url,
+                                                                          site_cookie, ua, proxies)
+                    if status_code == 200:
+                        if not index_text:
                             return None
-                        tmp_url = url + html_text[i:html_text.find(";")] \
-                            .replace("\"", "") \
-                            .replace("+", "") \
-                            .replace(" ", "") \
-                            .replace("window.location=", "")
-                        res = RequestUtils(cookies=site_cookie,
-                                           session=session,
-                                           ua=ua,
-                                           proxies=proxies
-                                           ).get_res(url=tmp_url)
-                        if res and res.status_code == 200:
-                            if "charset=utf-8" in res.text or "charset=UTF-8" in res.text:
-                                res.encoding = "UTF-8"
-                            else:
-                                res.encoding = res.apparent_encoding
-                            html_text = res.text
-                            if not html_text:
-                                return None
-                            elif res is not None:
-                                logger.error("站点 %s 被反爬限制：%s, 状态码：%s" % (site_name, url, res.status_code))
-                                return None
-                            else:
-                                logger.error("站点 %s 无法访问：%s" % (site_name, url))
-                                return None
-
-                    # 兼容假首页情况，假首页通常没有 <link rel="search" 属性
-                    if '"search"' not in html_text and '"csrf-token"' not in html_text:
-                        res = RequestUtils(cookies=site_cookie,
-                                           session=session,
-                                           ua=ua,
-                                           proxies=proxies
-                                           ).get_res(url=url + "/index.php")
-                        if res and res.status_code == 200:
-                            if re.search(r"charset=\"?utf-8\"?", res.text, re.IGNORECASE):
-                                res.encoding = "utf-8"
-                            else:
-                                res.encoding = res.apparent_encoding
-                            html_text = res.text
-                            if not html_text:
-                                return None
-                elif res is not None:
-                    logger.error(f"站点 {site_name} 连接失败，状态码：{res.status_code}")
-                    return None
-                else:
-                    logger.error(f"站点 {site_name} 无法访问：{url}")
-                    return None
-            # 解析站点类型
-            if html_text:
-                site_schema = self.__build_class(html_text)
-                if not site_schema:
-                    logger.error("站点 %s 无法识别站点类型" % site_name)
-                    return None
-                return site_schema(
-                    site_name=site_name,
-                    url=url,
-                    site_cookie=site_cookie,
-                    apikey=apikey,
-                    token=token,
-                    index_html=html_text,
-                    session=session,
-                    ua=ua,
-                    proxy=proxy)
-            return None
+                        html_text = index_text
+                        profile["index"] = index_url
+            elif status_code is not None:
+                logger.error(f"站点 {site_name} 连接失败，状态码：{status_code}")
+                profile.pop("index", None)
+                return None
+            else:
+                logger.error(f"站点 {site_name} 无法访问：{url}")
+                return None
+        # 解析站点类型
+        if html_text:
+            site_schema = self.__get_schema(url, html_text)
+            if not site_schema:
+                logger.error("站点 %s 无法识别站点类型" % site_name)
+                return None
+            return site_schema(
+                site_name=site_name,
+                url=url,
+                site_cookie=site_cookie,
+                apikey=apikey,
+                token=token,
+                index_html=html_text,
+                session=session,
+                ua=ua,
+                proxy=proxy)
+        return None
 
-    def __refresh_site_data(self, site_info: CommentedMap):
+    def __refresh_site_data(self, site_info: CommentedMap, cancelled: Event = None):
         """
         更新单个site 数据信息
         :param site_info:
-        :return:
+        :param cancelled: 已超时标志，超时后丢弃结果，不再通知和记录历史
+        :return: 未读消息数，失败返回None
         """
         site_name = site_info.get('name')
         site_url = site_info.get('url')
@@ -591,12 +763,21 @@ class SiteUnreadMsg(_PluginBase):
                 # 获取不到数据时，仅返回错误信息，不做历史数据更新
                 if site_user_info.err_msg and site_user_info.message_unread <= 0:
                     logger.error(f"站点 {site_name} 解析失败：{site_user_info.err_msg} {site_user_info.message_unread}")
+                    # 下次重新识别站点类型
+                    self._site_profiles.pop(site_url, None)
+                    return None
+
+                if cancelled and cancelled.is_set():
+                    logger.info(f"站点 {site_name} 刷新已超时，丢弃结果")
                     return None
 
                 # 发送通知，存在未读消息
                 self.__notify_unread_msg(site_name, site_user_info)
+                return site_user_info.message_unread
         except Exception as e:
             logger.error(f"站点 {site_name} 获取流量数据失败：{str(e)}")
+            self._site_profiles.pop(site_url, None)
+        return None
 
     def __notify_unread_msg(self, site_name: str, site_user_info: ISiteUserInfo):
         if site_user_info.message_unread <= 0:
@@ -626,16 +807,21 @@ class SiteUnreadMsg(_PluginBase):
                               title=f"站点 {site_user_info.site_name} 收到 "
                                     f"{site_user_info.message_unread} 条新消息，请登陆查看")
 
-    def refresh_all_site_unread_msg(self):
+    def refresh_all_site_unread_msg(self, force: bool = False):
         """
-        多线程刷新站点未读消息
+        并发刷新站点未读消息
+        :param force: 刷新全部站点，不按未读频率跳过
         """
         if not self.sites.get_indexers():
             return
 
-        logger.info("开始刷新站点未读消息 ...")
+        # 上次刷新未完成时不重复执行
+        if not lock.acquire(blocking=False):
+            logger.warning("上次站点未读消息刷新尚未完成，跳过本次刷新")
+            return
 
-        with lock:
+        try:
+            logger.info("开始刷新站点未读消息 ...")
             all_sites = [site for site in self.sites.get_indexers() if not site.get("public")] + self.__custom_sites()
             # 没有指定站点，默认使用全部站点
             if not self._unread_sites:
@@ -643,13 +829,30 @@ class SiteUnreadMsg(_PluginBase):
             else:
                 refresh_sites = [site for site in all_sites if
                                  site.get("id") in self._unread_sites]
+            refresh_sites = [site for site in refresh_sites if site.get("url")]
             if not refresh_sites:
                 return
 
             self._history = self.get_data("history") or []
-            # 并发刷新
-            with ThreadPool(min(len(refresh_sites), int(self._queue_cnt or 5))) as p:
-                p.map(self.__refresh_site_data, refresh_sites)
+            self._site_profiles = self.get_data("site_profiles") or {}
+            schedules = self.get_data("schedules") or {}
+            if self._adaptive and not force:
+                refresh_sites = self.__schedule_sites(refresh_sites, schedules)
+            logger.info(f"本次刷新站点数：{len(refresh_sites)}")
+
+            # 并发刷新，结果按完成顺序处理
+            start_time = time.monotonic()
+            results = asyncio.run(self.__poll_sites(refresh_sites))
+            for site_url, unread in results.items():
+                self.__update_schedule(schedules, site_url, unread)
+            logger.info(f"站点刷新耗时 {round(time.monotonic() - start_time, 1)} 秒，"
+                        f"有未读消息站点数 {len([unread for unread in results.values() if unread])}")
+
+            # 保存站点识别记录和调度记录
+            self.save_data("site_profiles", self._site_profiles)
+            self.save_data("schedules", schedules)
+            request_count, not_modified = self._session_pool.stats()
+            logger.info(f"站点页面请求 {request_count} 次，未变化 {not_modified} 次")
 
             if self._history:
                 thirty_days_ago = time.time() - int(self._history_days) * 24 * 60 * 60
@@ -660,6 +863,106 @@ class SiteUnreadMsg(_PluginBase):
                 self.save_data("history", self._history)
 
             logger.info("站点未读消息刷新完成")
+        finally:
+            lock.release()
+
+    @staticmethod
+    def __to_int(value: Any, default: int) -> int:
+        """
+        解析正整数配置，非数字或小于1时返回默认值
+        """
+        value = str(value or "").strip()
+        return int(value) if value.isdigit() and int(value) > 0 else default
+
+    async def __poll_sites(self, sites: List[CommentedMap]) -> Dict[str, Optional[int]]:
+        """
+        异步调度站点刷新，普通站点和仿真站点分别使用独立线程池，同一域名限制同时请求数，单站点超时后不再等待
+        :return: 站点地址 -> 未读消息数，失败或超时为None
+        """
+        loop = asyncio.get_running_loop()
+        fetch_pool = ThreadPoolExecutor(max_workers=max(1, min(len(sites), self._queue_cnt)),
+                                        thread_name_prefix="siteunreadmsg")
+        render_pool = ThreadPoolExecutor(max_workers=max(1, self._render_cnt),
+                                         thread_name_prefix="siteunreadmsg-render")
+        timeout = self._timeout
+
+        async def poll(site: CommentedMap) -> Tuple[CommentedMap, Optional[int]]:
+            host = urlparse(site.get("url")).netloc
+            slot = self._host_slots.setdefault(host, BoundedSemaphore(HOST_CONCURRENCY))
+            pool = render_pool if site.get("render") else fetch_pool
+            # 超时的站点线程结束前仍占用域名名额，等待名额时不阻塞事件循环
+            deadline = loop.time() + timeout
+            while not slot.acquire(blocking=False):
+                if loop.time() >= deadline:
+                    logger.warning(f"站点 {site.get('name')} 等待同域名站点刷新超过 {timeout} 秒，本次跳过")
+                    return site, None
+                await asyncio.sleep(0.5)
+            cancelled = Event()
+
+            def refresh() -> Optional[int]:
+                try:
+                    if cancelled.is_set():
+                        return None
+                    return self.__refresh_site_data(site, cancelled)
+                finally:
+                    slot.release()
+
+            try:
+                future = loop.run_in_executor(pool, refresh)
+            except Exception:
+                slot.release()
+                raise
+            try:
+                # shield避免超时取消排队中的任务，保证名额由线程释放
+                unread = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+            except asyncio.TimeoutError:
+                cancelled.set()
+                logger.warning(f"站点 {site.get('name')} 刷新超过 {timeout} 秒，不再等待，结果将被丢弃")
+                unread = None
+            return site, unread
+
+        results = {}
+        try:
+            for task in asyncio.as_completed([poll(site) for site in sites]):
+                site, unread = await task
+                results[site.get("url")] = unread
+                logger.debug(f"站点 {site.get('name')} 刷新完成（{len(results)}/{len(sites)}）")
+        finally:
+            # 超时的站点线程仍在运行，不等待其结束
+            fetch_pool.shutdown(wait=False)
+            render_pool.shutdown(wait=False)
+        return results
+
+    @staticmethod
+    def __schedule_sites(sites: List[CommentedMap], schedules: Dict[str, dict]) -> List[CommentedMap]:
+        """
+        按未读频率筛选本次需要刷新的站点，连续多次没有未读消息的站点逐渐降低刷新频率
+        """
+        refresh_sites = []
+        for site in sites:
+            schedule = schedules.setdefault(site.get("url"), {"misses": 0, "skipped": 0})
+            interval = min(2 ** (schedule.get("misses", 0) // SCHEDULE_MISS_STEP), SCHEDULE_MAX_INTERVAL)
+            if schedule.get("skipped", 0) + 1 >= interval:
+                refresh_sites.append(site)
+            else:
+                schedule["skipped"] = schedule.get("skipped", 0) + 1
+                logger.debug(f"站点 {site.get('name')} 连续 {schedule.get('misses')} 次没有未读消息，本次跳过")
+        return refresh_sites
+
+    @staticmethod
+    def __update_schedule(schedules: Dict[str, dict], site_url: str, unread: Optional[int]):
+        """
+        记录站点刷新结果，有未读消息时恢复每次刷新
+        """
+        schedule = schedules.setdefault(site_url, {"misses": 0, "skipped": 0})
+        schedule["skipped"] = 0
+        if unread is None:
+            # 刷新失败不调整频率
+            return
+        if unread > 0:
+            schedule["misses"] = 0
+        else:
+            schedule["misses"] = schedule.get("misses", 0) + 1
 
     def __custom_sites(self) -> List[Any]:
         custom_sites = []
@@ -675,6 +978,9 @@ class SiteUnreadMsg(_PluginBase):
             "cron": self._cron,
             "notify": self._notify,
             "queue_cnt": self._queue_cnt,
+            "render_cnt": self._render_cnt,
+            "timeout": self._timeout,
+            "adaptive": self._adaptive,
             "history_days": self._history_days,
             "unread_sites": self._unread_sites,
         })
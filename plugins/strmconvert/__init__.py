@@ -1,12 +1,171 @@
-import re
+import os
+import threading
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
 
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple
+from typing import Any, List, Dict, Tuple, Callable, Iterator, Optional
 from app.log import logger
 
 
+class StrmBatch:
+    """
+    Strm批量处理基类
+    scandir遍历只处理.strm文件，不跟随符号链接，分批提交到线程池并发处理，修改的文件原子写入
+    """
+    # 每批提交到线程池的文件数
+    BATCH_SIZE = 1000
+
+    def __init__(self, workers: int = 8):
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+
+    def process_all(self, path: str, on_batch: Callable[[], None] = None):
+        """
+        并发处理路径下全部strm文件，每批处理完成后回调on_batch
+        """
+        files = self.walk(path)
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            while True:
+                batch = list(islice(files, self.BATCH_SIZE))
+                if not batch:
+                    break
+                for result in executor.map(self._process, batch):
+                    with self._lock:
+                        self._count(result)
+                if on_batch:
+                    on_batch()
+
+    @staticmethod
+    def walk(path: str) -> Iterator[str]:
+        """
+        scandir遍历目录，只返回.strm文件，path为文件时直接返回
+        """
+        if os.path.isfile(path):
+            if path[-5:].lower() == ".strm":
+                yield path
+            return
+        stack = [path]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            # 与os.walk一致不跟随目录链接，避免链接成环或遍历整个挂载目录
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                            elif entry.name[-5:].lower() == ".strm" and entry.is_file(follow_symlinks=False):
+                                yield entry.path
+                        except OSError:
+                            continue
+            except OSError as e:
+                logger.error(f"遍历目录出错：{str(e)}")
+
+    @staticmethod
+    def write(file_path: str, content: str):
+        """
+        写入临时文件后替换，避免中断时留下不完整的文件
+        """
+        tmp_path = os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(content)
+            os.chmod(tmp_path, os.stat(file_path).st_mode & 0o7777)
+            os.replace(tmp_path, file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _process(self, file_path: str) -> Optional[bool]:
+        """
+        处理单个strm文件，返回是否修改，出错返回None
+        """
+        raise NotImplementedError
+
+    def _count(self, result: Optional[bool]):
+        """
+        累计单个文件的处理结果，调用时已持有_lock
+        """
+        raise NotImplementedError
+
+
+class StrmConverter(StrmBatch):
+    """
+    Strm批量转换
+    线程池并发计算新内容，内容未变化的文件不写入，并定时输出进度和速度
+    """
+    # 进度输出间隔（秒）
+    PROGRESS_INTERVAL = 10
+
+    def __init__(self, convert: Callable[[str, str], str], workers: int = 8):
+        """
+        :param convert: 转换函数，参数为strm文件路径和原内容，返回新内容
+        :param workers: 并发数
+        """
+        super().__init__(workers=workers)
+        self._convert = convert
+        self.stats = {"scanned": 0, "converted": 0, "skipped": 0, "failed": 0, "seconds": 0}
+
+    def run(self, source_path: str) -> dict:
+        """
+        转换目录下全部strm文件，返回统计信息
+        """
+        start_time = time.monotonic()
+        last_report = start_time
+
+        def __progress():
+            nonlocal last_report
+            now = time.monotonic()
+            if now - last_report >= self.PROGRESS_INTERVAL:
+                last_report = now
+                logger.info(f"{source_path} 转换进度：{self.__summary(now - start_time)}")
+
+        self.process_all(source_path, on_batch=__progress)
+        self.stats["seconds"] = round(time.monotonic() - start_time, 3)
+        return self.stats
+
+    def summary(self) -> str:
+        """
+        统计信息描述
+        """
+        return self.__summary(self.stats.get("seconds"))
+
+    def __summary(self, seconds: float) -> str:
+        speed = round(self.stats.get("scanned") / seconds) if seconds else self.stats.get("scanned")
+        return (f"已扫描 {self.stats.get('scanned')} 个，转换 {self.stats.get('converted')} 个，"
+                f"未变化 {self.stats.get('skipped')} 个，失败 {self.stats.get('failed')} 个，"
+                f"耗时 {round(seconds, 1)} 秒，{speed} 个/秒")
+
+    def _process(self, file_path: str) -> Optional[bool]:
+        """
+        转换单个strm文件，返回是否写入，出错返回None
+        """
+        try:
+            with open(file_path, "r", encoding="utf-8") as file:
+                content = file.read()
+            new_content = self._convert(file_path, content)
+            if not new_content or new_content == content:
+                return False
+            logger.debug(f"开始写入 {file_path}：{new_content}")
+            self.write(file_path, new_content)
+            return True
+        except Exception as e:
+            logger.error(f"转换Strm文件 {file_path} 出错：{str(e)}")
+            return None
+
+    def _count(self, result: Optional[bool]):
+        self.stats["scanned"] += 1
+        if result is None:
+            self.stats["failed"] += 1
+        elif result:
+            self.stats["converted"] += 1
+        else:
+            self.stats["skipped"] += 1
+
+
 class StrmConvert(_PluginBase):
     # 插件名称
     plugin_name = "Strm文件模式转换"
@@ -15,7 +174,7 @@ class StrmConvert(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/convert.png"
     # 插件版本
-    plugin_version = "1.0"
+    plugin_version = "1.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -33,12 +192,16 @@ class StrmConvert(_PluginBase):
     _convert_confs = None
     _library_path = None
     _api_url = None
+    _workers = 8
 
     def init_plugin(self, config: dict = None):
         if config:
             self._to_local = config.get("to_local")
             self._to_api = config.get("to_api")
             self._convert_confs = config.get("convert_confs")
+            workers = str(config.get("workers") or "").strip()
+            # 非数字或小于1时使用默认值
+            self._workers = int(workers) if workers.isdigit() and int(workers) > 0 else 8
 
             if self._to_local and self._to_api:
                 logger.error(f"本地模式和API模式同时只能开启一个")
@@ -51,7 +214,8 @@ class StrmConvert(_PluginBase):
             self.update_config({
                 "to_local": False,
                 "to_api": False,
-                "convert_confs": self._convert_confs
+                "convert_confs": self._convert_confs,
+                "workers": self._workers
             })
 
             if self._to_local:
@@ -75,21 +239,13 @@ class StrmConvert(_PluginBase):
             logger.info(f"{source_path} 转换本地模式已结束")
 
     def __to_local(self, source_path: str, library_path: str):
-        files = self.__list_files(Path(source_path), ['.strm'])
-        for f in files:
-            logger.debug(f"开始处理文件 {f}")
-            try:
-                with open(f, 'r') as file:
-                    content = file.read()
-                    # 获取扩展名
-                    ext = str(content).split(".")[-1]
-                    library_file = str(f).replace(source_path, library_path)
-                    library_file = Path(library_file).parent.joinpath(Path(library_file).stem + "." + ext)
-                    with open(f, 'w') as file2:
-                        logger.debug(f"开始写入 媒体库路径 {library_file}")
-                        file2.write(str(library_file))
-            except Exception as e:
-                print(e)
+        def convert(f: str, content: str) -> str:
+            # 获取扩展名
+            ext = str(content).split(".")[-1]
+            library_file = str(f).replace(source_path, library_path)
+            return str(Path(library_file).parent.joinpath(Path(library_file).stem + "." + ext))
+
+        self.__convert(source_path, convert)
 
     def __convert_to_api(self, convert_confs: list):
         """
@@ -108,54 +264,28 @@ class StrmConvert(_PluginBase):
             logger.info(f"{source_path} 转换本地模式已结束")
 
     def __to_api(self, source_path: str, library_path: str, cloud_type: str, cloud_url: str):
-        files = self.__list_files(Path(source_path), ['.strm'])
-        for f in files:
-            logger.debug(f"开始处理文件 {f}")
-            try:
-                library_file = str(f).replace(source_path, library_path)
-                # 对盘符之后的所有内容进行url转码
-                library_file = urllib.parse.quote(library_file, safe='')
-
-                if str(cloud_type) == "cd2":
-                    # 将路径的开头盘符"/mnt/user/downloads"替换为"http://localhost:19798/static/http/localhost:19798/False/"
-                    # http://192.168.31.103:19798/static/http/192.168.31.103:19798/False/%2F115%2Femby%2Fanime%2F%20%E4%B8%83%E9%BE%99%E7%8F%A0%20%281986%29%2FSeason%201.%E5%9B%BD%E8%AF%AD%2F%E4%B8%83%E9%BE%99%E7%8F%A0%20-%20S01E002%20-%201080p%20AAC%20h264.mp4
-                    api_file = f"http://{cloud_url}/static/http/{cloud_url}/False/{library_file}"
-                else:
-                    api_file = f"http://{cloud_url}/d/{library_file}"
-                with open(f, 'w') as file2:
-                    logger.debug(f"开始写入 api路径 {api_file}")
-                    file2.write(str(api_file))
-            except Exception as e:
-                print(e)
+        def convert(f: str, content: str) -> str:
+            library_file = str(f).replace(source_path, library_path)
+            # 对盘符之后的所有内容进行url转码
+            library_file = urllib.parse.quote(library_file, safe='')
+            if str(cloud_type) == "cd2":
+                # 将路径的开头盘符"/mnt/user/downloads"替换为"http://localhost:19798/static/http/localhost:19798/False/"
+                # http://192.168.31.103:19798/static/http/192.168.31.103:19798/False/%2F115%2Femby%2Fanime%2F%20%E4%B8%83%E9%BE%99%E7%8F%A0%20%281986%29%2FSeason%201.%E5%9B%BD%E8%AF%AD%2F%E4%B8%83%E9%BE%99%E7%8F%A0%20-%20S01E002%20-%201080p%20AAC%20h264.mp4
+                return f"http://{cloud_url}/static/http/{cloud_url}/False/{library_file}"
+            return f"http://{cloud_url}/d/{library_file}"
 
-    @staticmethod
-    def __list_files(directory: Path, extensions: list, min_filesize: int = 0) -> List[Path]:
+        self.__convert(source_path, convert)
+
+    def __convert(self, source_path: str, convert: Callable[[str, str], str]):
         """
-        获取目录下所有指定扩展名的文件（包括子目录）
+        批量转换strm文件
         """
-        if not min_filesize:
-            min_filesize = 0
-
-        if not directory.exists():
-            return []
-
-        if directory.is_file():
-            return [directory]
-
-        if not min_filesize:
-            min_filesize = 0
-
-        files = []
-        pattern = r".*(" + "|".join(extensions) + ")$"
-
-        # 遍历目录及子目录
-        for path in directory.rglob('**/*'):
-            if path.is_file() \
-                    and re.match(pattern, path.name, re.IGNORECASE) \
-                    and path.stat().st_size >= min_filesize * 1024 * 1024:
-                files.append(path)
-
-        return files
+        if not Path(source_path).exists():
+            logger.error(f"{source_path} 不存在")
+            return
+        converter = StrmConverter(convert=convert, workers=self._workers)
+        converter.run(source_path)
+        logger.info(f"{source_path} 转换完成：{converter.summary()}")
 
     def get_state(self) -> bool:
         return False
@@ -182,7 +312,7 @@ class StrmConvert(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -198,7 +328,7 @@ class StrmConvert(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 6
+                                    'md': 4
                                 },
                                 'content': [
                                     {
@@ -209,6 +339,23 @@ class StrmConvert(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'workers',
+                                            'label': '并发数',
+                                            'placeholder': '默认8'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -307,7 +454,8 @@ class StrmConvert(_PluginBase):
         ], {
             "to_local": False,
             "to_api": False,
-            "convert_confs": ""
+            "convert_confs": "",
+            "workers": 8
         }
 
     def get_page(self) -> List[dict]: